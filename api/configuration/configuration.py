@@ -9,9 +9,158 @@ AZURE_DEPLOYMENT_NAME = "gpt-4o"
 OLLAMA_BASE_URL = "http://localhost:11434"
 OLLAMA_EMBEDDING_MODEL = "embeddinggemma:latest"
 
-DB_USER = "postgres"
-DB_PASSWORD = "root"
-DB_HOST = "localhost"
-DB_PORT = "5432"
-DB_NAME = "blend_retails"
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
\ No newline at end of file
+# On-disk FAISS index of few-shot SQL examples, shared by all workers
+RAG_INDEX_DIR = "rag_index"
+
+# Overridable from the environment, e.g. to point the benchmark suite at a scratch database
+DB_USER = os.environ.get("DB_USER", "postgres")
+DB_PASSWORD = os.environ.get("DB_PASSWORD", "root")
+DB_HOST = os.environ.get("DB_HOST", "localhost")
+DB_PORT = os.environ.get("DB_PORT", "5432")
+DB_NAME = os.environ.get("DB_NAME", "blend_retails")
+DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+# Async connection pool per worker process: it runs the /chat queries, so together with LLM capacity
+# it bounds /chat concurrency. The sync pool only serves ingest, the schema catalog, rollups, the
+# index advisor and metadata writes, so it is kept small. With N workers PostgreSQL sees up to
+# N * (DB_POOL_SIZE + DB_MAX_OVERFLOW + DB_SYNC_POOL_SIZE + DB_SYNC_MAX_OVERFLOW) connections
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 5))
+DB_SYNC_POOL_SIZE = int(os.environ.get("DB_SYNC_POOL_SIZE", 3))
+DB_SYNC_MAX_OVERFLOW = int(os.environ.get("DB_SYNC_MAX_OVERFLOW", 2))
+DB_POOL_TIMEOUT = 30
+DB_POOL_RECYCLE = 1800
+
+# Seconds between cheap DDL fingerprint checks of the cached schema catalog
+SCHEMA_CATALOG_CHECK_INTERVAL = 30
+
+# Question-aware schema pruning for the SQL generation prompt
+SCHEMA_PRUNING_ENABLED = True
+SCHEMA_PRUNING_TOP_K_TABLES = 3
+SCHEMA_PRUNING_TOP_K_COLUMNS = 40
+SCHEMA_PRUNING_TOKEN_BUDGET = 1500
+
+# Startup: services are created lazily, and warmed up in the background once the server is up.
+# /readyz reports 503 until the warm-up is done and the database answers within the timeout
+STARTUP_WARM_UP_ENABLED = True
+READINESS_CHECK_TIMEOUT_SECONDS = 2
+
+# Rows per chunk for the streaming COPY-based CSV loader
+INGEST_CHUNK_ROWS = 50000
+
+# Share of sampled values that must parse for a column to get a native (non-TEXT) type. The loader
+# still widens the type (BIGINT -> NUMERIC -> TEXT) as soon as any value of a chunk doesn't parse
+INGEST_TYPE_MATCH_RATIO = 0.98
+
+# Bounded query execution: rows/bytes kept per result and server-side cursor batch size
+QUERY_MAX_ROWS = 5000
+QUERY_MAX_BYTES = 16 * 1024 * 1024
+QUERY_FETCH_BATCH_ROWS = 2000
+
+# Execution guard for generated SQL: EXPLAIN estimates above these limits are sent back for a rewrite
+QUERY_MAX_ESTIMATED_COST = 5_000_000
+QUERY_MAX_ESTIMATED_ROWS = 10_000_000
+QUERY_STATEMENT_TIMEOUT_MS = 30_000
+# Wall-clock deadline for a whole /chat request; running queries are cancelled when it passes
+REQUEST_DEADLINE_SECONDS = 120
+
+# Speculative SQL: generate several diverse candidates per resolution step, run them in parallel
+# (read-only, short timeout) and keep the first valid, non-empty result
+SPECULATIVE_SQL_ENABLED = False
+SPECULATIVE_SQL_CANDIDATES = 3
+SPECULATIVE_SQL_TEMPERATURE = 0.7
+SPECULATIVE_STATEMENT_TIMEOUT_MS = 10_000
+
+# Results above this many rows are summarized from a statistical profile ("profile")
+# or with one LLM call per chunk ("map_reduce")
+SUMMARY_MODE = "profile"
+SUMMARY_LARGE_RESULT_ROWS = 1000
+PROFILE_TOP_K = 10
+PROFILE_SAMPLE_ROWS = 20
+# Scalars, single rows and short top-N tables are answered from a template, without an LLM call
+ANSWER_FORMATTER_ENABLED = True
+ANSWER_FORMATTER_MAX_ROWS = 10
+ANSWER_FORMATTER_MAX_COLUMNS = 4
+ANSWER_LOCALE = "en_IN"
+ANSWER_CURRENCY_SYMBOL = "₹"
+# Map-reduce summarization: token budget per map chunk / per reduce prompt
+MAP_REDUCE_CHUNK_TOKENS = 6000
+MAP_REDUCE_REDUCE_TOKENS = 6000
+
+# Process-wide LLM scheduler: Azure deployment quota, adaptive concurrency bounds, retries on 429
+LLM_REQUESTS_PER_MINUTE = 300
+LLM_TOKENS_PER_MINUTE = 150_000
+LLM_MIN_CONCURRENCY = 2
+LLM_MAX_CONCURRENCY = 32
+LLM_INITIAL_CONCURRENCY = 8
+LLM_MAX_RETRIES = 5
+LLM_EXPECTED_COMPLETION_TOKENS = 400
+
+# Memory-mapped Arrow result store backing /results/{id}
+RESULT_STORE_DIR = "result_store"
+RESULT_STORE_MAX_AGE_SECONDS = 6 * 60 * 60
+RESULT_STORE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+# The store directory is scanned for eviction at most this often (sooner when it may be full)
+RESULT_STORE_EVICT_INTERVAL_SECONDS = 60
+# Complete results up to this many rows are returned inline only, without a stored file
+RESULT_STORE_INLINE_MAX_ROWS = 100
+
+# Two-level answer / SQL result cache
+ANSWER_CACHE_MAX_ENTRIES = 1000
+ANSWER_CACHE_TTL_SECONDS = 60 * 60
+RESULT_CACHE_MAX_ENTRIES = 100
+RESULT_CACHE_TTL_SECONDS = 15 * 60
+RESULT_CACHE_MAX_ENTRY_BYTES = 2 * 1024 * 1024
+
+# Reuse stored example SQL without an LLM call above this cosine similarity
+FAST_PATH_ENABLED = True
+FAST_PATH_SIMILARITY_THRESHOLD = 0.92
+# Add SQL that passed validation back to the example store
+FAST_PATH_LEARN_EXAMPLES = True
+
+# Recent per-request traces kept in memory for GET /traces/{request_id}
+TRACE_HISTORY_SIZE = 200
+# Directory where every worker writes its Prometheus metrics (read by prometheus_client itself);
+# set it, empty, when running several workers so /metrics aggregates all of them
+PROMETHEUS_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+# Workload-driven index advisor: reads the logged /chat queries, creates or recommends B-tree indexes
+INDEX_ADVISOR_ENABLED = True
+INDEX_ADVISOR_AUTO_CREATE = True
+INDEX_ADVISOR_WINDOW_DAYS = 7
+INDEX_ADVISOR_MAX_QUERIES = 200
+INDEX_ADVISOR_MIN_TABLE_ROWS = 10_000
+# Minimum estimated cost reduction (hypopg) / maximum fraction of rows per lookup (pg_stats fallback)
+INDEX_ADVISOR_MIN_IMPROVEMENT = 0.2
+INDEX_ADVISOR_MAX_SELECTIVITY = 0.05
+INDEX_ADVISOR_MAX_INDEXES_PER_TABLE = 5
+QUERY_LOG_RETENTION_DAYS = 30
+
+# Background ingest jobs: uploads are staged on disk and loaded by a bounded pool of load slots,
+# shared by all API workers
+INGEST_STAGING_DIR = "ingest_staging"
+INGEST_MAX_CONCURRENT_JOBS = 2
+INGEST_MAX_QUEUED_JOBS = 20
+INGEST_JOB_HISTORY_SIZE = 100
+# Job state lives in the ingest_jobs table so every worker can report it. A running or queued job is
+# saved every INGEST_JOB_SYNC_SECONDS; one not saved for INGEST_JOB_STALE_SECONDS lost its worker
+INGEST_JOB_SYNC_SECONDS = 1
+INGEST_JOB_STALE_SECONDS = 60
+# Seconds between attempts of a queued job to get its table lock and a load slot
+INGEST_LOCK_POLL_SECONDS = 0.5
+
+# Materialized rollups for recurring aggregate shapes in query_log; matching SQL is read from the rollup
+ROLLUPS_ENABLED = True
+ROLLUP_WINDOW_DAYS = 7
+ROLLUP_MIN_OCCURRENCES = 3
+ROLLUP_MAX_PER_TABLE = 5
+ROLLUP_MAX_GROUP_COLUMNS = 4
+ROLLUP_MIN_TABLE_ROWS = 10_000
+# A rollup with more groups than this fraction of the base rows saves too little to keep
+ROLLUP_MAX_ROWS_RATIO = 0.2
+# Seconds between checks for base tables written since their rollups were refreshed (also outside the API)
+ROLLUP_FRESHNESS_CHECK_SECONDS = 30
+
+# Background rollup discovery + index advice over the logged workload
+TABLE_MAINTENANCE_INTERVAL_SECONDS = 60 * 60
@@ -8,19 +8,41 @@ from api.configuration.configuration import (
 )
 
 
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for prompt budgeting."""
+    return len(text) // 4 + 1
+
+
 class LLMFactory:
     _llm_instance = None
     _embed_instance = None
+    _scheduler = None
 
     @classmethod
     def get_llm(cls):
+        # One long-lived client, so its HTTP connection pool is reused across requests
+        if cls._llm_instance:
+            return cls._llm_instance
+
         cls._llm_instance = AzureChatOpenAI(
             azure_deployment=AZURE_DEPLOYMENT_NAME,
             api_version=os.environ.get("AZURE_OPENAI_API_VERSION"),
-            temperature=0
+            temperature=0,
+            # Report token usage for streamed calls too
+            stream_usage=True,
+            # Retries (and backing off on 429s) are owned by the scheduler
+            max_retries=0
         )
         return cls._llm_instance
 
+    @classmethod
+    def get_scheduler(cls):
+        """Process-wide LLM call scheduler (rate limits, priority lanes, adaptive concurrency)."""
+        if cls._scheduler is None:
+            from api.service.llm_scheduler import LLMScheduler
+            cls._scheduler = LLMScheduler()
+        return cls._scheduler
+
     @classmethod
     def get_embeddings(cls):
         if cls._embed_instance:
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+
+from api.service.telemetry import record_startup
+
+
+class ServiceFactory:
+    """
+    Process-wide services shared by the API routes and the agent graph.
+    Each one is built on first use (or by the startup warm-up) exactly once per process, so a
+    worker holds a single sync and async connection pool and loads the embedding indexes once.
+    Modules are imported inside the getters so importing the app stays cheap.
+    """
+    _instances = {}
+    _locks = {}
+    _registry_lock = threading.Lock()
+    # Seconds each service took to build, reported by /readyz
+    timings = {}
+
+    @classmethod
+    def _get(cls, name: str, build):
+        instance = cls._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with cls._registry_lock:
+            lock = cls._locks.setdefault(name, threading.Lock())
+        # Per-service lock: concurrent first requests wait for one build instead of racing
+        with lock:
+            if name not in cls._instances:
+                start = time.perf_counter()
+                cls._instances[name] = build()
+                cls.timings[name] = round(time.perf_counter() - start, 3)
+                record_startup(name, cls.timings[name])
+                print(f"⚙️ {name} ready in {cls.timings[name]}s.")
+        return cls._instances[name]
+
+    @classmethod
+    def is_ready(cls, name: str) -> bool:
+        return name in cls._instances
+
+    @classmethod
+    async def aget(cls, name: str):
+        """For async code: a dict lookup once built, otherwise builds off the event loop."""
+        instance = cls._instances.get(name)
+        if instance is not None:
+            return instance
+        return await asyncio.to_thread(getattr(cls, f"get_{name}"))
+
+    @classmethod
+    def get_db(cls):
+        def build():
+            from api.service.db_layer import PostgresManager
+            return PostgresManager()
+        return cls._get("db", build)
+
+    @classmethod
+    def get_result_store(cls):
+        def build():
+            from api.service.result_store import ResultStore
+            return ResultStore()
+        return cls._get("result_store", build)
+
+    @classmethod
+    def get_rag(cls):
+        def build():
+            from api.service.vector_layer import RAGManager
+            rag = RAGManager()
+            rag.ingest_examples()
+            return rag
+        return cls._get("rag", build)
+
+    @classmethod
+    def get_schema_index(cls):
+        def build():
+            from api.service.schema_index import SchemaIndex
+            return SchemaIndex(cls.get_db().schema_catalog)
+        return cls._get("schema_index", build)
+
+    @classmethod
+    def get_rollups(cls):
+        def build():
+            from api.service.rollups import RollupManager
+            db = cls.get_db()
+            return RollupManager(db.engine, db.schema_catalog)
+        return cls._get("rollups", build)
+
+    @classmethod
+    def get_index_advisor(cls):
+        def build():
+            from api.service.index_advisor import IndexAdvisor
+            db = cls.get_db()
+            return IndexAdvisor(db.engine, db.schema_catalog)
+        return cls._get("index_advisor", build)
+
+    @classmethod
+    async def aclose(cls):
+        """Returns every pooled connection; called once when the worker shuts down."""
+        db = cls._instances.get("db")
+        if db is not None:
+            await db.aflush_query_log()
+            db.engine.dispose()
+            await db.async_engine.dispose()
@@ -1,12 +1,142 @@
 from langchain_core.prompts import ChatPromptTemplate
-import concurrent.futures
-from api.configuration.llm_factory import LLMFactory
-from api.service.db_layer import PostgresManager
+import asyncio
+import re
+import time
+from api.configuration.configuration import (
+    SUMMARY_MODE,
+    SUMMARY_LARGE_RESULT_ROWS,
+    MAP_REDUCE_CHUNK_TOKENS,
+    MAP_REDUCE_REDUCE_TOKENS,
+    SPECULATIVE_SQL_ENABLED,
+    SPECULATIVE_SQL_CANDIDATES,
+    SPECULATIVE_SQL_TEMPERATURE,
+    SPECULATIVE_STATEMENT_TIMEOUT_MS,
+    ANSWER_FORMATTER_ENABLED,
+    ANSWER_FORMATTER_MAX_ROWS,
+    ROLLUPS_ENABLED,
+    RESULT_STORE_INLINE_MAX_ROWS
+)
+from api.configuration.llm_factory import LLMFactory, estimate_tokens
+from api.configuration.service_factory import ServiceFactory
+from api.service.answer_formatter import AnswerFormatterStats, format_answer
+from api.service.data_profiler import profile_dataframe, representative_sample
+from api.service.llm_scheduler import PRIORITY_INTERACTIVE, PRIORITY_ANSWER, PRIORITY_BULK
+from api.service.query_cache import QueryCache, referenced_tables, normalize_sql
+from api.service.sql_validator import SqlStaticValidator
+from api.service.telemetry import record_cache
 
-db = PostgresManager()
+# The database, result store and rollups are shared with the API through ServiceFactory
+query_cache = QueryCache()
+sql_validator = SqlStaticValidator()
+answer_formatter_stats = AnswerFormatterStats()
 
+# LLM calls tagged with this produce the user-facing answer and are streamed token by token over SSE
+ANSWER_STREAM_TAG = "answer_stream"
 
-def query_resolution_agent(state):
+UNKNOWN_IDENTIFIER_PATTERN = re.compile(r'(column|relation) "[^"]+" does not exist', re.IGNORECASE)
+
+# Extra guidance that makes speculative candidates differ; candidate 0 is the plain, deterministic one
+SPECULATIVE_HINTS = [
+    "",
+    "Use case-insensitive matching (ILIKE or LOWER) for text filters.",
+    "Write the simplest query that answers the question, without unnecessary joins or filters.",
+    "Double-check the join conditions and GROUP BY columns."
+]
+
+speculation_stats = {"rounds": 0, "candidates": 0, "executed": 0, "no_winner": 0, "wins_by_candidate": {}}
+
+
+def clean_sql(content: str) -> str:
+    return content.strip().replace("```sql", "").replace("```", "")
+
+async def execute_sql(sql: str, tables: dict, table_versions: dict = None, **kwargs):
+    """
+    Runs generated SQL, reading from a materialized rollup when one covers the query and was built
+    from the current version of its table (table_versions, fetched when not given).
+    """
+    db = await ServiceFactory.aget("db")
+    rollup_manager = await ServiceFactory.aget("rollups") if ROLLUPS_ENABLED else None
+    rewritten, rollup = None, None
+    if rollup_manager:
+        if table_versions is None:
+            table_versions = await asyncio.to_thread(db.table_versions, referenced_tables(sql, tables))
+        rewritten, rollup = rollup_manager.rewrite(sql, tables, table_versions)
+    if rewritten:
+        result = await db.aexecute_query(rewritten, **kwargs)
+        if result["success"]:
+            print(f"🧮 Answered from rollup {rollup}.")
+            return {**result, "rollup": rollup}
+        # Rollup dropped by a concurrent re-ingest, or a rewrite the database disagrees with
+        rollup_manager.record_fallback()
+        print(f"⚠️ Rollup query failed, running the original SQL: {result['error']}")
+    return await db.aexecute_query(sql, **kwargs)
+
+async def run_speculative_candidates(prompt, llm, inputs: dict):
+    """
+    Generates SPECULATIVE_SQL_CANDIDATES diverse SQL candidates concurrently, executes the ones that
+    pass static validation in parallel and returns (candidate index, sql, result) of the winner:
+    the first to finish with a non-empty result. Without one, the best by (succeeded, lowest index).
+    Slower candidates are cancelled on the server once a winner is found.
+    """
+    scheduler = LLMFactory.get_scheduler()
+
+    async def generate(i):
+        hint = SPECULATIVE_HINTS[i % len(SPECULATIVE_HINTS)]
+        candidate_llm = llm if i == 0 else llm.bind(temperature=SPECULATIVE_SQL_TEMPERATURE)
+        question = f"{inputs['question']}\n({hint})" if hint else inputs['question']
+        response = await scheduler.ainvoke(prompt | candidate_llm, {**inputs, "question": question},
+                                           PRIORITY_INTERACTIVE)
+        return clean_sql(response.content)
+
+    responses = await asyncio.gather(*(generate(i) for i in range(SPECULATIVE_SQL_CANDIDATES)),
+                                     return_exceptions=True)
+    candidates, seen = [], set()
+    for i, sql in enumerate(responses):
+        if isinstance(sql, Exception) or normalize_sql(sql) in seen:
+            continue
+        seen.add(normalize_sql(sql))
+        candidates.append((i, sql))
+    if not candidates:
+        raise responses[0]
+
+    speculation_stats["rounds"] += 1
+    speculation_stats["candidates"] += len(candidates)
+    tables = await asyncio.to_thread(ServiceFactory.get_db().schema_catalog.get_tables)
+    runnable = [(i, sql) for i, sql in candidates if not sql_validator.validate(sql, tables)]
+    if not runnable:
+        # Let static validation report the errors of the primary candidate
+        return candidates[0][0], candidates[0][1], None
+
+    speculation_stats["executed"] += len(runnable)
+    tasks = {
+        asyncio.create_task(execute_sql(sql, tables, statement_timeout_ms=SPECULATIVE_STATEMENT_TIMEOUT_MS)): (i, sql)
+        for i, sql in runnable
+    }
+    pending, finished, winner = set(tasks), [], None
+    try:
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=lambda t: tasks[t][0]):
+                i, sql = tasks[task]
+                finished.append((i, sql, task.result()))
+                if winner is None and task.result()["success"] and task.result()["row_count"]:
+                    winner = finished[-1]
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    if winner is None:
+        speculation_stats["no_winner"] += 1
+        return min(finished, key=lambda f: (not f[2]["success"], f[0]))
+
+    wins = speculation_stats["wins_by_candidate"]
+    wins[winner[0]] = wins.get(winner[0], 0) + 1
+    print(f"Resolution Agent || Speculative candidate {winner[0]} won ({len(runnable)} executed).")
+    return winner
+
+
+async def query_resolution_agent(state):
     print(f"🤖 [Resolution Agent] Generating SQL for: {state['question']}")
 
     llm = LLMFactory.get_llm()
@@ -37,31 +167,102 @@ def query_resolution_agent(state):
         Return ONLY the SQL query. No markdown, no backticks."""
     )
 
-    chain = prompt | llm
-    response = chain.invoke({
-        "schema": state['schema_context'],
+    # The pruned schema missed something the query needs - retry (and keep retrying) with the full schema
+    schema_context = state['schema_context']
+    if UNKNOWN_IDENTIFIER_PATTERN.search(state.get("error") or ""):
+        print("Resolution Agent || Unknown table/column in previous attempt, using full schema.")
+        schema_context = await asyncio.to_thread(ServiceFactory.get_db().get_schema_string)
+
+    inputs = {
+        "schema": schema_context,
         "history": history_context,
         "rag_examples": state['rag_examples'],
         "error": state.get("error", ""),
         "question": state['question']
-    })
+    }
 
-    clean_sql = response.content.strip().replace("```sql", "").replace("```", "")
+    winner, prefetched_result = None, None
+    if SPECULATIVE_SQL_ENABLED:
+        winner, sql, result = await run_speculative_candidates(prompt, llm, inputs)
+        prefetched_result = {"sql": sql, "result": result} if result else None
+    else:
+        chain = prompt | llm
+        response = await LLMFactory.get_scheduler().ainvoke(chain, inputs, PRIORITY_INTERACTIVE)
+        sql = clean_sql(response.content)
 
     return {
-        "sql_query": clean_sql,
+        "sql_query": sql,
+        "fast_path": False,
+        "prefetched_result": prefetched_result,
+        "speculative_winner": winner,
+        "schema_context": schema_context,
         "retry_count": state.get("retry_count", 0) + 1
     }
 
-def data_extraction_agent(state):
+async def static_validation_agent(state):
+    print("Static Validation Agent || Checking SQL against the schema catalog...")
+
+    tables = await asyncio.to_thread(ServiceFactory.get_db().schema_catalog.get_tables)
+    errors = sql_validator.validate(state['sql_query'], tables)
+    if not errors:
+        return {"static_validation_status": "valid"}
+
+    print(f"Static Validation Failed: {errors}")
+    # Out of retries: let the database report the error instead
+    if state['retry_count'] > 3:
+        return {"static_validation_status": "invalid"}
+
+    sql_validator.round_trips_saved += 1
+    return {
+        "static_validation_status": "invalid",
+        "error": "Static validation failed (fix these before the query can run):\n- " + "\n- ".join(errors),
+        "round_trips_saved": state.get("round_trips_saved", 0) + 1
+    }
+
+async def data_extraction_agent(state):
     print(f"Extraction Agent || Executing: {state['sql_query']}")
 
-    result = db.execute_query(state['sql_query'])
+    db = await ServiceFactory.aget("db")
+    catalog = await asyncio.to_thread(db.schema_catalog.get_tables)
+    tables = referenced_tables(state['sql_query'], catalog)
+    # Cache keys use the tables' versions in the database, so loads made by other workers are seen
+    table_versions = await asyncio.to_thread(db.table_versions, tables)
+    cached = query_cache.get_result(state['sql_query'], table_versions)
+    if cached:
+        print("Extraction Agent || Result cache hit.")
+        return {"query_result": cached["data"], "row_count": cached["row_count"],
+                "result_truncated": cached["truncated"], "result_id": cached["result_id"],
+                "result_df": cached["df"], "result_profile": cached["profile"], "error": None,
+                "table_versions": table_versions}
+
+    prefetched = state.get('prefetched_result')
+    if prefetched and prefetched["sql"] == state['sql_query']:
+        print("Extraction Agent || Using the result of the winning speculative candidate.")
+        result = prefetched["result"]
+    else:
+        result = await execute_sql(state['sql_query'], catalog, table_versions)
 
     if result["success"]:
-        return {"query_result": result["data"], "error": None}
+        if "seconds" in result:
+            db.log_query(state['sql_query'], result["seconds"], result["row_count"], result.get("rollup"))
+        # Persist the result once so the UI can page through / download it without re-running the SQL.
+        # A small complete result is all in the response already: it's kept in memory, not stored
+        df, result_id = result["raw_df"], None
+        inline = df is not None and not result["truncated"] and len(df) <= RESULT_STORE_INLINE_MAX_ROWS
+        if df is not None and not inline:
+            result_id = await asyncio.to_thread(ServiceFactory.get_result_store().save, df)
+        query_cache.set_result(state['sql_query'], table_versions, {
+            "data": result["data"], "row_count": result["row_count"],
+            "truncated": result["truncated"], "result_id": result_id, "df": df if inline else None,
+            "profile": result["profile"]
+        })
+        return {"query_result": result["data"], "row_count": result["row_count"],
+                "result_truncated": result["truncated"], "result_id": result_id,
+                "result_df": df if inline else None, "result_profile": result["profile"], "error": None,
+                "prefetched_result": None, "table_versions": table_versions}
     else:
-        return {"query_result": None, "error": result["error"]}
+        return {"query_result": None, "row_count": 0, "result_truncated": False, "result_id": None,
+                "result_df": None, "result_profile": None, "error": result["error"], "prefetched_result": None}
 
 
 def validation_agent(state):
@@ -79,61 +280,152 @@ def validation_agent(state):
     print("Validation Passed")
     return {"validation_status": "valid"}
 
-def recursive_summarize(llm, full_data_str: str, chunk_size: int = 1000):
-    print(f"Recursive Summarizer || Data is large (>1000 rows). Switching to Map-Reduce mode...")
+def pack_by_tokens(items: list, token_budget: int, base_tokens: int = 0) -> list:
+    """Groups consecutive items so each group's estimated size stays within the token budget."""
+    groups, current, size = [], [], base_tokens
+    for item in items:
+        tokens = estimate_tokens(item)
+        if current and size + tokens > token_budget:
+            groups.append(current)
+            current, size = [], base_tokens
+        current.append(item)
+        size += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+async def recursive_summarize(llm, full_data_str: str, question: str,
+                              chunk_tokens: int = MAP_REDUCE_CHUNK_TOKENS,
+                              reduce_tokens: int = MAP_REDUCE_REDUCE_TOKENS):
+    print(f"Recursive Summarizer || Data is large. Switching to Map-Reduce mode...")
     lines = full_data_str.strip().split('\n')
     if len(lines) < 3:
         return "Data too short to summarize."
     headers = "\n".join(lines[:2])
     data_rows = lines[2:]
-    chunks = [data_rows[i:i + chunk_size] for i in range(0, len(data_rows), chunk_size)]
-    print(f"📊 Split {len(data_rows)} rows into {len(chunks)} chunks (Chunk Size: {chunk_size}).")
+    # Chunks hold as many rows as fit the token budget, so wide rows make smaller chunks
+    chunks = pack_by_tokens(data_rows, chunk_tokens, base_tokens=estimate_tokens(headers))
+    print(f"📊 Split {len(data_rows)} rows into {len(chunks)} chunks (~{chunk_tokens} tokens each).")
     map_prompt = ChatPromptTemplate.from_template(
-        """Analyze this specific subset of data rows. 
-        Focus on identifying key trends, anomalies, or high values in this chunk.
+        """User Question: {question}
+        
+        Analyze this specific subset of data rows with the question in mind.
+        Focus on the values, totals, trends and anomalies in this chunk that help answer it.
         DATA SUBSET:
         {header}
         {rows}
         
-        Briefly summarize findings for this chunk:"""
+        Briefly summarize findings for this chunk (a few bullet points, keep the key numbers):"""
     )
     map_chain = map_prompt | llm
 
-    def process_single_chunk(chunk_data):
-        idx, chunk_lines = chunk_data
-        chunk_text = "\n".join(chunk_lines)
+    reduce_prompt = ChatPromptTemplate.from_template(
+        """User Question: {question}
+        
+        Here are summaries from different parts of a large dataset. 
+        {instruction}
+        
+        INTERMEDIATE FINDINGS:
+        - {combined_summaries}
+        
+        {label}:"""
+    )
+    # Intermediate reduce levels are not streamed; only the final answer is
+    intermediate_chain = reduce_prompt | llm
+    final_chain = (reduce_prompt | llm).with_config(tags=[ANSWER_STREAM_TAG])
+
+    # Concurrency across all requests is bounded by the shared scheduler, in the bulk lane
+    scheduler = LLMFactory.get_scheduler()
+
+    async def run_limited(chain, inputs, idx):
         try:
-            res = map_chain.invoke({"header": headers, "rows": chunk_text})
+            res = await scheduler.ainvoke(chain, inputs, PRIORITY_BULK)
             return res.content
         except Exception as e:
-            return f"Error processing chunk {idx}: {str(e)}"
-    print(f"Recursive Summarizer || Spinning up 20 threads for parallel processing...")
-    chunk_args = [(i, chunk) for i, chunk in enumerate(chunks)]
-    intermediate_summaries = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-        results = executor.map(process_single_chunk, chunk_args)
-        intermediate_summaries = list(results)
+            return f"Error processing part {idx}: {str(e)}"
 
-    print(f"Recursive Summarizer || All {len(chunks)} chunks processed.")
+    level_start = time.perf_counter()
+    print(f"Recursive Summarizer || Scheduling {len(chunks)} map calls...")
+    summaries = await asyncio.gather(*(
+        run_limited(map_chain, {"question": question, "header": headers, "rows": "\n".join(chunk)}, i)
+        for i, chunk in enumerate(chunks)
+    ))
+    print(f"Recursive Summarizer || Level 0 (map): {len(chunks)} calls in {time.perf_counter() - level_start:.2f}s.")
 
-    print("Recursive Summarizer || Reducing intermediate summaries...")
-    combined_summaries = "\n- ".join(intermediate_summaries)
+    # Reduce tree: merge groups of summaries in parallel until the rest fits one reduce prompt
+    level = 1
+    while estimate_tokens("\n- ".join(summaries)) > reduce_tokens and len(summaries) > 1:
+        level_start = time.perf_counter()
+        groups = pack_by_tokens(summaries, reduce_tokens)
+        if len(groups) == len(summaries):
+            # Every summary is over budget on its own - merge pairwise so the tree still converges
+            groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
 
-    reduce_prompt = ChatPromptTemplate.from_template(
-        """Here are summaries from different parts of a large dataset. 
-        Synthesize them into a single, cohesive business answer.
+        summaries = await asyncio.gather(*(
+            run_limited(intermediate_chain, {
+                "question": question,
+                "instruction": "Merge them into one concise summary that keeps the key numbers.",
+                "combined_summaries": "\n- ".join(group),
+                "label": "Merged Findings"
+            }, i)
+            for i, group in enumerate(groups)
+        ))
+        print(f"Recursive Summarizer || Level {level} (reduce): {len(groups)} calls "
+              f"in {time.perf_counter() - level_start:.2f}s.")
+        level += 1
+
+    level_start = time.perf_counter()
+    final_res = await scheduler.ainvoke(final_chain, {
+        "question": question,
+        "instruction": "Synthesize them into a single, cohesive business answer.",
+        "combined_summaries": "\n- ".join(summaries),
+        "label": "Final Answer"
+    }, PRIORITY_ANSWER)
+    print(f"Recursive Summarizer || Level {level} (final reduce): 1 call in {time.perf_counter() - level_start:.2f}s.")
+    return final_res.content
+
+def load_result_profile(result_id: str, streamed_profile: str = None):
+    """
+    Returns (digest, sample markdown) of the stored result. A capped result comes with the profile
+    of all its rows, built while they were fetched; a complete one is profiled from the stored DataFrame.
+    """
+    df = ServiceFactory.get_result_store().open_table(result_id).to_pandas()
+    return streamed_profile or profile_dataframe(df), representative_sample(df).to_markdown(index=False)
+
+async def profile_summarize(llm, state, truncation_note: str):
+    print("Profile Summarizer || Large result, summarizing a statistical profile instead of the raw rows...")
+    digest, sample = await asyncio.to_thread(load_result_profile, state['result_id'], state.get('result_profile'))
+
+    prompt = ChatPromptTemplate.from_template(
+        """User Question: {question}
+        SQL Used: {sql_query}
+        The query returned {row_count} rows. {truncation_note}
         
-        INTERMEDIATE FINDINGS:
-        - {combined_summaries}
+        STATISTICAL PROFILE (computed over all {row_count} rows):
+        {digest}
+        
+        REPRESENTATIVE SAMPLE ROWS:
+        {sample}
         
-        Final Answer:"""
+        Provide a clear, business-friendly answer based on the profile. Quote totals and top groups from the profile, not from the sample."""
+    )
+    chain = (prompt | llm).with_config(tags=[ANSWER_STREAM_TAG])
+    res = await LLMFactory.get_scheduler().ainvoke(
+        chain, {**state, "truncation_note": truncation_note, "digest": digest, "sample": sample}, PRIORITY_ANSWER
     )
+    return res.content
 
-    reduce_chain = reduce_prompt | llm
-    final_res = reduce_chain.invoke({"combined_summaries": combined_summaries})
-    return final_res.content
+def load_small_result(result_id, inline_df=None):
+    """Returns (DataFrame or None, column descriptions) for the deterministic formatter."""
+    df = inline_df
+    if df is None and result_id:
+        df = ServiceFactory.get_result_store().open_table(result_id).to_pandas()
+    descriptions = {c["name"]: c["description"]
+                    for columns in ServiceFactory.get_db().schema_catalog.get_tables().values()
+                    for c in columns if c.get("description")}
+    return df, descriptions
 
-def summarization_agent(state):
+async def summarization_agent(state):
     print("Summarizer || Analyzing data size...")
     llm = LLMFactory.get_llm()
     data_str = state['query_result']
@@ -142,20 +434,48 @@ def summarization_agent(state):
 
     print(f"Retrieved {line_count} rows.")
 
-    if line_count > 1000:
-        final_answer = recursive_summarize(llm, data_str, chunk_size=1000)
+    # Only a capped slice of the result is rendered for the LLM - tell it so
+    truncation_note = ""
+    if state.get('result_truncated'):
+        truncation_note = f"(Showing the first {line_count} of {state['row_count']} rows returned by the query.)"
+
+    # Small results are answered from a template - no LLM call
+    if ANSWER_FORMATTER_ENABLED and line_count <= ANSWER_FORMATTER_MAX_ROWS:
+        try:
+            df, descriptions = await asyncio.to_thread(load_small_result, state.get('result_id'),
+                                                       state.get('result_df'))
+            shape, answer = format_answer(state['question'], df, descriptions, state.get('result_truncated'))
+        except KeyError:
+            shape, answer = "evicted", None
+        record_cache("answer_formatter", answer is not None)
+        if answer is not None:
+            print(f"Summarizer || Deterministic answer for a {shape} result, skipping the LLM.")
+            answer_formatter_stats.record(shape, used_llm=False)
+            return {"final_answer": answer}
+    answer_formatter_stats.record("llm", used_llm=True)
+
+    if line_count > SUMMARY_LARGE_RESULT_ROWS and SUMMARY_MODE == "profile" and state.get('result_id'):
+        try:
+            final_answer = await profile_summarize(llm, state, truncation_note)
+        except KeyError:
+            # Result evicted from the store in the meantime
+            final_answer = await recursive_summarize(llm, data_str, state['question'])
+    elif line_count > SUMMARY_LARGE_RESULT_ROWS:
+        final_answer = await recursive_summarize(llm, data_str, state['question'])
     else:
         print("Data fits in context. Using standard summarization.")
         prompt = ChatPromptTemplate.from_template(
             """User Question: {question}
             SQL Used: {sql_query}
-            Data Retrieved: 
+            Data Retrieved: {truncation_note}
             {query_result}
             
             Provide a clear, business-friendly answer based on the data."""
         )
-        chain = prompt | llm
-        res = chain.invoke(state)
+        chain = (prompt | llm).with_config(tags=[ANSWER_STREAM_TAG])
+        res = await LLMFactory.get_scheduler().ainvoke(
+            chain, {**state, "truncation_note": truncation_note}, PRIORITY_ANSWER
+        )
         final_answer = res.content
 
     return {"final_answer": final_answer}
\ No newline at end of file
@@ -1,13 +1,25 @@
-from typing import TypedDict, Optional, List
+from typing import Any, TypedDict, Optional, List
 
 
 class AgentState(TypedDict):
+    request_id: Optional[str]
     question: str
     schema_context: str
     rag_examples: str
     sql_query: str
+    fast_path: bool
+    prefetched_result: Optional[dict]
+    speculative_winner: Optional[int]
     query_result: Optional[str]
+    row_count: int
+    result_truncated: bool
+    result_id: Optional[str]
+    result_df: Optional[Any]
+    result_profile: Optional[str]
+    table_versions: dict
     error: Optional[str]
+    static_validation_status: str
+    round_trips_saved: int
     validation_status: str
     retry_count: int
     final_answer: str
@@ -1,7 +1,39 @@
+import inspect
+
 from langgraph.graph import StateGraph, END
 
-from api.langgrph.agents import query_resolution_agent, data_extraction_agent, validation_agent, summarization_agent
+from api.langgrph.agents import (
+    query_resolution_agent,
+    static_validation_agent,
+    data_extraction_agent,
+    validation_agent,
+    summarization_agent
+)
 from api.langgrph.state import AgentState
+from api.service.telemetry import span, use_request
+
+
+def traced_node(name, node):
+    """Records the node's wall time against the request carried in the state."""
+    async def run(state):
+        with use_request(state.get('request_id')), span("node", name):
+            result = node(state)
+            return await result if inspect.isawaitable(result) else result
+    return run
+
+
+def entry_router(state):
+    # Stored SQL reused for a near-identical question goes straight to execution
+    if state.get('fast_path'):
+        return "extraction"
+    return "resolution"
+
+
+def static_validation_router(state):
+    # Errors found locally go straight back to resolution, skipping the database round trip
+    if state['static_validation_status'] == 'valid' or state['retry_count'] > 3:
+        return "extraction"
+    return "resolution"
 
 
 def validation_router(state):
@@ -15,14 +47,29 @@ def validation_router(state):
 workflow = StateGraph(AgentState)
 
 
-workflow.add_node("resolution", query_resolution_agent)
-workflow.add_node("extraction", data_extraction_agent)
-workflow.add_node("validation", validation_agent)
-workflow.add_node("summarizer", summarization_agent)
+workflow.add_node("resolution", traced_node("resolution", query_resolution_agent))
+workflow.add_node("static_validation", traced_node("static_validation", static_validation_agent))
+workflow.add_node("extraction", traced_node("extraction", data_extraction_agent))
+workflow.add_node("validation", traced_node("validation", validation_agent))
+workflow.add_node("summarizer", traced_node("summarizer", summarization_agent))
 
 
-workflow.set_entry_point("resolution")
-workflow.add_edge("resolution", "extraction")
+workflow.set_conditional_entry_point(
+    entry_router,
+    {
+        "extraction": "extraction",
+        "resolution": "resolution"
+    }
+)
+workflow.add_edge("resolution", "static_validation")
+workflow.add_conditional_edges(
+    "static_validation",
+    static_validation_router,
+    {
+        "extraction": "extraction",
+        "resolution": "resolution"
+    }
+)
 workflow.add_edge("extraction", "validation")
 
 
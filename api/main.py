@@ -1,100 +1,574 @@
-import shutil
+import time
+
+# Cold start is measured from here: module imports, then the background warm-up of shared services
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import contextlib
+import json
 import os
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+import shutil
+import tempfile
+
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST
 
+from api.configuration.configuration import (
+    FAST_PATH_ENABLED,
+    FAST_PATH_LEARN_EXAMPLES,
+    REQUEST_DEADLINE_SECONDS,
+    INGEST_STAGING_DIR,
+    INDEX_ADVISOR_ENABLED,
+    ROLLUPS_ENABLED,
+    ROLLUP_FRESHNESS_CHECK_SECONDS,
+    TABLE_MAINTENANCE_INTERVAL_SECONDS,
+    STARTUP_WARM_UP_ENABLED,
+    READINESS_CHECK_TIMEOUT_SECONDS
+)
+from api.configuration.llm_factory import LLMFactory
+from api.configuration.service_factory import ServiceFactory
+from api.langgrph.agents import (
+    ANSWER_STREAM_TAG,
+    query_cache,
+    sql_validator,
+    speculation_stats,
+    answer_formatter_stats
+)
 from api.langgrph.workflow import agent_app
-from api.modal.model import MetadataRequest, QueryResponse, QueryRequest
-from api.service.db_layer import PostgresManager
-from api.service.vector_layer import RAGManager
+from api.modal.model import MetadataRequest, QueryResponse, QueryRequest, ExampleRequest
+from api.service.csv_loader import INGEST_MODES
+from api.service.ingest_jobs import IngestJobManager, IngestQueueFull
+from api.service.telemetry import (
+    start_request,
+    finish_request,
+    record_cache,
+    record_startup,
+    traces,
+    metrics_exposition,
+    mark_worker_stopped
+)
+
+# Shared services (database pools, RAG and schema indexes, rollups, index advisor) are built once per
+# worker by ServiceFactory: in the background right after startup, or by the first request needing them
+startup = {
+    "pid": os.getpid(),
+    "import_seconds": round(time.perf_counter() - IMPORT_STARTED, 3),
+    "warm_up_phases": {},
+    "warming_up": False,
+    "warmed_up": False,
+    "ready_after_seconds": None,
+    "error": None
+}
+record_startup("import", startup["import_seconds"])
+
+background_tasks = set()
+
+def run_in_background(func, *args):
+    task = asyncio.create_task(asyncio.to_thread(func, *args))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+def refresh_changed_rollups():
+    """Refreshes rollups whose base table was written elsewhere, and drops results read from them."""
+    for table in ServiceFactory.get_rollups().check_freshness():
+        query_cache.invalidate_table(table)
+
+def maintain_tables(table_name: str = None):
+    """
+    Keeps rollups and indexes in line with the data and the logged workload. After an ingest the
+    table's rollups are refreshed and its indexes re-advised; periodic runs look at every table.
+    """
+    if ROLLUPS_ENABLED:
+        rollup_manager = ServiceFactory.get_rollups()
+        if table_name:
+            rollup_manager.refresh_table(table_name)
+            # Results computed while the rollups were being refreshed were read from the base table,
+            # but drop them anyway so nothing cached predates the refresh
+            query_cache.invalidate_table(table_name)
+        else:
+            refresh_changed_rollups()
+        rollup_manager.discover()
+    if INDEX_ADVISOR_ENABLED:
+        ServiceFactory.get_index_advisor().run(table_name)
+
+async def periodic_maintenance():
+    while True:
+        await asyncio.sleep(TABLE_MAINTENANCE_INTERVAL_SECONDS)
+        try:
+            await asyncio.to_thread(maintain_tables)
+        except Exception as e:
+            print(f"⚠️ Table maintenance failed: {e}")
+
+async def periodic_rollup_freshness():
+    while True:
+        await asyncio.sleep(ROLLUP_FRESHNESS_CHECK_SECONDS)
+        try:
+            await asyncio.to_thread(refresh_changed_rollups)
+        except Exception as e:
+            print(f"⚠️ Rollup freshness check failed: {e}")
+
+async def warm_up_database():
+    db = await ServiceFactory.aget("db")
+    await asyncio.to_thread(db.schema_catalog.get_tables)
+
+async def warm_up_schema_index():
+    schema_index = await ServiceFactory.aget("schema_index")
+    await schema_index.awarm_up()
+
+def warm_up_phases() -> list:
+    """(name, coroutine function) in dependency order; each loads what a first request would pay for."""
+    phases = [
+        ("database", warm_up_database),
+        ("result_store", lambda: ServiceFactory.aget("result_store")),
+        ("rag_index", lambda: ServiceFactory.aget("rag")),
+        ("schema_index", warm_up_schema_index)
+    ]
+    if ROLLUPS_ENABLED:
+        phases.append(("rollups", lambda: ServiceFactory.aget("rollups")))
+    if INDEX_ADVISOR_ENABLED:
+        phases.append(("index_advisor", lambda: ServiceFactory.aget("index_advisor")))
+    return phases
+
+async def warm_up():
+    startup.update(warming_up=True, error=None)
+    try:
+        for name, phase in warm_up_phases():
+            start = time.perf_counter()
+            await phase()
+            startup["warm_up_phases"][name] = round(time.perf_counter() - start, 3)
+            record_startup(f"warm_up_{name}", startup["warm_up_phases"][name])
+
+        startup["warmed_up"] = True
+        startup["ready_after_seconds"] = round(time.perf_counter() - IMPORT_STARTED, 3)
+        record_startup("ready", startup["ready_after_seconds"])
+        print(f"🚀 Worker {startup['pid']} warmed up {startup['ready_after_seconds']}s after import.")
+    except Exception as e:
+        # The lazy getters retry on the next request, and /readyz restarts the warm-up
+        startup["error"] = str(e)
+        print(f"⚠️ Warm-up failed: {e}")
+    finally:
+        startup["warming_up"] = False
 
-app = FastAPI()
+def start_warm_up():
+    task = asyncio.create_task(warm_up())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
 
-db = PostgresManager()
-rag = RAGManager()
-rag.ingest_examples()
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing blocks startup: the worker accepts requests (and answers /healthz) right away
+    lifecycle_tasks = [asyncio.create_task(periodic_maintenance())]
+    if ROLLUPS_ENABLED:
+        lifecycle_tasks.append(asyncio.create_task(periodic_rollup_freshness()))
+    if STARTUP_WARM_UP_ENABLED:
+        lifecycle_tasks.append(start_warm_up())
+    yield
+    for task in lifecycle_tasks:
+        task.cancel()
+    await asyncio.gather(*lifecycle_tasks, return_exceptions=True)
+    await ServiceFactory.aclose()
+    mark_worker_stopped()
 
-os.makedirs("temp_uploads", exist_ok=True)
+app = FastAPI(lifespan=lifespan)
 
-@app.post("/ingest")
+def on_ingest_success(job: dict):
+    # The table's rollups hold the old data: stop rewriting onto them before dropping cached results
+    if ROLLUPS_ENABLED and ServiceFactory.is_ready("rollups"):
+        ServiceFactory.get_rollups().mark_stale(job["table_name"])
+    query_cache.invalidate_table(job["table_name"])
+    # Bring the table's rollups and indexes up to date (a replacing load drops them)
+    run_in_background(maintain_tables, job["table_name"])
+
+def ingest_csv(*args):
+    return ServiceFactory.get_db().ingest_csv(*args)
+
+ingest_jobs = IngestJobManager(ingest_csv, lambda: ServiceFactory.get_db().engine, on_ingest_success)
+
+STAGING_COPY_BYTES = 1024 * 1024
+
+def stage_upload(upload) -> str:
+    """Copies the upload body to a staging file the background job can read after the request ends."""
+    os.makedirs(INGEST_STAGING_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=".csv", dir=INGEST_STAGING_DIR)
+    with os.fdopen(fd, "wb") as f:
+        shutil.copyfileobj(upload, f, STAGING_COPY_BYTES)
+    return path
+
+@app.post("/ingest", status_code=202)
 async def ingest_data(
         table_name: str = Form(...),
-        file: UploadFile = File(...)
+        file: UploadFile = File(...),
+        mode: str = Form("replace"),
+        key_columns: str = Form(None),
+        partition_by: str = Form(None)
 ):
-    file_location = f"temp_uploads/{file.filename}"
+    """
+    Queues the CSV for loading and returns the job id right away; poll GET /ingest/jobs/{job_id}.
+    mode: replace (default) / append / upsert. upsert merges on key_columns (comma-separated).
+    partition_by: "auto" or a date column - a new table is range-partitioned by month on it.
+    """
+    keys = [k.strip() for k in (key_columns or "").split(",") if k.strip()]
+    if mode not in INGEST_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(INGEST_MODES)}.")
+    if mode == "upsert" and not keys:
+        raise HTTPException(status_code=400, detail="upsert needs key_columns.")
 
+    path = await asyncio.to_thread(stage_upload, file.file)
     try:
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        job = await ingest_jobs.submit(path, table_name, mode, keys, partition_by)
+    except IngestQueueFull as e:
+        os.remove(path)
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"status": "queued", "job_id": job["job_id"], "status_url": f"/ingest/jobs/{job['job_id']}",
+            "message": f"Ingest of '{table_name}' queued."}
 
-        success, columns = db.ingest_csv(file_location, table_name)
-        os.remove(file_location)
-        if success:
-            return {"status": "success", "columns": columns, "message": f"Table '{table_name}' created."}
-        else:
-            raise HTTPException(status_code=500, detail="Failed to ingest data into DB.")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@app.get("/ingest/jobs")
+def list_ingest_jobs():
+    return {"jobs": ingest_jobs.list_jobs(), "stats": ingest_jobs.stats()}
+
+@app.get("/ingest/jobs/{job_id}")
+def get_ingest_job(job_id: str):
+    """Phase (queued / loading / finalizing / succeeded / failed), rows and bytes loaded, throughput, errors."""
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Ingest job '{job_id}' not found.")
+    return job
 
 @app.post("/metadata")
 async def save_metadata(request: MetadataRequest):
     try:
-        db.save_column_metadata(request.table_name, request.descriptions)
+        db = await ServiceFactory.aget("db")
+        await asyncio.to_thread(db.save_column_metadata, request.table_name, request.descriptions)
         return {"status": "success", "message": "Metadata saved."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def build_initial_state(request: QueryRequest, request_id: str):
+    schema_index, rag = await asyncio.gather(ServiceFactory.aget("schema_index"), ServiceFactory.aget("rag"))
+    schema_context, scored_examples = await asyncio.gather(
+        schema_index.aselect_schema(request.question),
+        rag.aretrieve_examples(request.question)
+    )
+
+    # Follow-up questions depend on the conversation, so only standalone questions take the fast path
+    chat_history = request.chat_history[:-1]
+    fast_path_sql = None
+    if FAST_PATH_ENABLED and not chat_history:
+        fast_path_sql = rag.match_fast_path(request.question, scored_examples)
+        record_cache("sql_fast_path", fast_path_sql is not None)
+
+    return {
+        "request_id": request_id,
+        "question": request.question,
+        "chat_history": chat_history,
+        "schema_context": schema_context,
+        "rag_examples": rag.format_examples(scored_examples),
+        "retry_count": 0,
+        "error": None,
+        "sql_query": fast_path_sql or "",
+        "fast_path": bool(fast_path_sql),
+        "prefetched_result": None,
+        "speculative_winner": None,
+        "query_result": "",
+        "row_count": 0,
+        "result_truncated": False,
+        "result_id": None,
+        "result_df": None,
+        "result_profile": None,
+        "table_versions": {},
+        "static_validation_status": "",
+        "round_trips_saved": 0,
+        "validation_status": "",
+        "final_answer": ""
+    }
+
+def to_query_response(result: dict) -> QueryResponse:
+    return QueryResponse(
+        answer=result.get("final_answer") or "No answer generated.",
+        sql_query=result.get("sql_query"),
+        data=result.get("query_result"),
+        row_count=result.get("row_count"),
+        result_id=result.get("result_id"),
+        request_id=result.get("request_id")
+    )
+
+async def get_cached_answer(request: QueryRequest):
+    """Returns (cached QueryResponse or None, schema version the lookup was made against)."""
+    db = await ServiceFactory.aget("db")
+    _, _, schema_version = await asyncio.to_thread(db.schema_catalog.snapshot)
+    # A hit checks the versions of the tables the answer read against the database
+    cached = await asyncio.to_thread(query_cache.get_answer, request.question, request.chat_history[:-1],
+                                     schema_version, db.table_versions)
+    if cached:
+        print(f"⚡ Answer cache hit for: {request.question}")
+        return QueryResponse(**{k: v for k, v in cached.items() if k not in ("tables", "table_versions")}), \
+            schema_version
+    return None, schema_version
+
+def remember_answer(request: QueryRequest, schema_version: int, result: dict):
+    if result.get("validation_status") != "valid" or not result.get("sql_query"):
+        return
+    query_cache.set_answer(request.question, request.chat_history[:-1], schema_version,
+                           to_query_response(result).model_dump(), result.get("table_versions") or {})
+
+    # Grow the example store with LLM-written SQL that worked, so the fast path covers more questions
+    if FAST_PATH_LEARN_EXAMPLES and not result.get("fast_path") and not request.chat_history[:-1] \
+            and result.get("row_count"):
+        run_in_background(ServiceFactory.get_rag().add_example, request.question, result["sql_query"])
+
+DISCONNECT_POLL_SECONDS = 0.5
+
+class ClientDisconnected(Exception):
+    pass
+
+async def run_guarded(coro, http_request: Request):
+    """
+    Runs the agent graph under the request deadline. The graph task is cancelled (which cancels a
+    running query on the database) when the deadline passes or the client disconnects.
+    """
+    task = asyncio.ensure_future(coro)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + REQUEST_DEADLINE_SECONDS
+    try:
+        while True:
+            await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if task.done():
+                return task.result()
+            if await http_request.is_disconnected():
+                raise ClientDisconnected()
+            if loop.time() >= deadline:
+                raise TimeoutError()
+    finally:
+        if not task.done():
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
 @app.post("/chat", response_model=QueryResponse)
-async def chat_endpoint(request: QueryRequest):
+async def chat_endpoint(request: QueryRequest, http_request: Request):
+    trace = start_request("/chat")
     try:
-        schema_context = db.get_schema_string()
-        rag_context = rag.retrieve_similar_examples(request.question)
-
-
-        initial_state = {
-            "question": request.question,
-            "chat_history": request.chat_history[:-1],
-            "schema_context": schema_context,
-            "rag_examples": rag_context,
-            "retry_count": 0,
-            "error": None,
-            "sql_query": "",
-            "query_result": "",
-            "validation_status": "",
-            "final_answer": ""
-        }
-
-        result = agent_app.invoke(initial_state)
-
-        return QueryResponse(
-            answer=result.get("final_answer", "No answer generated."),
-            sql_query=result.get("sql_query"),
-            data=result.get("query_result")
-        )
+        cached, schema_version = await get_cached_answer(request)
+        if cached:
+            finish_request(trace, "cache_hit")
+            return cached.model_copy(update={"request_id": trace.request_id})
 
+        initial_state = await build_initial_state(request, trace.request_id)
+        result = await run_guarded(agent_app.ainvoke(initial_state), http_request)
+        remember_answer(request, schema_version, result)
+        finish_request(trace, "ok", result)
+        return to_query_response(result)
+
+    except ClientDisconnected:
+        finish_request(trace, "disconnected")
+        print(f"🔌 Client disconnected, cancelled: {request.question}")
+        return QueryResponse(answer="Client disconnected.", request_id=trace.request_id)
+    except TimeoutError:
+        finish_request(trace, "timeout")
+        return QueryResponse(answer=f"System Error: request exceeded the {REQUEST_DEADLINE_SECONDS}s deadline.",
+                             request_id=trace.request_id)
     except Exception as e:
-        return QueryResponse(answer=f"System Error: {str(e)}")
+        finish_request(trace, "error")
+        return QueryResponse(answer=f"System Error: {str(e)}", request_id=trace.request_id)
+
+def sse_event(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+# What each graph node reports to the client when it finishes
+NODE_EVENT_FIELDS = {
+    "resolution": ("sql_query", "retry_count", "speculative_winner"),
+    "static_validation": ("static_validation_status", "error", "round_trips_saved"),
+    "extraction": ("row_count", "result_id", "error"),
+    "validation": ("validation_status", "error"),
+    "summarizer": ()
+}
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: QueryRequest):
+    """
+    Streams agent progress as server-sent events: one 'node' event per finished graph node,
+    'token' events for the answer as it is generated, then a final 'done' event with the full response.
+    A client disconnect cancels the stream (and any running query); so does the request deadline.
+    """
+    async def event_stream():
+        trace = start_request("/chat/stream")
+        outcome, state = "disconnected", None
+        yield sse_event("start", {"question": request.question, "request_id": trace.request_id})
+        try:
+            cached, schema_version = await get_cached_answer(request)
+            if cached:
+                outcome = "cache_hit"
+                yield sse_event("node", {"node": "cache"})
+                yield sse_event("done", {**cached.model_dump(), "request_id": trace.request_id})
+                return
+
+            state = await build_initial_state(request, trace.request_id)
+            if state["fast_path"]:
+                yield sse_event("node", {"node": "fast_path", "sql_query": state["sql_query"]})
+            async with asyncio.timeout(REQUEST_DEADLINE_SECONDS):
+                async for mode, payload in agent_app.astream(state, stream_mode=["updates", "messages"]):
+                    if mode == "messages":
+                        chunk, metadata = payload
+                        if ANSWER_STREAM_TAG in (metadata.get("tags") or []) and chunk.content:
+                            yield sse_event("token", {"text": chunk.content})
+                        continue
+
+                    for node, update in payload.items():
+                        state.update(update or {})
+                        fields = NODE_EVENT_FIELDS.get(node, ())
+                        yield sse_event("node", {"node": node, **{f: state.get(f) for f in fields}})
+
+            remember_answer(request, schema_version, state)
+            outcome = "ok"
+            yield sse_event("done", to_query_response(state).model_dump())
+        except TimeoutError:
+            outcome = "timeout"
+            yield sse_event("error", {"message": f"System Error: request exceeded the {REQUEST_DEADLINE_SECONDS}s deadline."})
+        except Exception as e:
+            outcome = "error"
+            yield sse_event("error", {"message": f"System Error: {str(e)}"})
+        finally:
+            finish_request(trace, outcome, state)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.post("/get_ingested_table", status_code=200)
 def get_ingested_table():
-    query = """
-        SELECT table_name 
-        FROM information_schema.tables 
-        WHERE table_schema = 'public'
-        ORDER BY table_name;
+    try:
+        return {"tables": list(ServiceFactory.get_db().schema_catalog.get_tables())}
+    except Exception as e:
+        return {"tables": [], "error": str(e)}
+
+@app.get("/examples")
+def list_examples():
+    return {"examples": ServiceFactory.get_rag().list_examples()}
+
+@app.post("/examples")
+async def add_example(request: ExampleRequest):
+    try:
+        rag = await ServiceFactory.aget("rag")
+        ex_id = await asyncio.to_thread(rag.add_example, request.question, request.sql)
+        return {"status": "success", "id": ex_id}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/examples/{example_id}")
+async def remove_example(example_id: str):
+    rag = await ServiceFactory.aget("rag")
+    if not await asyncio.to_thread(rag.remove_example, example_id):
+        raise HTTPException(status_code=404, detail=f"Example '{example_id}' not found.")
+    return {"status": "success", "id": example_id}
+
+@app.get("/healthz")
+def liveness():
+    """Liveness: the worker is up and serving. Never touches the database or the indexes."""
+    return {"status": "alive", "pid": startup["pid"],
+            "uptime_seconds": round(time.perf_counter() - IMPORT_STARTED, 3)}
+
+@app.get("/readyz")
+async def readiness():
+    """
+    Readiness: 200 once the shared services are warmed up and the database answers, 503 before that.
+    Reports the cold-start timings of this worker either way.
     """
+    if STARTUP_WARM_UP_ENABLED and not startup["warmed_up"] and not startup["warming_up"]:
+        # The last warm-up failed, e.g. the database or Ollama was still starting
+        start_warm_up()
 
-    result = db.execute_query(query)
-    if not result.get("success"):
-        return {"tables": [], "error": result.get("error")}
+    database, error = False, startup["error"]
+    if ServiceFactory.is_ready("db") or not STARTUP_WARM_UP_ENABLED:
+        try:
+            async with asyncio.timeout(READINESS_CHECK_TIMEOUT_SECONDS):
+                db = await ServiceFactory.aget("db")
+                database = await db.aping()
+        except Exception as e:
+            error = str(e) or f"database check exceeded {READINESS_CHECK_TIMEOUT_SECONDS}s"
 
-    raw_df = result.get("raw_df")
+    ready = database and (startup["warmed_up"] or not STARTUP_WARM_UP_ENABLED)
+    body = {"status": "ready" if ready else "starting", "database": database, "error": None if ready else error,
+            "startup": {**startup, "services": ServiceFactory.timings}}
+    return JSONResponse(body, status_code=200 if ready else 503)
 
-    if raw_df is None or raw_df.empty:
-        return {"tables": []}
+@app.get("/stats")
+def get_stats():
+    return {
+        "cache": query_cache.stats(),
+        "sql_fast_path": ServiceFactory.get_rag().fast_path_stats(),
+        "static_validation": sql_validator.stats(),
+        "execution_guard": ServiceFactory.get_db().guard_stats,
+        "llm_scheduler": LLMFactory.get_scheduler().stats(),
+        "speculative_sql": speculation_stats,
+        "answer_fast_path": answer_formatter_stats.stats(),
+        "rollups": ServiceFactory.get_rollups().stats(),
+        "ingest_jobs": ingest_jobs.stats(),
+        "startup": {**startup, "services": ServiceFactory.timings}
+    }
+
+@app.get("/indexes")
+async def list_index_advice(table_name: str = None):
+    """Index advisor decisions (created / recommended / rejected / existing) and the last run."""
+    try:
+        index_advisor = await ServiceFactory.aget("index_advisor")
+        decisions = await asyncio.to_thread(index_advisor.decisions, table_name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"decisions": decisions, "last_run": index_advisor.last_run}
+
+@app.post("/indexes/advise")
+async def run_index_advisor(table_name: str = None):
+    try:
+        index_advisor = await ServiceFactory.aget("index_advisor")
+        return await asyncio.to_thread(index_advisor.run, table_name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-    table_list = raw_df["table_name"].tolist()
-    table_list.remove("column_metadata") if "column_metadata" in table_list else None
-    return {"tables": table_list}
+@app.get("/rollups")
+def list_rollups():
+    """Materialized rollups with their size, refresh cost and hits, plus overall hit rate."""
+    rollup_manager = ServiceFactory.get_rollups()
+    return {"rollups": rollup_manager.list_rollups(), "stats": rollup_manager.stats()}
+
+@app.post("/rollups/discover")
+async def discover_rollups():
+    try:
+        rollup_manager = await ServiceFactory.aget("rollups")
+        return await asyncio.to_thread(rollup_manager.discover)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus exposition of request, node, DB, RAG and LLM latency / token / row histograms."""
+    return Response(metrics_exposition(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/traces/{request_id}")
+def get_trace(request_id: str):
+    trace = traces.get(request_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"Trace '{request_id}' not found.")
+    return trace.to_dict()
+
+@app.get("/results/{result_id}")
+def get_result_page(result_id: str,
+                    offset: int = Query(0, ge=0),
+                    limit: int = Query(100, ge=1, le=10000)):
+    try:
+        return ServiceFactory.get_result_store().get_page(result_id, offset, limit)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+
+@app.get("/results/{result_id}/download")
+def download_result(result_id: str, format: str = Query("csv")):
+    try:
+        path = ServiceFactory.get_result_store().export(result_id, format)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FileResponse(path, filename=f"result_{result_id}.{format}")
 
 
 if __name__ == "__main__":
@@ -9,7 +9,14 @@ class MetadataRequest(BaseModel):
     table_name: str
     descriptions: Dict[str, str]
 
+class ExampleRequest(BaseModel):
+    question: str
+    sql: str
+
 class QueryResponse(BaseModel):
     answer: str
     sql_query: Optional[str] = None
-    data: Optional[str] = None
\ No newline at end of file
+    data: Optional[str] = None
+    row_count: Optional[int] = None
+    result_id: Optional[str] = None
+    request_id: Optional[str] = None
@@ -0,0 +1,160 @@
+import datetime
+import decimal
+import re
+
+import numpy as np
+import pandas as pd
+
+from api.configuration.configuration import (
+    ANSWER_FORMATTER_MAX_ROWS,
+    ANSWER_FORMATTER_MAX_COLUMNS,
+    ANSWER_LOCALE,
+    ANSWER_CURRENCY_SYMBOL
+)
+
+# Questions that ask for interpretation rather than values always go to the LLM
+NEEDS_LLM_PATTERN = re.compile(
+    r"\b(why|explain|analy[sz]e|analysis|insights?|compare|comparison|trends?|recommend|summar(y|ize|ise)|"
+    r"describe|reason|suggest|should)\b",
+    re.IGNORECASE
+)
+CURRENCY_PATTERN = re.compile(r"amount|price|revenue|sales|cost|value|income|spend", re.IGNORECASE)
+# Output names Postgres gives unnamed expressions - not useful as a label
+GENERIC_LABELS = {"?column?", "sum", "count", "avg", "min", "max", "round", "coalesce", "result", "value"}
+
+# decimal separator, thousands separator, grouping style, date format
+LOCALES = {
+    "en_US": (".", ",", "western", "%B %d, %Y"),
+    "en_GB": (".", ",", "western", "%d %B %Y"),
+    "en_IN": (".", ",", "indian", "%d %B %Y"),
+    "de_DE": (",", ".", "western", "%d. %B %Y")
+}
+
+
+def _group_digits(digits: str, style: str, separator: str) -> str:
+    if style == "indian" and len(digits) > 3:
+        # 12,34,567: last three digits, then groups of two
+        head, tail = digits[:-3], digits[-3:]
+        groups = []
+        while len(head) > 2:
+            groups.insert(0, head[-2:])
+            head = head[:-2]
+        return separator.join(([head] if head else []) + groups + [tail])
+    groups = []
+    while len(digits) > 3:
+        groups.insert(0, digits[-3:])
+        digits = digits[:-3]
+    return separator.join([digits] + groups)
+
+
+def format_number(value, locale: str = ANSWER_LOCALE, decimals: int = 2) -> str:
+    decimal_sep, thousands_sep, style, _ = LOCALES.get(locale, LOCALES["en_US"])
+    value = float(value)
+    text = f"{abs(value):.{0 if value.is_integer() else decimals}f}"
+    whole, _, fraction = text.partition(".")
+    result = _group_digits(whole, style, thousands_sep) + (decimal_sep + fraction if fraction else "")
+    return f"-{result}" if value < 0 else result
+
+
+def format_value(value, column: str, description: str = "", locale: str = ANSWER_LOCALE) -> str:
+    if value is None or (isinstance(value, float) and np.isnan(value)) or value is pd.NaT:
+        return "no value"
+    if isinstance(value, (bool, np.bool_)):
+        return "yes" if value else "no"
+    if isinstance(value, (int, float, decimal.Decimal, np.integer, np.floating)):
+        number = format_number(value, locale)
+        is_money = CURRENCY_PATTERN.search(f"{column} {description or ''}")
+        return f"{ANSWER_CURRENCY_SYMBOL}{number}" if is_money and ANSWER_CURRENCY_SYMBOL else number
+    if isinstance(value, (datetime.datetime, pd.Timestamp)) and (value.hour or value.minute or value.second):
+        return value.strftime(LOCALES.get(locale, LOCALES["en_US"])[3] + " %H:%M")
+    if isinstance(value, (datetime.date, pd.Timestamp)):
+        return value.strftime(LOCALES.get(locale, LOCALES["en_US"])[3])
+    return str(value)
+
+
+def humanize(column: str) -> str:
+    return re.sub(r"[_\s]+", " ", str(column)).strip()
+
+
+def classify_shape(df, question: str, truncated: bool = False,
+                   max_rows: int = ANSWER_FORMATTER_MAX_ROWS,
+                   max_columns: int = ANSWER_FORMATTER_MAX_COLUMNS) -> str:
+    """Returns "empty", "scalar", "single_row", "top_n" or "llm" for a query result."""
+    if NEEDS_LLM_PATTERN.search(question) or truncated:
+        return "llm"
+    if df is None or df.empty:
+        return "empty"
+    if len(df.columns) > max_columns:
+        return "llm"
+    if df.shape == (1, 1):
+        return "scalar"
+    if len(df) == 1:
+        return "single_row"
+    if len(df) <= max_rows:
+        return "top_n"
+    return "llm"
+
+
+def format_answer(question: str, df, descriptions: dict = None, truncated: bool = False):
+    """
+    Builds a deterministic natural-language answer for small result shapes (scalar, single row,
+    short top-N table). Returns (shape, answer); answer is None when the shape needs the LLM.
+    """
+    descriptions = descriptions or {}
+    shape = classify_shape(df, question, truncated)
+
+    def value(row, col):
+        return format_value(row[col], col, descriptions.get(col))
+
+    if shape == "empty":
+        return shape, "The query returned no matching rows."
+
+    if shape == "scalar":
+        col = df.columns[0]
+        label = humanize(col)
+        rendered = value(df.iloc[0], col)
+        if label.lower() in GENERIC_LABELS:
+            return shape, f"The answer to \"{question.strip()}\" is **{rendered}**."
+        return shape, f"The {label} is **{rendered}**."
+
+    if shape == "single_row":
+        row = df.iloc[0]
+        parts = [f"- **{humanize(col)}**: {value(row, col)}" for col in df.columns]
+        return shape, f"Here is the result for \"{question.strip()}\":\n" + "\n".join(parts)
+
+    if shape == "top_n":
+        numeric = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])
+                   or isinstance(df[c].dropna().iloc[0] if df[c].notna().any() else None, decimal.Decimal)]
+        lines = []
+        for i, (_, row) in enumerate(df.iterrows(), start=1):
+            labels = [str(value(row, c)) for c in df.columns if c not in numeric]
+            measures = [f"{humanize(c)} {value(row, c)}" if len(numeric) > 1 or not labels else value(row, c)
+                        for c in numeric]
+            lines.append(f"{i}. " + (" / ".join(labels) + ": " if labels else "") + ", ".join(measures))
+        return shape, f"Here are the {len(df)} results for \"{question.strip()}\":\n" + "\n".join(lines)
+
+    return shape, None
+
+
+class AnswerFormatterStats:
+    """Counts answers built without an LLM call, by result shape."""
+
+    def __init__(self):
+        self.by_shape = {}
+        self.llm = 0
+
+    def record(self, shape: str, used_llm: bool):
+        if used_llm:
+            self.llm += 1
+        else:
+            self.by_shape[shape] = self.by_shape.get(shape, 0) + 1
+
+    def stats(self) -> dict:
+        deterministic = sum(self.by_shape.values())
+        total = deterministic + self.llm
+        return {
+            "deterministic": deterministic,
+            "llm": self.llm,
+            "by_shape": dict(self.by_shape),
+            "hit_rate": round(deterministic / total, 4) if total else None
+        }
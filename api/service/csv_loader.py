@@ -0,0 +1,362 @@
+import datetime
+import io
+import time
+
+import pandas as pd
+
+from api.configuration.configuration import INGEST_CHUNK_ROWS
+from api.service.type_inference import ColumnType, infer_column_type
+
+READ_BUFFER_BYTES = 1024 * 1024
+
+INGEST_MODES = ("replace", "append", "upsert")
+PARTITION_TYPES = {"DATE", "TIMESTAMP"}
+UPSERT_STAGING_TABLE = '"__ingest_stage"'
+
+# information_schema data types of existing columns -> the type the CSV values are cleaned for
+EXISTING_TYPES = {
+    "bigint": "BIGINT", "integer": "BIGINT", "smallint": "BIGINT",
+    "numeric": "NUMERIC", "double precision": "NUMERIC", "real": "NUMERIC",
+    "boolean": "BOOLEAN", "date": "DATE", "timestamp without time zone": "TIMESTAMP"
+}
+
+
+def quote_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def normalize_column_name(name: str) -> str:
+    return name.lower().replace(" ", "_")
+
+
+def partition_name(table_name: str, suffix: str) -> str:
+    return f"{table_name[:50]}_p{suffix}"
+
+
+class _CountingStream(io.RawIOBase):
+    """Wraps a binary stream and counts the bytes pulled through it."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = self.raw.read(len(b))
+        n = len(data)
+        b[:n] = data
+        self.bytes_read += n
+        return n
+
+
+class StreamingCsvLoader:
+    """
+    Streams a CSV into PostgreSQL in bounded chunks using COPY FROM STDIN.
+    Memory use depends on the chunk size only, never on the file size.
+    """
+
+    def __init__(self, engine, chunk_size: int = INGEST_CHUNK_ROWS):
+        self.engine = engine
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def _fit_chunk(series: pd.Series, column_type: ColumnType):
+        """
+        Cleans a chunk for column_type. Returns (values, column_type) where column_type is widened until
+        every value of the chunk parses: a value that doesn't fit the inferred type is never loaded as NULL.
+        """
+        while True:
+            values, failed = column_type.convert(series)
+            if column_type.pg_type == "TEXT" or not failed.any():
+                return values, column_type
+            column_type = column_type.widen()
+
+    @staticmethod
+    def _existing_columns(cursor, table_name: str) -> dict:
+        """{column: data_type} of an existing table, in column order; empty when it doesn't exist."""
+        cursor.execute("""
+            SELECT column_name, data_type FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = %s
+            ORDER BY ordinal_position
+        """, (table_name,))
+        return dict(cursor.fetchall())
+
+    @staticmethod
+    def _type_for_existing(data_type: str, sample: pd.Series) -> ColumnType:
+        """The existing column's type, with the source format (e.g. date format) detected in the new data."""
+        pg_type = EXISTING_TYPES.get(data_type, "TEXT")
+        inferred = infer_column_type(sample)
+        if inferred.pg_type == pg_type:
+            return inferred
+        return ColumnType(pg_type, inferred.source_format)
+
+    @staticmethod
+    def _partition_column(cursor, table_name: str):
+        cursor.execute("""
+            SELECT a.attname FROM pg_partitioned_table p
+            JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+            WHERE p.partrelid = to_regclass(%s)
+        """, (quote_ident(table_name),))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _drop_dependent_views(cursor, table_name: str, column: str, dropped: dict):
+        """
+        Drops the (materialized) views reading column, e.g. rollups, so its type can be altered.
+        Their definitions are kept in dropped ({name: (kind, SELECT)}) to recreate them after the load.
+        """
+        cursor.execute("""
+            SELECT DISTINCT v.relname, v.relkind, pg_get_viewdef(v.oid)
+            FROM pg_depend d
+            JOIN pg_rewrite r ON r.oid = d.objid
+            JOIN pg_class v ON v.oid = r.ev_class
+            JOIN pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+            WHERE d.refobjid = to_regclass(%s) AND a.attname = %s AND v.oid <> d.refobjid
+        """, (quote_ident(table_name), column))
+        for name, kind, definition in cursor.fetchall():
+            view_kind = "MATERIALIZED VIEW" if kind == "m" else "VIEW"
+            print(f"🧮 Dropping {view_kind.lower()} '{name}' while '{column}' is widened, recreated after the load.")
+            cursor.execute(f"DROP {view_kind} {quote_ident(name)}")
+            dropped[name] = (view_kind, definition)
+
+    @staticmethod
+    def _recreate_views(cursor, dropped: dict):
+        for name, (view_kind, definition) in dropped.items():
+            cursor.execute(f"CREATE {view_kind} {quote_ident(name)} AS {definition.rstrip().rstrip(';')}")
+
+    @staticmethod
+    def _choose_partition_column(partition_by: str, columns: list, col_types: dict):
+        if not partition_by:
+            return None
+        date_columns = [c for c in columns if col_types[c].pg_type in PARTITION_TYPES]
+        if partition_by == "auto":
+            if not date_columns:
+                print("⚠️ No date column detected, creating an unpartitioned table.")
+                return None
+            return date_columns[0]
+        column = normalize_column_name(partition_by)
+        if column not in date_columns:
+            raise ValueError(f"Partition column '{partition_by}' is not a detected date column "
+                             f"(date columns: {', '.join(date_columns) or 'none'}).")
+        return column
+
+    @staticmethod
+    def _create_table(cursor, table_name: str, columns: list, col_types: dict, partition_column: str = None):
+        table = quote_ident(table_name)
+        col_defs = ", ".join(f"{quote_ident(c)} {col_types[c].pg_type}" for c in columns)
+        if not partition_column:
+            cursor.execute(f"CREATE TABLE {table} ({col_defs})")
+            return
+        cursor.execute(f"CREATE TABLE {table} ({col_defs}) PARTITION BY RANGE ({quote_ident(partition_column)})")
+        # Rows without a date have no range to go to
+        cursor.execute(f"CREATE TABLE {quote_ident(partition_name(table_name, 'default'))} "
+                       f"PARTITION OF {table} DEFAULT")
+        print(f"🗓️ Created '{table_name}' partitioned by month on '{partition_column}'.")
+
+    @staticmethod
+    def _ensure_partitions(cursor, table_name: str, values: pd.Series, known: set):
+        """Creates the monthly partitions the chunk's (cleaned, ISO-formatted) dates fall into."""
+        for month in sorted(set(values.dropna().str[:7]) - known):
+            first = datetime.date(int(month[:4]), int(month[5:7]), 1)
+            following = datetime.date(first.year + first.month // 12, first.month % 12 + 1, 1)
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {quote_ident(partition_name(table_name, first.strftime('%Y%m')))} "
+                f"PARTITION OF {quote_ident(table_name)} FOR VALUES FROM ('{first}') TO ('{following}')"
+            )
+            known.add(month)
+
+    @staticmethod
+    def _prepare_upsert(cursor, table_name: str, key_columns: list, partition_column: str = None):
+        """ON CONFLICT needs a unique index on the keys; on a partitioned table it must cover the partition key."""
+        if partition_column and partition_column not in key_columns:
+            raise ValueError(f"Upsert keys of a partitioned table must include the partition column "
+                             f"'{partition_column}'.")
+        index = quote_ident(f"{table_name[:50]}_upsert_key")
+        keys = ", ".join(quote_ident(k) for k in key_columns)
+        cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {index} ON {quote_ident(table_name)} ({keys})")
+
+    @staticmethod
+    def _upsert_chunk(cursor, table_name: str, buffer, columns: list, col_types: dict, key_columns: list):
+        """
+        COPYs the chunk into a text staging table and merges it with INSERT ... ON CONFLICT.
+        Returns (inserted, updated) row counts.
+        """
+        cursor.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS {UPSERT_STAGING_TABLE}
+            ("__ord" BIGSERIAL, {", ".join(f"{quote_ident(c)} TEXT" for c in columns)}) ON COMMIT DROP
+        """)
+        cursor.execute(f"TRUNCATE {UPSERT_STAGING_TABLE}")
+        cursor.copy_expert(
+            f"COPY {UPSERT_STAGING_TABLE} ({', '.join(quote_ident(c) for c in columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+
+        typed = {c: f"CAST({quote_ident(c)} AS {col_types[c].pg_type})" for c in columns}
+        keys = ", ".join(typed[k] for k in key_columns)
+        updates = [f"{quote_ident(c)} = EXCLUDED.{quote_ident(c)}" for c in columns if c not in key_columns]
+        # A key repeated within the chunk would hit the same row twice; keep its last occurrence.
+        # Rows whose key already exists are counted up front: RETURNING xmax fails on partitioned tables.
+        table = quote_ident(table_name)
+        cursor.execute(f"""
+            WITH source AS (
+                SELECT DISTINCT ON ({keys}) {", ".join(f"{typed[c]} AS {quote_ident(c)}" for c in columns)}
+                FROM {UPSERT_STAGING_TABLE}
+                ORDER BY {keys}, "__ord" DESC
+            ), existing AS (
+                SELECT count(*) AS n FROM source JOIN {table} t
+                    ON {" AND ".join(f"t.{quote_ident(k)} = source.{quote_ident(k)}" for k in key_columns)}
+            ), upserted AS (
+                INSERT INTO {table} ({", ".join(quote_ident(c) for c in columns)})
+                SELECT * FROM source
+                ON CONFLICT ({", ".join(quote_ident(k) for k in key_columns)})
+                DO {"UPDATE SET " + ", ".join(updates) if updates else "NOTHING"}
+                RETURNING 1
+            )
+            SELECT (SELECT count(*) FROM upserted) - {"(SELECT n FROM existing)" if updates else "0"},
+                   {"(SELECT n FROM existing)" if updates else "0"}
+        """)
+        return cursor.fetchone()
+
+    def load(self, source, table_name: str, mode: str = "replace", key_columns: list = None,
+             partition_by: str = None, progress_callback=None) -> dict:
+        """
+        Loads the CSV at source (a path or a binary file object) into table_name.
+        mode "replace" recreates the table, "append" adds the rows and "upsert" merges them on
+        key_columns (last row in the file wins). Appending to an existing table adds new CSV columns
+        and keeps the table's column types. partition_by ("auto" or a DATE/TIMESTAMP column) creates a
+        new table range-partitioned by month; monthly partitions are added as the data needs them.
+        Column types are inferred from the first chunk and values are cleaned into native Postgres types.
+        Returns ingest statistics: rows, bytes, seconds, rows_per_sec, bytes_per_sec, columns and column_types.
+        """
+        if mode not in INGEST_MODES:
+            raise ValueError(f"Unknown ingest mode '{mode}', expected one of {', '.join(INGEST_MODES)}.")
+        key_columns = [normalize_column_name(k) for k in key_columns or []]
+        if mode == "upsert" and not key_columns:
+            raise ValueError("Upsert needs at least one key column.")
+
+        start = time.perf_counter()
+        raw = open(source, "rb") if isinstance(source, str) else source
+        counter = _CountingStream(raw)
+        reader = pd.read_csv(
+            io.BufferedReader(counter, buffer_size=READ_BUFFER_BYTES), chunksize=self.chunk_size, dtype=str
+        )
+
+        table = quote_ident(table_name)
+        conn = self.engine.raw_connection()
+        rows, inserted, updated = 0, 0, 0
+        columns, table_columns, col_types = [], [], {}
+        new_columns, partition_column, partitions = [], None, set()
+        dropped_views = {}
+
+        try:
+            cursor = conn.cursor()
+            for chunk in reader:
+                chunk.columns = [normalize_column_name(c) for c in chunk.columns]
+
+                if not columns:
+                    columns = chunk.columns.tolist()
+                    missing_keys = [k for k in key_columns if k not in columns]
+                    if missing_keys:
+                        raise ValueError(f"Key columns not in the CSV: {', '.join(missing_keys)}.")
+
+                    existing = {} if mode == "replace" else self._existing_columns(cursor, table_name)
+                    if existing:
+                        # Keep the table's types (widened below if the new data needs it), add new columns
+                        col_types = {c: self._type_for_existing(existing[c], chunk[c]) if c in existing
+                                     else infer_column_type(chunk[c]) for c in columns}
+                        new_columns = [c for c in columns if c not in existing]
+                        for col in new_columns:
+                            print(f"➕ Adding column '{col}' ({col_types[col].pg_type}) to '{table_name}'.")
+                            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {quote_ident(col)} {col_types[col].pg_type}")
+                        table_columns = list(existing) + new_columns
+                        partition_column = self._partition_column(cursor, table_name)
+                    else:
+                        col_types = {c: infer_column_type(chunk[c]) for c in columns}
+                        partition_column = self._choose_partition_column(partition_by, columns, col_types)
+                        if mode == "replace":
+                            cursor.execute(f"DROP TABLE IF EXISTS {table} CASCADE")
+                        self._create_table(cursor, table_name, columns, col_types, partition_column)
+                        table_columns = columns
+
+                    if mode == "upsert":
+                        self._prepare_upsert(cursor, table_name, key_columns, partition_column)
+
+                for col in columns:
+                    fitted, new_type = self._fit_chunk(chunk[col], col_types[col])
+                    if new_type.pg_type != col_types[col].pg_type:
+                        if col == partition_column:
+                            # PostgreSQL can't alter the type of a partition key
+                            raise ValueError(
+                                f"Column '{col}' is the partition key of '{table_name}' and has values that "
+                                f"are not {col_types[col].pg_type}; fix them in the file or reload with mode=replace.")
+                        self._drop_dependent_views(cursor, table_name, col, dropped_views)
+                        print(f"↕️ Widening column '{col}' from {col_types[col].pg_type} to {new_type.pg_type}.")
+                        cursor.execute(
+                            f"ALTER TABLE {table} ALTER COLUMN {quote_ident(col)} "
+                            f"TYPE {new_type.pg_type} USING {quote_ident(col)}::{new_type.pg_type}"
+                        )
+                        col_types[col] = new_type
+                    chunk[col] = fitted
+
+                if partition_column in columns:
+                    self._ensure_partitions(cursor, table_name, chunk[partition_column], partitions)
+
+                buffer = io.StringIO()
+                chunk.to_csv(buffer, index=False, header=False)
+                buffer.seek(0)
+                if mode == "upsert":
+                    chunk_inserted, chunk_updated = self._upsert_chunk(cursor, table_name, buffer, columns,
+                                                                       col_types, key_columns)
+                    inserted += chunk_inserted
+                    updated += chunk_updated
+                else:
+                    cursor.copy_expert(
+                        f"COPY {table} ({', '.join(quote_ident(c) for c in columns)}) FROM STDIN WITH (FORMAT csv)",
+                        buffer
+                    )
+                    inserted += len(chunk)
+                rows += len(chunk)
+
+                if progress_callback:
+                    progress_callback(rows, counter.bytes_read)
+
+            if not columns:
+                raise ValueError("CSV file contains no data rows.")
+
+            self._recreate_views(cursor, dropped_views)
+            # Committed with the data: caches of every worker keyed on the old version stop matching
+            cursor.execute("""
+                INSERT INTO table_versions (table_name) VALUES (%s)
+                ON CONFLICT (table_name) DO UPDATE SET version = table_versions.version + 1, updated_at = now()
+            """, (table_name,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+            if isinstance(source, str):
+                raw.close()
+
+        seconds = time.perf_counter() - start
+        return {
+            "rows": rows,
+            "bytes": counter.bytes_read,
+            "seconds": round(seconds, 3),
+            "rows_per_sec": round(rows / seconds, 1) if seconds else None,
+            "bytes_per_sec": round(counter.bytes_read / seconds, 1) if seconds else None,
+            "mode": mode,
+            "rows_inserted": inserted,
+            "rows_updated": updated,
+            "new_columns": new_columns,
+            "partition_column": partition_column,
+            "partition_months": sorted(partitions),
+            "columns": table_columns,
+            "column_types": {
+                c: {"original_type": col_types[c].source_format, "inferred_type": col_types[c].pg_type}
+                for c in columns
+            }
+        }
@@ -0,0 +1,319 @@
+import datetime
+import decimal
+
+import numpy as np
+import pandas as pd
+
+from api.configuration.configuration import PROFILE_TOP_K, PROFILE_SAMPLE_ROWS
+
+# Group-by breakdowns are only computed for columns with at most this many distinct values
+MAX_GROUP_CARDINALITY = 1000
+MAX_GROUP_COLUMNS = 3
+MAX_MEASURE_COLUMNS = 3
+
+
+def _fmt(value) -> str:
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return "n/a"
+    if isinstance(value, (int, np.integer)):
+        return f"{int(value):,}"
+    if isinstance(value, (float, np.floating)):
+        if float(value).is_integer() and abs(value) < 1e15:
+            return f"{int(value):,}"
+        return f"{value:,.2f}" if abs(value) >= 1 else f"{value:.4g}"
+    return str(value)
+
+
+def _column_kind(series: pd.Series):
+    """
+    "numeric", "temporal" or "categorical". NUMERIC and DATE values come back from the database as
+    Decimal / date objects. None for a column that only holds nulls so far.
+    """
+    non_null = series.dropna()
+    first = non_null.iloc[0] if len(non_null) else None
+
+    if pd.api.types.is_bool_dtype(series) or isinstance(first, (bool, np.bool_)):
+        return "categorical"
+    if pd.api.types.is_numeric_dtype(series) or isinstance(first, decimal.Decimal):
+        return "numeric"
+    if pd.api.types.is_datetime64_any_dtype(series) or isinstance(first, (datetime.date, datetime.datetime)):
+        return "temporal"
+    return "categorical" if first is not None else None
+
+
+def _convert(series: pd.Series, kind: str) -> pd.Series:
+    if kind == "numeric":
+        return pd.to_numeric(series, errors="coerce").astype(float)
+    if kind == "temporal":
+        return pd.to_datetime(series, errors="coerce", utc=True).dt.tz_localize(None)
+    return series.astype(str).where(series.notna(), None)
+
+
+def _classify_columns(df: pd.DataFrame):
+    """Splits columns into numeric, temporal and categorical, converting them to native dtypes."""
+    numeric, temporal, categorical = {}, {}, {}
+    for col in df.columns:
+        kind = _column_kind(df[col]) or "categorical"
+        {"numeric": numeric, "temporal": temporal, "categorical": categorical}[kind][col] = _convert(df[col], kind)
+    return numeric, temporal, categorical
+
+
+def _numeric_section(numeric: dict, top_k: int) -> list:
+    lines = []
+    for col, s in numeric.items():
+        valid = s.dropna()
+        if valid.empty:
+            lines.append(f"- {col}: all values null")
+            continue
+
+        q1, median, q3 = np.percentile(valid, [25, 50, 75])
+        iqr = q3 - q1
+        outliers = valid[(valid < q1 - 1.5 * iqr) | (valid > q3 + 1.5 * iqr)] if iqr > 0 else valid.iloc[:0]
+        line = (f"- {col}: sum={_fmt(valid.sum())}, mean={_fmt(valid.mean())}, median={_fmt(median)}, "
+                f"min={_fmt(valid.min())}, p25={_fmt(q1)}, p75={_fmt(q3)}, max={_fmt(valid.max())}, "
+                f"std={_fmt(valid.std())}, nulls={_fmt(int(s.isna().sum()))}")
+        if len(outliers):
+            extremes = outliers.abs().nlargest(min(top_k, 5)).index
+            line += (f", outliers={_fmt(len(outliers))} "
+                     f"(most extreme: {', '.join(_fmt(v) for v in valid.loc[extremes])})")
+        lines.append(line)
+    return lines
+
+
+def _categorical_line(col, counts: pd.Series, nulls: int, top_k: int) -> str:
+    """counts: occurrences per value, most frequent first."""
+    total = int(counts.sum())
+    if total > top_k and len(counts) == total:
+        return f"- {col}: unique per row (identifier), nulls={_fmt(nulls)}"
+    top = ", ".join(f"{value} ({_fmt(int(n))}, {n / total:.1%})" for value, n in counts.head(top_k).items()) \
+        if total else "n/a"
+    return f"- {col}: {_fmt(len(counts))} distinct, nulls={_fmt(nulls)}; top: {top}"
+
+
+def _categorical_section(categorical: dict, top_k: int) -> list:
+    return [_categorical_line(col, s.value_counts(dropna=True), int(s.isna().sum()), top_k)
+            for col, s in categorical.items()]
+
+
+def _group_line(group_col, measure, sums: pd.Series, top_k: int) -> str:
+    """sums: total of measure per value of group_col."""
+    total = sums.sum()
+    parts = [f"{key}: {_fmt(value)}" + (f" ({value / total:.1%})" if total else "")
+             for key, value in sums.sort_values(ascending=False).head(top_k).items()]
+    return f"- top {group_col} by total {measure} ({_fmt(len(sums))} groups): {'; '.join(parts)}"
+
+
+def _group_section(numeric: dict, categorical: dict, top_k: int) -> list:
+    lines = []
+    group_cols = [c for c, s in categorical.items() if 1 < s.nunique(dropna=True) <= MAX_GROUP_CARDINALITY]
+    measures = list(numeric)[:MAX_MEASURE_COLUMNS]
+    for group_col in group_cols[:MAX_GROUP_COLUMNS]:
+        for measure in measures:
+            lines.append(_group_line(group_col, measure, numeric[measure].groupby(categorical[group_col]).sum(), top_k))
+    return lines
+
+
+def _trend_lines(time_col, start, end, daily: dict) -> list:
+    """daily: {series name: total per day}, indexed by the day's timestamp."""
+    span_days = (end - start).days
+    lines = [f"- {time_col}: from {start.date()} to {end.date()} ({_fmt(span_days)} days)"]
+    if span_days < 2:
+        return lines
+
+    # Bucket size that gives a readable number of periods for the span
+    freq, label = ("D", "day") if span_days <= 62 else ("W", "week") if span_days <= 366 else \
+        ("M", "month") if span_days <= 366 * 5 else ("Y", "year")
+    for name, per_day in daily.items():
+        per_period = per_day.groupby(per_day.index.to_period(freq)).sum().sort_index()
+        if len(per_period) < 2:
+            continue
+        first, last = per_period.iloc[0], per_period.iloc[-1]
+        change = f"{(last - first) / abs(first):+.1%}" if first else "n/a"
+        slope = np.polyfit(np.arange(len(per_period)), per_period.to_numpy(dtype=float), 1)[0]
+        lines.append(
+            f"  - {name} per {label} ({len(per_period)} periods): first={_fmt(first)}, last={_fmt(last)}, "
+            f"change={change}, trend={'rising' if slope > 0 else 'falling' if slope < 0 else 'flat'} "
+            f"({_fmt(slope)} per {label}), peak={per_period.idxmax()} ({_fmt(per_period.max())}), "
+            f"low={per_period.idxmin()} ({_fmt(per_period.min())})"
+        )
+    return lines
+
+
+def _trend_section(numeric: dict, temporal: dict) -> list:
+    lines = []
+    measures = list(numeric)[:MAX_MEASURE_COLUMNS]
+    for time_col, t in temporal.items():
+        valid = t.dropna()
+        if valid.empty:
+            continue
+        days = t.dt.normalize()
+        daily = {"row count": days.value_counts()}
+        for measure in measures:
+            daily[f"total {measure}"] = numeric[measure].groupby(days).sum()
+        lines.extend(_trend_lines(time_col, valid.min(), valid.max(), daily))
+    return lines
+
+
+def representative_sample(df: pd.DataFrame, rows: int = PROFILE_SAMPLE_ROWS) -> pd.DataFrame:
+    """First few rows plus an evenly spaced sample of the rest, in original order."""
+    if len(df) <= rows:
+        return df
+    head = min(5, rows)
+    spaced = np.linspace(head, len(df) - 1, rows - head).astype(int)
+    return df.iloc[np.unique(np.concatenate([np.arange(head), spaced]))]
+
+
+def _digest(header: str, sections) -> str:
+    parts = [header]
+    for title, lines in sections:
+        if lines:
+            parts.append(f"{title}:\n" + "\n".join(lines))
+    return "\n\n".join(parts)
+
+
+def profile_dataframe(df: pd.DataFrame, top_k: int = PROFILE_TOP_K) -> str:
+    """
+    Vectorized statistical digest of a query result: per-column distributions, top-k values and
+    groups, totals, IQR outliers and time-series trends. Its size depends on the number of
+    columns, not rows, so the summarization prompt stays flat as results grow.
+    """
+    numeric, temporal, categorical = _classify_columns(df)
+    return _digest(f"ROWS: {_fmt(len(df))}, COLUMNS: {len(df.columns)} ({', '.join(map(str, df.columns))})", (
+        ("NUMERIC COLUMNS", _numeric_section(numeric, top_k)),
+        ("CATEGORICAL COLUMNS", _categorical_section(categorical, top_k)),
+        ("TOP GROUPS", _group_section(numeric, categorical, top_k)),
+        ("TIME SERIES", _trend_section(numeric, temporal))))
+
+
+class ResultProfile:
+    """
+    Profile of a query result accumulated batch by batch while it is fetched, so a result larger
+    than the rows kept in memory is still described by all of its rows: count/sum/mean/min/max/std
+    per numeric column, value counts per categorical column (while it has at most
+    MAX_GROUP_CARDINALITY distinct values), totals by group and per-day totals for the trends.
+    Quartiles and outliers need every value at once and are left out.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.rows = 0
+        self.kinds = {}
+        self.nulls = dict.fromkeys(self.columns, 0)
+        self.moments = {}   # numeric column -> [count, mean, M2, sum, min, max]
+        self.values = {}    # categorical column -> {value: count}, None once past MAX_GROUP_CARDINALITY
+        self.groups = {}    # (categorical column, numeric column) -> {value: sum}
+        self.days = {}      # temporal column -> [start, end, {series name: {day: total}}]
+
+    def add(self, rows):
+        if not len(rows):
+            return
+        df = pd.DataFrame.from_records(rows, columns=self.columns)
+        self.rows += len(df)
+
+        converted = {}
+        for col in self.columns:
+            if col not in self.kinds:
+                kind = _column_kind(df[col])
+                if kind is None:
+                    self.nulls[col] += len(df)
+                    continue
+                self.kinds[col] = kind
+            converted[col] = _convert(df[col], self.kinds[col])
+            self.nulls[col] += int(converted[col].isna().sum())
+
+        measures = self._measures()
+        for col, s in converted.items():
+            if self.kinds[col] == "numeric":
+                self._add_numeric(col, s.dropna())
+            elif self.kinds[col] == "categorical":
+                self._add_categorical(col, s, {m: converted[m] for m in measures if m in converted})
+            else:
+                self._add_temporal(col, s, {m: converted[m] for m in measures if m in converted})
+
+    def _measures(self) -> list:
+        return [c for c in self.columns if self.kinds.get(c) == "numeric"][:MAX_MEASURE_COLUMNS]
+
+    def _add_numeric(self, col, valid: pd.Series):
+        if valid.empty:
+            return
+        count, mean, m2 = len(valid), valid.mean(), ((valid - valid.mean()) ** 2).sum()
+        if col not in self.moments:
+            self.moments[col] = [count, mean, m2, valid.sum(), valid.min(), valid.max()]
+            return
+        # Chan et al.: merges the batch's mean and sum of squared deviations into the running ones
+        n, running_mean, running_m2, total, low, high = self.moments[col]
+        delta = mean - running_mean
+        self.moments[col] = [n + count, running_mean + delta * count / (n + count),
+                             running_m2 + m2 + delta ** 2 * n * count / (n + count),
+                             total + valid.sum(), min(low, valid.min()), max(high, valid.max())]
+
+    def _add_categorical(self, col, s: pd.Series, measures: dict):
+        counts = self.values.setdefault(col, {})
+        if counts is None:
+            return
+        for value, n in s.value_counts(dropna=True).items():
+            counts[value] = counts.get(value, 0) + int(n)
+        if len(counts) > MAX_GROUP_CARDINALITY:
+            self.values[col] = None
+            for measure in measures:
+                self.groups.pop((col, measure), None)
+            return
+        for measure, values in measures.items():
+            sums = self.groups.setdefault((col, measure), {})
+            for value, total in values.groupby(s).sum().items():
+                sums[value] = sums.get(value, 0.0) + total
+
+    def _add_temporal(self, col, t: pd.Series, measures: dict):
+        valid = t.dropna()
+        if valid.empty:
+            return
+        days = t.dt.normalize()
+        entry = self.days.setdefault(col, [valid.min(), valid.max(), {}])
+        entry[0], entry[1] = min(entry[0], valid.min()), max(entry[1], valid.max())
+        batch = {"row count": days.value_counts()}
+        for measure, values in measures.items():
+            batch[f"total {measure}"] = values.groupby(days).sum()
+        for name, per_day in batch.items():
+            totals = entry[2].setdefault(name, {})
+            for day, total in per_day.items():
+                totals[day] = totals.get(day, 0) + total
+
+    def digest(self, top_k: int = PROFILE_TOP_K) -> str:
+        """Same layout as profile_dataframe, computed over every row added."""
+        numeric, categorical = [], []
+        for col in self.columns:
+            kind = self.kinds.get(col)
+            if kind == "numeric":
+                if col not in self.moments:
+                    numeric.append(f"- {col}: all values null")
+                    continue
+                count, mean, m2, total, low, high = self.moments[col]
+                std = np.sqrt(m2 / (count - 1)) if count > 1 else float("nan")
+                numeric.append(f"- {col}: sum={_fmt(total)}, mean={_fmt(mean)}, min={_fmt(low)}, "
+                               f"max={_fmt(high)}, std={_fmt(std)}, nulls={_fmt(self.nulls[col])}")
+            elif kind in ("categorical", None):
+                counts = self.values.get(col, {})
+                if counts is None:
+                    categorical.append(f"- {col}: more than {_fmt(MAX_GROUP_CARDINALITY)} distinct, "
+                                       f"nulls={_fmt(self.nulls[col])}")
+                    continue
+                counts = pd.Series(counts, dtype=float).sort_values(ascending=False, kind="stable")
+                categorical.append(_categorical_line(col, counts, self.nulls[col], top_k))
+
+        groups = []
+        group_cols = [c for c, counts in self.values.items() if counts is not None and len(counts) > 1]
+        for group_col in group_cols[:MAX_GROUP_COLUMNS]:
+            for measure in self._measures():
+                if (group_col, measure) in self.groups:
+                    groups.append(_group_line(group_col, measure, pd.Series(self.groups[(group_col, measure)]),
+                                              top_k))
+
+        trends = []
+        for time_col, (start, end, daily) in self.days.items():
+            trends.extend(_trend_lines(time_col, start, end, {
+                name: pd.Series(totals).sort_index() for name, totals in daily.items()}))
+
+        header = (f"ROWS: {_fmt(self.rows)} (every row returned by the query), "
+                  f"COLUMNS: {len(self.columns)} ({', '.join(map(str, self.columns))})")
+        return _digest(header, (("NUMERIC COLUMNS", numeric), ("CATEGORICAL COLUMNS", categorical),
+                                ("TOP GROUPS", groups), ("TIME SERIES", trends)))
@@ -1,13 +1,100 @@
+import asyncio
+import json
+import time
+
 import pandas as pd
-from sqlalchemy import create_engine, text, inspect
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from api.configuration.configuration import (
+    DATABASE_URL,
+    ASYNC_DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_SYNC_POOL_SIZE,
+    DB_SYNC_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    QUERY_MAX_ROWS,
+    QUERY_MAX_BYTES,
+    QUERY_FETCH_BATCH_ROWS,
+    QUERY_MAX_ESTIMATED_COST,
+    QUERY_MAX_ESTIMATED_ROWS,
+    QUERY_STATEMENT_TIMEOUT_MS
+)
+from api.service.csv_loader import StreamingCsvLoader, quote_ident
+from api.service.data_profiler import ResultProfile
+from api.service.query_cache import normalize_sql
+from api.service.schema_catalog import SchemaCatalog, data_fingerprints
+from api.service.telemetry import traced, record_rows
+
+
+EMPTY_RESULT = {"success": True, "data": "No results found.", "raw_df": None, "row_count": 0, "truncated": False,
+                "profile": None}
+
+POOL_OPTIONS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": True
+}
+SYNC_POOL_OPTIONS = {**POOL_OPTIONS, "pool_size": DB_SYNC_POOL_SIZE, "max_overflow": DB_SYNC_MAX_OVERFLOW}
+
+
+class _BoundedRowCollector:
+    """
+    Keeps at most max_rows rows / ~max_bytes of a streamed result.
+    Past the caps rows are no longer kept but still profiled, so a capped result comes with a
+    profile of all of its rows.
+    """
 
-from api.configuration.configuration import DATABASE_URL
+    def __init__(self, columns, max_rows: int, max_bytes: int):
+        self.columns = columns
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.rows, self.size, self.total = [], 0, 0
+        self.profile = None
+
+    def add(self, batch):
+        self.total += len(batch)
+        kept = 0
+        for row in batch:
+            if len(self.rows) >= self.max_rows or self.size >= self.max_bytes:
+                break
+            self.rows.append(tuple(row))
+            self.size += sum(len(str(v)) for v in row)
+            kept += 1
+        if kept < len(batch):
+            if self.profile is None:
+                self.profile = ResultProfile(self.columns)
+                self.profile.add(self.rows)
+            self.profile.add(batch[kept:])
+
+    def build(self) -> dict:
+        if not self.rows:
+            return dict(EMPTY_RESULT)
+
+        result_df = pd.DataFrame(self.rows, columns=self.columns)
+        truncated = self.total > len(result_df)
+        if truncated:
+            print(f"✂️ Result capped at {len(result_df)} of {self.total} rows.")
+
+        return {"success": True, "data": result_df.to_markdown(index=False), "raw_df": result_df,
+                "row_count": self.total, "truncated": truncated,
+                "profile": self.profile.digest() if self.profile else None}
 
 
 class PostgresManager:
     def __init__(self):
-        self.engine = create_engine(DATABASE_URL)
+        # Explicit pools: the sync engine serves ingest/metadata, the async engine the /chat query path
+        self.engine = create_engine(DATABASE_URL, **SYNC_POOL_OPTIONS)
+        self.async_engine = create_async_engine(ASYNC_DATABASE_URL, **POOL_OPTIONS)
         self._init_metadata_table()
+        self.schema_catalog = SchemaCatalog(self.engine)
+        self.csv_loader = StreamingCsvLoader(self.engine)
+        self.guard_stats = {"executed": 0, "rejected_by_cost": 0, "timed_out": 0, "cancelled": 0}
+        self._log_tasks = set()
 
     def _init_metadata_table(self):
         """Creates a metadata table to store column descriptions if it doesn't exist."""
@@ -30,33 +117,105 @@ class PostgresManager:
                                   )
                                       )
                                   """))
+                # Source format and native type detected at ingest time
+                conn.execute(text("""
+                                  ALTER TABLE column_metadata
+                                      ADD COLUMN IF NOT EXISTS original_type TEXT,
+                                      ADD COLUMN IF NOT EXISTS inferred_type TEXT,
+                                      ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                                  """))
+                # Bumped by every load in its transaction; caches of all workers key on it
+                conn.execute(text("""
+                                  CREATE TABLE IF NOT EXISTS table_versions
+                                  (
+                                      table_name TEXT PRIMARY KEY,
+                                      version BIGINT NOT NULL DEFAULT 1,
+                                      updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                                  )
+                                  """))
+                # Successful /chat queries with their execution time, the index advisor's workload
+                conn.execute(text("""
+                                  CREATE TABLE IF NOT EXISTS query_log
+                                  (
+                                      id BIGSERIAL PRIMARY KEY,
+                                      normalized_sql TEXT NOT NULL,
+                                      duration_ms DOUBLE PRECISION NOT NULL,
+                                      row_count BIGINT,
+                                      executed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                                  )
+                                  """))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS query_log_executed_at_idx ON query_log (executed_at)"))
+                # Rollup that answered the query (its duration is the rollup's, not the base table's)
+                conn.execute(text("ALTER TABLE query_log ADD COLUMN IF NOT EXISTS rollup TEXT"))
                 conn.commit()
         except Exception as e:
             print(f"⚠️ Could not initialize metadata table: {e}")
 
-    def ingest_csv(self, file_path: str, table_name: str):
+    @traced("db")
+    def ingest_csv(self, source, table_name: str, mode: str = "replace", key_columns: list = None,
+                   partition_by: str = None, progress_callback=None):
         """
-        Loads a CSV into PostgreSQL and returns the list of columns.
-        Returns: (success: bool, columns: list)
+        Streams a CSV (file path or binary file object) into PostgreSQL via COPY.
+        mode is replace / append / upsert (on key_columns); see StreamingCsvLoader.load.
+        progress_callback(rows, bytes_read) is called after every chunk.
+        Returns: (success: bool, columns: list, stats: dict)
         """
-        print(f"📦 Ingesting '{file_path}' into table '{table_name}'...")
+        print(f"📦 Ingesting into table '{table_name}' ({mode})...")
 
         try:
-            # Read CSV
-            df = pd.read_csv(file_path)
-            # Standardize columns
-            df.columns = [c.lower().replace(" ", "_") for c in df.columns]
+            stats = self.csv_loader.load(source, table_name, mode, key_columns, partition_by, progress_callback)
+            self._save_column_types(table_name, stats["column_types"], prune=mode == "replace")
+            self._analyze(table_name)
+            self.schema_catalog.invalidate()
+            if mode == "upsert":
+                print(f"🔁 {stats['rows_inserted']} rows inserted, {stats['rows_updated']} updated.")
+            print(f"✅ Successfully loaded {stats['rows']} rows into '{table_name}' "
+                  f"({stats['rows_per_sec']} rows/s, {stats['bytes_per_sec']} bytes/s).")
 
-            # Load to SQL
-            df.to_sql(table_name, self.engine, if_exists='replace', index=False)
-            print(f"✅ Successfully loaded {len(df)} rows into '{table_name}'.")
-
-            return True, df.columns.tolist()
+            return True, stats["columns"], stats
 
         except Exception as e:
             print(f"❌ Error loading CSV: {e}")
-            return False, []
+            return False, [], {"error": str(e)}
+
+    def _analyze(self, table_name: str):
+        """Fresh planner statistics right after a load, before autovacuum gets to the table."""
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(text(f"ANALYZE {quote_ident(table_name)}"))
+                conn.commit()
+        except Exception as e:
+            print(f"⚠️ Could not analyze '{table_name}': {e}")
 
+    def _save_column_types(self, table_name: str, column_types: dict, prune: bool = True):
+        """
+        Records the original and inferred type of every ingested column, keeping existing descriptions.
+        prune drops the metadata of columns the table no longer has (after a replacing load).
+        """
+        data = [
+            {"table_name": table_name, "column_name": col,
+             "original_type": info["original_type"], "inferred_type": info["inferred_type"]}
+            for col, info in column_types.items()
+        ]
+
+        try:
+            with self.engine.connect() as conn:
+                if prune:
+                    conn.execute(text("DELETE FROM column_metadata WHERE table_name = :t AND NOT (column_name = ANY(:cols))"),
+                                 {"t": table_name, "cols": list(column_types)})
+                conn.execute(text("""
+                                  INSERT INTO column_metadata (table_name, column_name, original_type, inferred_type)
+                                  VALUES (:table_name, :column_name, :original_type, :inferred_type)
+                                  ON CONFLICT (table_name, column_name) DO UPDATE
+                                      SET original_type = EXCLUDED.original_type,
+                                          inferred_type = EXCLUDED.inferred_type,
+                                          updated_at = now()
+                                  """), data)
+                conn.commit()
+        except Exception as e:
+            print(f"⚠️ Could not record column types: {e}")
+
+    @traced("db")
     def save_column_metadata(self, table_name: str, descriptions: dict):
         """
         Stores user-provided descriptions in the metadata table.
@@ -71,71 +230,136 @@ class PostgresManager:
 
         try:
             with self.engine.connect() as conn:
-                # Clean up old metadata for this table to avoid stale data
-                conn.execute(text("DELETE FROM column_metadata WHERE table_name = :t"), {"t": table_name})
+                # Clean up old descriptions for this table to avoid stale data (type info is kept)
+                conn.execute(text("UPDATE column_metadata SET description = NULL, updated_at = now() "
+                                  "WHERE table_name = :t"),
+                             {"t": table_name})
 
-                # Insert new metadata
+                # Upsert new descriptions
                 conn.execute(text("""
                                   INSERT INTO column_metadata (table_name, column_name, description)
                                   VALUES (:table_name, :column_name, :description)
+                                  ON CONFLICT (table_name, column_name) DO UPDATE
+                                      SET description = EXCLUDED.description,
+                                          updated_at = now()
                                   """), data)
                 conn.commit()
+            self.schema_catalog.invalidate()
             print("✅ Column descriptions saved to metadata table.")
         except Exception as e:
             print(f"❌ Error saving metadata: {e}")
 
-    def execute_query(self, query: str):
+    def table_versions(self, tables) -> dict:
+        """{table: version} from the database, so writes made by any worker (or outside the API) show up."""
+        if not tables:
+            return {}
+        with self.engine.connect() as conn:
+            return data_fingerprints(conn, tables)
+
+    @traced("db")
+    async def aexecute_query(self, query: str, max_rows: int = QUERY_MAX_ROWS, max_bytes: int = QUERY_MAX_BYTES,
+                             max_cost: float = QUERY_MAX_ESTIMATED_COST,
+                             max_estimated_rows: float = QUERY_MAX_ESTIMATED_ROWS,
+                             statement_timeout_ms: int = QUERY_STATEMENT_TIMEOUT_MS):
         """
-        Executes a SQL query and returns the result.
+        Executes generated SQL for the /chat request path through a server-side cursor, fetching in
+        batches. Keeps at most max_rows rows / ~max_bytes of data; the true total row count is reported
+        separately. Runs in a read-only transaction with a statement_timeout, is rejected up front when the
+        EXPLAIN estimate is above max_cost / max_estimated_rows, and is cancelled on the server
+        when the calling task is cancelled (client disconnect, request deadline).
         """
         try:
-            with self.engine.connect() as connection:
-                result_df = pd.read_sql(text(query), connection)
+            async with self.async_engine.connect() as connection:
+                async with connection.begin():
+                    await connection.execute(text("SET TRANSACTION READ ONLY"))
+                    await connection.execute(text(f"SET LOCAL statement_timeout = {int(statement_timeout_ms)}"))
+                    backend_pid = (await connection.execute(text("SELECT pg_backend_pid()"))).scalar()
 
-                if result_df.empty:
-                    return {"success": True, "data": "No results found.", "raw_df": None}
+                    try:
+                        rejection = await self._check_estimated_cost(connection, query, max_cost, max_estimated_rows)
+                        if rejection:
+                            self.guard_stats["rejected_by_cost"] += 1
+                            print(f"🚧 {rejection}")
+                            return {"success": False, "error": rejection}
 
-                return {"success": True, "data": result_df.to_markdown(index=False), "raw_df": result_df}
+                        start = time.perf_counter()
+                        result = await connection.stream(text(query))
+                        collector = _BoundedRowCollector(list(result.keys()), max_rows, max_bytes)
+                        async for batch in result.partitions(QUERY_FETCH_BATCH_ROWS):
+                            collector.add(batch)
+                        self.guard_stats["executed"] += 1
+                        record_rows(collector.total)
+                        return {**collector.build(), "seconds": time.perf_counter() - start}
 
-        except Exception as e:
-            return {"success": False, "error": str(e)}
+                    except asyncio.CancelledError:
+                        # Closing the connection alone would leave the statement running on the server
+                        self.guard_stats["cancelled"] += 1
+                        print(f"🛑 Request cancelled, cancelling backend query (pid {backend_pid})...")
+                        await asyncio.shield(self._cancel_backend(backend_pid))
+                        raise
 
-    def get_schema_string(self):
-        """
-        Generates the schema string, enriched with user descriptions from the metadata table.
-        """
-        inspector = inspect(self.engine)
-        table_names = inspector.get_table_names()
+        except Exception as e:
+            error = str(e)
+            if "statement timeout" in error:
+                self.guard_stats["timed_out"] += 1
+                error = (f"Query cancelled after the {statement_timeout_ms / 1000:.1f}s statement timeout. "
+                         f"Rewrite it to read less data (tighter filters, aggregation, no cross joins).\n{error}")
+            return {"success": False, "error": error}
 
-        # Fetch all metadata into a dictionary for quick lookup
-        # Structure: {(table, col): description}
-        metadata_map = {}
-        try:
-            with self.engine.connect() as conn:
-                result = conn.execute(text("SELECT table_name, column_name, description FROM column_metadata"))
-                for row in result:
-                    metadata_map[(row[0], row[1])] = row[2]
-        except Exception:
-            pass  # If metadata table fails, just proceed without descriptions
+    @staticmethod
+    async def _check_estimated_cost(connection, query: str, max_cost: float, max_estimated_rows: float):
+        """Returns a rewrite request when the planner's estimate is above the limits, else None."""
+        plan = (await connection.execute(text(f"EXPLAIN (FORMAT JSON) {query}"))).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        top = plan[0]["Plan"]
+        cost, rows = top.get("Total Cost", 0), top.get("Plan Rows", 0)
 
-        schema_str = ""
+        if cost <= max_cost and rows <= max_estimated_rows:
+            return None
+        return (f"Query rejected before execution: estimated cost {cost:,.0f} (limit {max_cost:,.0f}), "
+                f"estimated rows {rows:,.0f} (limit {max_estimated_rows:,.0f}). "
+                f"Rewrite it to be cheaper: add WHERE filters, aggregate with GROUP BY, add a LIMIT, "
+                f"and make sure every JOIN has a join condition.")
 
-        for table in table_names:
-            # Skip internal tables if any
-            if table == 'column_metadata':
-                continue
+    async def alog_query(self, query: str, seconds: float, row_count: int, rollup: str = None):
+        """Appends a successfully executed query to query_log for the index advisor and rollups."""
+        try:
+            async with self.async_engine.begin() as conn:
+                await conn.execute(text("INSERT INTO query_log (normalized_sql, duration_ms, row_count, rollup) "
+                                        "VALUES (:sql, :ms, :rows, :rollup)"),
+                                   {"sql": normalize_sql(query), "ms": seconds * 1000, "rows": row_count,
+                                    "rollup": rollup})
+        except Exception as e:
+            print(f"⚠️ Could not log query: {e}")
 
-            schema_str += f"\nTable: {table}\nColumns:\n"
-            columns = inspector.get_columns(table)
+    def log_query(self, query: str, seconds: float, row_count: int, rollup: str = None):
+        """alog_query off the request path: the insert runs as a task the caller doesn't wait for."""
+        task = asyncio.create_task(self.alog_query(query, seconds, row_count, rollup))
+        self._log_tasks.add(task)
+        task.add_done_callback(self._log_tasks.discard)
 
-            for col in columns:
-                col_name = col['name']
-                col_type = col['type']
+    async def aflush_query_log(self):
+        """Waits for the query_log inserts still running (on shutdown)."""
+        if self._log_tasks:
+            await asyncio.gather(*self._log_tasks, return_exceptions=True)
 
-                # Get description if exists
-                desc = metadata_map.get((table, col_name), "")
-                desc_text = f" -- Description: {desc}" if desc else ""
+    async def aping(self) -> bool:
+        """Readiness check: one pooled round trip on the async engine that serves /chat."""
+        async with self.async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        return True
 
-                schema_str += f"- {col_name} ({col_type}){desc_text}\n"
+    async def _cancel_backend(self, backend_pid: int):
+        try:
+            async with self.async_engine.connect() as conn:
+                await conn.execute(text("SELECT pg_cancel_backend(:pid)"), {"pid": backend_pid})
+        except Exception as e:
+            print(f"⚠️ Could not cancel backend query {backend_pid}: {e}")
 
-        return schema_str
\ No newline at end of file
+    def get_schema_string(self):
+        """
+        Returns the schema string, enriched with user descriptions from the metadata table.
+        Served from the schema catalog, which only hits the database when the schema changed.
+        """
+        return self.schema_catalog.get_schema_string()
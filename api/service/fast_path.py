@@ -0,0 +1,102 @@
+import re
+from difflib import SequenceMatcher
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ParseError, TokenError
+
+TOKEN_PATTERN = re.compile(r"'[^']*'|\"[^\"]*\"|[\w][\w.\-/:]*")
+SQL_STRING_LITERAL_PATTERN = re.compile(r"'((?:[^']|'')*)'")
+NUMBER_PATTERN = re.compile(r"^-?\d+(?:\.\d+)?$")
+# Numbers of the stored SQL that can be question parameters: comparison operands and LIMIT/OFFSET
+PARAMETER_PARENTS = (exp.EQ, exp.NEQ, exp.GT, exp.GTE, exp.LT, exp.LTE, exp.Between, exp.In, exp.Limit, exp.Offset)
+
+
+def _tokens(question: str) -> list:
+    return [t.strip("'\"").rstrip(".") for t in TOKEN_PATTERN.findall(question)]
+
+
+def _match_case(old: str, new: str) -> str:
+    """Writes the new value in the casing the stored SQL used for the old one."""
+    if old.isupper():
+        return new.upper()
+    if old.islower():
+        return new.lower()
+    return new
+
+
+def _replace_number(sql: str, old: str, new: str):
+    """
+    Substitutes the numeric literal old when it occurs exactly once in the SQL, as an operand of a
+    comparison or as the LIMIT/OFFSET. Anywhere else (ROUND(x, 2), a second occurrence, ...) it is
+    not certain the question's number is meant, so None is returned and the LLM writes the SQL.
+    """
+    try:
+        tree = sqlglot.parse_one(sql, read="postgres")
+    except (ParseError, TokenError):
+        return None
+
+    matches = []
+    for literal in tree.find_all(exp.Literal):
+        if literal.is_string:
+            continue
+        if literal.this == old:
+            # A negative number is Neg(literal); question tokens carry no sign, so the sign stays
+            matches.append((literal, literal.parent.parent if isinstance(literal.parent, exp.Neg) else literal.parent))
+    if len(matches) != 1:
+        return None
+
+    literal, parent = matches[0]
+    if not isinstance(parent, PARAMETER_PARENTS) or "start" not in literal.meta:
+        return None
+    start, end = literal.meta["start"], literal.meta["end"] + 1
+    if sql[start:end] != literal.this:
+        return None
+    return sql[:start] + new + sql[end:]
+
+
+def _replace_in_literals(sql: str, old: str, new: str):
+    pattern = re.compile(rf"(?<!\w){re.escape(old)}(?!\w)", re.IGNORECASE)
+    replaced = False
+
+    def substitute(match):
+        nonlocal replaced
+        literal = match.group(1)
+        if not pattern.search(literal):
+            return match.group(0)
+        replaced = True
+        return "'" + pattern.sub(lambda m: _match_case(m.group(0), new).replace("'", "''"), literal) + "'"
+
+    result = SQL_STRING_LITERAL_PATTERN.sub(substitute, sql)
+    return result if replaced else None
+
+
+def adapt_stored_sql(stored_question: str, stored_sql: str, question: str):
+    """
+    Reuses the SQL of a stored question for a new, near-identical question.
+    Every token that differs between the questions must be a literal value of the stored SQL
+    (a quoted string, or a number compared against or used as LIMIT); it is then substituted with
+    the new value.
+    Returns None when the questions differ in anything but such parameters.
+    """
+    old_tokens, new_tokens = _tokens(stored_question), _tokens(question)
+    matcher = SequenceMatcher(None, [t.lower() for t in old_tokens], [t.lower() for t in new_tokens], autojunk=False)
+
+    sql = stored_sql
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == "equal":
+            continue
+        if op != "replace" or i2 - i1 != j2 - j1:
+            return None
+
+        for old, new in zip(old_tokens[i1:i2], new_tokens[j1:j2]):
+            if NUMBER_PATTERN.match(old) and NUMBER_PATTERN.match(new):
+                sql = _replace_number(sql, old, new)
+            elif not NUMBER_PATTERN.match(old) and not NUMBER_PATTERN.match(new):
+                sql = _replace_in_literals(sql, old, new)
+            else:
+                return None
+            if sql is None:
+                return None
+
+    return sql
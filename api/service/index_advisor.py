@@ -0,0 +1,409 @@
+import hashlib
+import json
+import threading
+import time
+
+import sqlglot
+from sqlalchemy import text
+from sqlglot import exp
+from sqlglot.errors import ParseError, TokenError
+
+from api.configuration.configuration import (
+    INDEX_ADVISOR_AUTO_CREATE,
+    INDEX_ADVISOR_WINDOW_DAYS,
+    INDEX_ADVISOR_MAX_QUERIES,
+    INDEX_ADVISOR_MIN_TABLE_ROWS,
+    INDEX_ADVISOR_MIN_IMPROVEMENT,
+    INDEX_ADVISOR_MAX_SELECTIVITY,
+    INDEX_ADVISOR_MAX_INDEXES_PER_TABLE,
+    QUERY_LOG_RETENTION_DAYS
+)
+from api.service.csv_loader import quote_ident
+from api.service.sql_validator import _ident_name
+
+# B-tree usable comparisons; LIKE/ILIKE patterns need other operator classes and are left alone
+EQUALITY_PREDICATES = (exp.EQ, exp.In)
+RANGE_PREDICATES = (exp.GT, exp.GTE, exp.LT, exp.LTE, exp.Between)
+EXPRESSION_FUNCTIONS = {exp.Lower: "LOWER", exp.Upper: "UPPER"}
+
+# Queries answered from a rollup are logged with the rollup's runtime: the index advisor leaves them out
+WORKLOAD_QUERY = text("""
+    SELECT normalized_sql, count(*) AS calls, sum(duration_ms) AS total_ms
+    FROM query_log
+    WHERE executed_at > now() - make_interval(days => :days) AND (:include_rollups OR rollup IS NULL)
+    GROUP BY normalized_sql
+    ORDER BY total_ms DESC
+    LIMIT :limit
+""")
+
+# Planner row estimate; a partitioned table's rows are in its partitions
+TABLE_ROWS_QUERY = text("""
+    SELECT coalesce(sum(greatest(reltuples, 0)), 0) FROM pg_class
+    WHERE oid = to_regclass(:t) OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(:t))
+""")
+
+# An interrupted CREATE INDEX CONCURRENTLY leaves an invalid index behind that the planner never uses
+VALID_INDEXES_QUERY = text("""
+    SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+    WHERE c.relnamespace = 'public'::regnamespace AND i.indisvalid
+""")
+
+COLUMN_STATS_QUERY = text("""
+    SELECT n_distinct FROM pg_stats
+    WHERE schemaname = 'public' AND tablename = :table AND attname = :column
+""")
+
+
+def index_name(table: str, definition: str) -> str:
+    """Deterministic name, so a decision maps to the same index across runs (max 63 bytes)."""
+    digest = hashlib.sha1(f"{table}|{definition}".encode()).hexdigest()[:10]
+    return f"ix_auto_{table[:40]}_{digest}".lower()
+
+
+def _index_target(node):
+    """Returns (column, function) for `col` / `LOWER(col)` / `UPPER(col)` operands, else None."""
+    if isinstance(node, exp.Column):
+        return node, None
+    for func_type, func_name in EXPRESSION_FUNCTIONS.items():
+        if isinstance(node, func_type) and isinstance(node.this, exp.Column):
+            return node.this, func_name
+    return None
+
+
+def extract_candidates(sql: str, tables: dict) -> list:
+    """
+    Parses one query and returns the B-tree index candidates it could use as
+    [{"table", "column", "function", "usage"}], usage being eq / range / join / group.
+    Columns are resolved through table aliases, or by a unique name match across the FROM tables.
+    """
+    try:
+        tree = sqlglot.parse_one(sql, read="postgres")
+    except (ParseError, TokenError):
+        return []
+    if tree is None:
+        return []
+
+    sources = {}    # alias / name -> table
+    for table in tree.find_all(exp.Table):
+        name = _ident_name(table.this)
+        if name not in tables:
+            continue
+        alias = _ident_name(table.args["alias"].this) if table.args.get("alias") else name
+        sources[alias] = name
+        sources.setdefault(name, name)
+
+    def resolve(column):
+        column_name = _ident_name(column.this)
+        if column.args.get("table"):
+            table = sources.get(_ident_name(column.args["table"]))
+        else:
+            owners = {t for t in sources.values() if any(c["name"] == column_name for c in tables[t])}
+            table = owners.pop() if len(owners) == 1 else None
+        if table and any(c["name"] == column_name for c in tables[table]):
+            return table, column_name
+        return None
+
+    candidates = []
+
+    def add(node, usage):
+        target = _index_target(node)
+        if target is None:
+            return
+        resolved = resolve(target[0])
+        if resolved:
+            candidates.append({"table": resolved[0], "column": resolved[1], "function": target[1], "usage": usage})
+
+    for where in tree.find_all(exp.Where):
+        for predicate in where.find_all(*EQUALITY_PREDICATES, *RANGE_PREDICATES):
+            usage = "eq" if isinstance(predicate, EQUALITY_PREDICATES) else "range"
+            # Column-to-column comparisons in WHERE are implicit joins
+            if isinstance(predicate, exp.EQ) and all(_index_target(s) for s in (predicate.this, predicate.expression)):
+                usage = "join"
+                add(predicate.expression, usage)
+            add(predicate.this, usage)
+
+    for join in tree.find_all(exp.Join):
+        on = join.args.get("on")
+        if on is None:
+            continue
+        for predicate in on.find_all(exp.EQ):
+            add(predicate.this, "join")
+            add(predicate.expression, "join")
+
+    for group in tree.find_all(exp.Group):
+        for expression in group.expressions:
+            add(expression, "group")
+
+    return candidates
+
+
+class IndexAdvisor:
+    """
+    Workload-driven index advisor for ingested tables.
+    Reads the recent successful queries from query_log, extracts the filter, join and GROUP BY
+    columns (including LOWER()/UPPER() expressions), estimates each candidate's benefit and creates
+    or recommends B-tree indexes. The benefit is measured with hypothetical indexes (hypopg) by
+    comparing EXPLAIN costs; without hypopg, only equality/join candidates on selective columns
+    (pg_stats) of large tables qualify.
+    """
+
+    def __init__(self, engine, schema_catalog, auto_create: bool = INDEX_ADVISOR_AUTO_CREATE):
+        self.engine = engine
+        self.schema_catalog = schema_catalog
+        self.auto_create = auto_create
+        self._lock = threading.Lock()
+        self.last_run = None
+        self._init_table()
+
+    def _init_table(self):
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(text("""
+                                  CREATE TABLE IF NOT EXISTS index_advice
+                                  (
+                                      index_name TEXT PRIMARY KEY,
+                                      table_name TEXT NOT NULL,
+                                      definition TEXT NOT NULL,
+                                      usage TEXT,
+                                      status TEXT NOT NULL,
+                                      improvement DOUBLE PRECISION,
+                                      reason TEXT,
+                                      decided_at TIMESTAMPTZ DEFAULT now()
+                                  )
+                                  """))
+                conn.commit()
+        except Exception as e:
+            print(f"⚠️ Could not initialize index advice table: {e}")
+
+    def decisions(self, table_name: str = None) -> list:
+        query = "SELECT * FROM index_advice"
+        if table_name:
+            query += " WHERE table_name = :t"
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(query + " ORDER BY decided_at DESC"), {"t": table_name}).mappings().all()
+        return [{**row, "decided_at": row["decided_at"].isoformat() if row["decided_at"] else None} for row in rows]
+
+    def run(self, table_name: str = None) -> dict:
+        """
+        Analyzes the logged workload (optionally for one table) and applies the decisions.
+        Runs are serialized; returns a summary of this run.
+        """
+        with self._lock:
+            start = time.perf_counter()
+            tables = self.schema_catalog.get_tables()
+            if table_name and table_name not in tables:
+                return {"table": table_name, "queries": 0, "decisions": []}
+
+            with self.engine.connect() as conn:
+                conn.execute(text("DELETE FROM query_log WHERE executed_at < now() - make_interval(days => :days)"),
+                             {"days": QUERY_LOG_RETENTION_DAYS})
+                conn.commit()
+                workload = conn.execute(WORKLOAD_QUERY, {"days": INDEX_ADVISOR_WINDOW_DAYS,
+                                                         "limit": INDEX_ADVISOR_MAX_QUERIES,
+                                                         "include_rollups": False}).all()
+                hypopg = self._has_hypopg(conn)
+
+            candidates = self._collect(workload, tables, table_name)
+            decisions = self._evaluate(candidates, hypopg)
+            self._apply(decisions)
+
+            self.last_run = {
+                "table": table_name,
+                "queries": len(workload),
+                "candidates": len(candidates),
+                "method": "hypopg" if hypopg else "statistics",
+                "note": None if hypopg else ("The hypopg extension is not installed, so benefits are estimated from "
+                                             "column statistics. Run CREATE EXTENSION hypopg to measure them."),
+                "seconds": round(time.perf_counter() - start, 3),
+                "finished_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "decisions": decisions
+            }
+            created = sum(d["status"] == "created" for d in decisions)
+            print(f"🗂️ Index advisor: {len(workload)} queries, {len(candidates)} candidates, "
+                  f"{created} indexes created ({self.last_run['method']}, {self.last_run['seconds']}s).")
+            return self.last_run
+
+    @staticmethod
+    def _has_hypopg(conn) -> bool:
+        """Only detects the extension: an advisory run makes no DDL changes to install it."""
+        return bool(conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'hypopg'")).scalar())
+
+    @staticmethod
+    def _collect(workload, tables: dict, table_name: str = None) -> dict:
+        """Groups candidates by index definition, weighting each by the time of the queries using it."""
+        candidates = {}
+        for sql, calls, total_ms in workload:
+            for c in extract_candidates(sql, tables):
+                if table_name and c["table"] != table_name:
+                    continue
+                column = quote_ident(c["column"])
+                definition = f"({c['function']}({column}))" if c["function"] else column
+                name = index_name(c["table"], definition)
+                entry = candidates.setdefault(name, {
+                    "index_name": name, "table_name": c["table"], "column": c["column"],
+                    "definition": definition, "usages": set(), "queries": {}, "weight_ms": 0.0
+                })
+                entry["usages"].add(c["usage"])
+                if sql not in entry["queries"]:
+                    entry["queries"][sql] = calls
+                    entry["weight_ms"] += float(total_ms or 0)
+        return candidates
+
+    def _evaluate(self, candidates: dict, hypopg: bool) -> list:
+        decisions = []
+        with self.engine.connect() as conn:
+            existing = {row[0] for row in conn.execute(VALID_INDEXES_QUERY)}
+            row_counts, baseline = {}, {}
+
+            for candidate in sorted(candidates.values(), key=lambda c: -c["weight_ms"]):
+                table = candidate["table_name"]
+                decision = {"index_name": candidate["index_name"], "table_name": table,
+                            "definition": candidate["definition"], "usage": ",".join(sorted(candidate["usages"])),
+                            "improvement": None}
+
+                if table not in row_counts:
+                    row_counts[table] = conn.execute(TABLE_ROWS_QUERY, {"t": quote_ident(table)}).scalar()
+
+                if candidate["index_name"] in existing:
+                    decisions.append({**decision, "status": "existing", "reason": "index already exists"})
+                elif row_counts[table] < INDEX_ADVISOR_MIN_TABLE_ROWS:
+                    decisions.append({**decision, "status": "rejected",
+                                      "reason": f"table has ~{row_counts[table]:,.0f} rows "
+                                                f"(minimum {INDEX_ADVISOR_MIN_TABLE_ROWS:,})"})
+                elif hypopg:
+                    decisions.append(self._evaluate_hypothetical(conn, candidate, decision, baseline))
+                else:
+                    decisions.append(self._evaluate_statistics(conn, candidate, decision, row_counts[table]))
+
+        # Cap automatic indexes per table, keeping the most beneficial ones
+        per_table = {}
+        for decision in sorted(decisions, key=lambda d: -(d["improvement"] or 0)):
+            if decision["status"] != "accepted":
+                continue
+            per_table[decision["table_name"]] = per_table.get(decision["table_name"], 0) + 1
+            if per_table[decision["table_name"]] > INDEX_ADVISOR_MAX_INDEXES_PER_TABLE:
+                decision.update(status="recommended",
+                                reason=f"over the limit of {INDEX_ADVISOR_MAX_INDEXES_PER_TABLE} automatic indexes per table")
+        return decisions
+
+    def _evaluate_hypothetical(self, conn, candidate: dict, decision: dict, baseline: dict) -> dict:
+        """EXPLAIN cost of the candidate's queries with and without a hypothetical index."""
+        ddl = f"CREATE INDEX ON {quote_ident(candidate['table_name'])} ({candidate['definition']})"
+        try:
+            for sql in candidate["queries"]:
+                if sql not in baseline:
+                    baseline[sql] = self._explain_cost(conn, sql)
+
+            index_oid = conn.execute(text("SELECT indexrelid FROM hypopg_create_index(:ddl)"), {"ddl": ddl}).scalar()
+            try:
+                after = {sql: self._explain_cost(conn, sql) for sql in candidate["queries"]}
+            finally:
+                conn.execute(text("SELECT hypopg_drop_index(:oid)"), {"oid": index_oid})
+        except Exception as e:
+            # Hypothetical indexes live in the session, not the transaction
+            conn.rollback()
+            conn.execute(text("SELECT hypopg_reset()"))
+            return {**decision, "status": "rejected", "reason": f"could not evaluate: {e}"}
+
+        before_total = sum(calls * baseline[sql] for sql, calls in candidate["queries"].items())
+        after_total = sum(calls * after[sql] for sql, calls in candidate["queries"].items())
+        improvement = (before_total - after_total) / before_total if before_total else 0.0
+        decision["improvement"] = round(improvement, 4)
+
+        if improvement < INDEX_ADVISOR_MIN_IMPROVEMENT:
+            return {**decision, "status": "rejected",
+                    "reason": f"estimated cost reduction {improvement:.0%} "
+                              f"(minimum {INDEX_ADVISOR_MIN_IMPROVEMENT:.0%})"}
+        return {**decision, "status": "accepted",
+                "reason": f"estimated cost {before_total:,.0f} -> {after_total:,.0f} "
+                          f"over {len(candidate['queries'])} queries"}
+
+    @staticmethod
+    def _evaluate_statistics(conn, candidate: dict, decision: dict, row_count: float) -> dict:
+        """Without hypopg: equality / join lookups on selective columns, from pg_stats."""
+        if not candidate["usages"] & {"eq", "join"}:
+            return {**decision, "status": "rejected",
+                    "reason": "range / GROUP BY benefit needs hypopg to be estimated"}
+
+        n_distinct = conn.execute(COLUMN_STATS_QUERY, {"table": candidate["table_name"],
+                                                       "column": candidate["column"]}).scalar()
+        if not n_distinct:
+            return {**decision, "status": "rejected", "reason": "no column statistics yet"}
+
+        # Negative n_distinct is a fraction of the row count
+        distinct = -n_distinct * row_count if n_distinct < 0 else n_distinct
+        selectivity = 1 / max(distinct, 1)
+        decision["improvement"] = round(1 - selectivity, 4)
+        if selectivity > INDEX_ADVISOR_MAX_SELECTIVITY:
+            return {**decision, "status": "rejected",
+                    "reason": f"low selectivity: ~{distinct:,.0f} distinct values, "
+                              f"a lookup reads ~{selectivity:.1%} of the table"}
+        return {**decision, "status": "accepted",
+                "reason": f"~{distinct:,.0f} distinct values, a lookup reads ~{selectivity:.2%} of the table"}
+
+    @staticmethod
+    def _explain_cost(conn, sql: str) -> float:
+        plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]["Plan"].get("Total Cost", 0)
+
+    @staticmethod
+    def _drop_invalid_index(conn, name: str, concurrently: str):
+        try:
+            if conn.execute(text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:i)"),
+                            {"i": quote_ident(name)}).scalar():
+                conn.execute(text(f"DROP INDEX {concurrently}IF EXISTS {quote_ident(name)}"))
+                print(f"🗂️ Dropped invalid index {name} left by a failed build.")
+        except Exception as e:
+            print(f"⚠️ Could not drop invalid index {name}: {e}")
+
+    def _apply(self, decisions: list):
+        """Creates accepted indexes (or downgrades them to recommendations) and stores every decision."""
+        for decision in decisions:
+            if decision["status"] != "accepted":
+                continue
+            if not self.auto_create:
+                decision["status"] = "recommended"
+                continue
+            try:
+                # CONCURRENTLY keeps the table writable while the index builds; it can't run in a
+                # transaction, and partitioned tables only support a plain CREATE INDEX
+                with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                    partitioned = conn.execute(text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:t)"),
+                                               {"t": quote_ident(decision["table_name"])}).scalar()
+                    concurrently = "" if partitioned else "CONCURRENTLY "
+                    # A leftover invalid index of the same name would make IF NOT EXISTS a no-op
+                    self._drop_invalid_index(conn, decision["index_name"], concurrently)
+                    try:
+                        conn.execute(text(
+                            f"CREATE INDEX {concurrently}IF NOT EXISTS {quote_ident(decision['index_name'])} "
+                            f"ON {quote_ident(decision['table_name'])} ({decision['definition']})"))
+                    except Exception:
+                        self._drop_invalid_index(conn, decision["index_name"], concurrently)
+                        raise
+                decision["status"] = "created"
+                print(f"🗂️ Created index {decision['index_name']} on "
+                      f"{decision['table_name']} {decision['definition']}")
+            except Exception as e:
+                decision.update(status="recommended", reason=f"{decision['reason']}; creation failed: {e}")
+
+        if not decisions:
+            return
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(text("""
+                                  INSERT INTO index_advice (index_name, table_name, definition, usage, status,
+                                                            improvement, reason, decided_at)
+                                  VALUES (:index_name, :table_name, :definition, :usage, :status,
+                                          :improvement, :reason, now())
+                                  ON CONFLICT (index_name) DO UPDATE
+                                      SET usage = EXCLUDED.usage,
+                                          status = EXCLUDED.status,
+                                          improvement = EXCLUDED.improvement,
+                                          reason = EXCLUDED.reason,
+                                          decided_at = EXCLUDED.decided_at
+                                  """), decisions)
+                conn.commit()
+        except Exception as e:
+            print(f"⚠️ Could not record index advice: {e}")
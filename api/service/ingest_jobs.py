@@ -0,0 +1,285 @@
+import asyncio
+import contextlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from sqlalchemy import text
+
+from api.configuration.configuration import (
+    INGEST_MAX_CONCURRENT_JOBS,
+    INGEST_MAX_QUEUED_JOBS,
+    INGEST_JOB_HISTORY_SIZE,
+    INGEST_JOB_SYNC_SECONDS,
+    INGEST_JOB_STALE_SECONDS,
+    INGEST_LOCK_POLL_SECONDS
+)
+
+ACTIVE_PHASES = ("queued", "loading", "finalizing")
+
+# Advisory lock namespaces (first key of the two-key form): one lock per load slot, one per table
+SLOT_LOCK_NAMESPACE = 7301
+TABLE_LOCK_NAMESPACE = 7302
+
+SAVE_JOB_QUERY = text("""
+    INSERT INTO ingest_jobs (job_id, table_name, phase, job, submitted_at)
+    VALUES (:job_id, :table_name, :phase, CAST(:job AS JSONB), to_timestamp(:submitted_at))
+    ON CONFLICT (job_id) DO UPDATE
+        SET phase = EXCLUDED.phase, job = EXCLUDED.job, updated_at = now()
+""")
+
+# Jobs of a worker that stopped are no longer updated; they show as failed and don't hold a queue place
+JOBS_QUERY = """
+    SELECT job, phase = ANY(:active) AND updated_at < now() - make_interval(secs => :stale) AS abandoned
+    FROM ingest_jobs
+"""
+
+
+class IngestQueueFull(Exception):
+    pass
+
+
+class IngestJobManager:
+    """
+    Runs CSV ingests as background jobs, with job state shared by all workers through the ingest_jobs table.
+    A job runs in the worker that staged its upload. At most max_concurrent loads hit PostgreSQL at once
+    across all workers (one advisory lock per load slot), loads into the same table run one after the
+    other (an advisory lock per table), and each job reports its phase, rows/bytes loaded and throughput
+    while it runs. The most recent history_size jobs are kept.
+    """
+
+    def __init__(self, ingest, get_engine, on_success=None, max_concurrent: int = INGEST_MAX_CONCURRENT_JOBS,
+                 max_queued: int = INGEST_MAX_QUEUED_JOBS, history_size: int = INGEST_JOB_HISTORY_SIZE):
+        # ingest(path, table_name, mode, key_columns, partition_by, progress_callback) -> (success, columns, stats)
+        self.ingest = ingest
+        # Engine of the job table, resolved on first use so creating the manager doesn't touch the database
+        self.get_engine = get_engine
+        self.on_success = on_success
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.history_size = history_size
+        # Jobs running in this worker; their state is written to ingest_jobs every INGEST_JOB_SYNC_SECONDS
+        self.jobs = OrderedDict()
+        self._tasks = set()
+        # table -> [lock, jobs using it]: keeps this worker's loads of a table in submission order
+        self._table_locks = {}
+        self._table_ready = False
+        self._init_lock = threading.Lock()
+
+    def _engine(self):
+        engine = self.get_engine()
+        with self._init_lock:
+            if not self._table_ready:
+                with engine.connect() as conn:
+                    conn.execute(text("""
+                                      CREATE TABLE IF NOT EXISTS ingest_jobs
+                                      (
+                                          job_id TEXT PRIMARY KEY,
+                                          table_name TEXT NOT NULL,
+                                          phase TEXT NOT NULL,
+                                          job JSONB NOT NULL,
+                                          submitted_at TIMESTAMPTZ NOT NULL,
+                                          updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                                      )
+                                      """))
+                    conn.commit()
+                self._table_ready = True
+        return engine
+
+    def _save(self, job: dict):
+        with self._engine().connect() as conn:
+            conn.execute(SAVE_JOB_QUERY, {"job_id": job["job_id"], "table_name": job["table_name"],
+                                          "phase": job["phase"], "job": json.dumps(job, default=str),
+                                          "submitted_at": job["submitted_at"]})
+            conn.commit()
+
+    def _queued_jobs(self) -> int:
+        with self._engine().connect() as conn:
+            return conn.execute(text("""
+                                     SELECT count(*) FROM ingest_jobs
+                                     WHERE phase = 'queued' AND updated_at >= now() - make_interval(secs => :stale)
+                                     """), {"stale": INGEST_JOB_STALE_SECONDS}).scalar()
+
+    async def submit(self, path: str, table_name: str, mode: str = "replace", key_columns: list = None,
+                     partition_by: str = None) -> dict:
+        """Queues a load of the staged CSV at path (deleted when the job ends). Returns the job."""
+        if await asyncio.to_thread(self._queued_jobs) >= self.max_queued:
+            raise IngestQueueFull(f"{self.max_queued} ingest jobs are already queued, try again later.")
+
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "table_name": table_name,
+            "mode": mode,
+            "phase": "queued",
+            "total_bytes": os.path.getsize(path),
+            "bytes_loaded": 0,
+            "rows_loaded": 0,
+            "percent": 0.0,
+            "rows_per_sec": None,
+            "bytes_per_sec": None,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "columns": [],
+            "stats": None,
+            "error": None
+        }
+        # Saved before returning, so a status poll that lands on another worker finds the job
+        await asyncio.to_thread(self._save, job)
+        self.jobs[job["job_id"]] = job
+
+        task = asyncio.create_task(self._run(job, path, key_columns, partition_by))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def _read_jobs(self, where: str = "", params: dict = None) -> list:
+        with self._engine().connect() as conn:
+            rows = conn.execute(text(JOBS_QUERY + where), {
+                "active": list(ACTIVE_PHASES), "stale": INGEST_JOB_STALE_SECONDS, **(params or {})}).all()
+        jobs = []
+        for job, abandoned in rows:
+            # This worker's own jobs are fresher in memory than in the table
+            job = self.jobs.get(job["job_id"], job)
+            if abandoned and job["job_id"] not in self.jobs:
+                job = {**job, "phase": "failed", "error": "The worker running this job stopped."}
+            jobs.append(job)
+        return jobs
+
+    def get(self, job_id: str):
+        if job_id in self.jobs:
+            return self.jobs[job_id]
+        jobs = self._read_jobs("WHERE job_id = :job_id", {"job_id": job_id})
+        return jobs[0] if jobs else None
+
+    def list_jobs(self) -> list:
+        return self._read_jobs("ORDER BY submitted_at DESC LIMIT :limit", {"limit": self.history_size})
+
+    def stats(self) -> dict:
+        counts = {}
+        for job in self.list_jobs():
+            counts[job["phase"]] = counts.get(job["phase"], 0) + 1
+        return {"max_concurrent": self.max_concurrent, "jobs_by_phase": counts}
+
+    def _trim(self):
+        """Forgets the oldest finished jobs beyond history_size; active jobs are always kept."""
+        with self._engine().connect() as conn:
+            conn.execute(text("""
+                              DELETE FROM ingest_jobs
+                              WHERE NOT (phase = ANY(:active))
+                                AND job_id NOT IN (SELECT job_id FROM ingest_jobs
+                                                   ORDER BY submitted_at DESC LIMIT :limit)
+                              """), {"active": list(ACTIVE_PHASES), "limit": self.history_size})
+            conn.commit()
+
+    # --- Slots and table locks ---
+
+    def _try_lock(self, conn, table_name: str) -> bool:
+        """Takes the table's lock and a free load slot on conn, or neither."""
+        if not conn.execute(text("SELECT pg_try_advisory_lock(:ns, hashtext(:t))"),
+                            {"ns": TABLE_LOCK_NAMESPACE, "t": table_name}).scalar():
+            return False
+        for slot in range(self.max_concurrent):
+            if conn.execute(text("SELECT pg_try_advisory_lock(:ns, :slot)"),
+                            {"ns": SLOT_LOCK_NAMESPACE, "slot": slot}).scalar():
+                return True
+        conn.execute(text("SELECT pg_advisory_unlock(:ns, hashtext(:t))"),
+                     {"ns": TABLE_LOCK_NAMESPACE, "t": table_name})
+        return False
+
+    async def _acquire(self, table_name: str):
+        """
+        Waits for the table and a slot. Returns the connection holding both locks, which are released
+        with it (or with the worker, if it dies). A waiting job holds no connection between attempts.
+        """
+        engine = await asyncio.to_thread(self._engine)
+        while True:
+            # Autocommit: session locks only, no transaction kept open during the load
+            conn = await asyncio.to_thread(lambda: engine.connect().execution_options(isolation_level="AUTOCOMMIT"))
+            try:
+                if await asyncio.to_thread(self._try_lock, conn, table_name):
+                    return conn
+            except BaseException:
+                await asyncio.to_thread(conn.close)
+                raise
+            await asyncio.to_thread(conn.close)
+            await asyncio.sleep(INGEST_LOCK_POLL_SECONDS)
+
+    @staticmethod
+    def _release(conn):
+        try:
+            conn.execute(text("SELECT pg_advisory_unlock_all()"))
+        finally:
+            conn.close()
+
+    async def _sync(self, job: dict, stop: asyncio.Event):
+        """Writes the job's progress for the other workers (and marks it alive) until stop is set."""
+        while not stop.is_set():
+            try:
+                await asyncio.to_thread(self._save, job)
+            except Exception as e:
+                print(f"⚠️ Could not save ingest job {job['job_id'][:8]}: {e}")
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(stop.wait(), INGEST_JOB_SYNC_SECONDS)
+
+    async def _run(self, job: dict, path: str, key_columns, partition_by):
+        entry = self._table_locks.setdefault(job["table_name"], [asyncio.Lock(), 0])
+        entry[1] += 1
+        stop_sync = asyncio.Event()
+        sync = asyncio.create_task(self._sync(job, stop_sync))
+        try:
+            async with entry[0]:
+                conn = await self._acquire(job["table_name"])
+                try:
+                    job["phase"] = "loading"
+                    job["started_at"] = time.time()
+
+                    def progress(rows: int, bytes_read: int):
+                        # Called from the loader thread after every chunk
+                        elapsed = time.time() - job["started_at"]
+                        job["rows_loaded"], job["bytes_loaded"] = rows, bytes_read
+                        job["percent"] = round(min(bytes_read / job["total_bytes"], 1.0) * 100, 1) \
+                            if job["total_bytes"] else 100.0
+                        job["rows_per_sec"] = round(rows / elapsed, 1) if elapsed else None
+                        job["bytes_per_sec"] = round(bytes_read / elapsed, 1) if elapsed else None
+                        if job["percent"] >= 100:
+                            job["phase"] = "finalizing"
+
+                    success, columns, stats = await asyncio.to_thread(
+                        self.ingest, path, job["table_name"], job["mode"], key_columns, partition_by, progress)
+                finally:
+                    await asyncio.to_thread(self._release, conn)
+
+                if not success:
+                    raise RuntimeError(stats.get("error") or "Failed to ingest data into DB.")
+                job.update(phase="succeeded", columns=columns, stats=stats, percent=100.0,
+                           rows_loaded=stats["rows"], rows_per_sec=stats["rows_per_sec"],
+                           bytes_per_sec=stats["bytes_per_sec"])
+                if self.on_success:
+                    self.on_success(job)
+                print(f"✅ Ingest job {job['job_id'][:8]} finished: {stats['rows']} rows into '{job['table_name']}'.")
+
+        except Exception as e:
+            job.update(phase="failed", error=str(e))
+            print(f"❌ Ingest job {job['job_id'][:8]} failed: {e}")
+        finally:
+            job["finished_at"] = time.time()
+            entry[1] -= 1
+            if not entry[1]:
+                del self._table_locks[job["table_name"]]
+            # Let a progress save in flight finish first, so it can't overwrite the final state
+            stop_sync.set()
+            await sync
+            try:
+                await asyncio.to_thread(self._save, job)
+                await asyncio.to_thread(self._trim)
+                self.jobs.pop(job["job_id"], None)
+            except Exception as e:
+                print(f"⚠️ Could not save ingest job {job['job_id'][:8]}: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
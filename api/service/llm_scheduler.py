@@ -0,0 +1,210 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+
+from api.configuration.configuration import (
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TOKENS_PER_MINUTE,
+    LLM_MIN_CONCURRENCY,
+    LLM_MAX_CONCURRENCY,
+    LLM_INITIAL_CONCURRENCY,
+    LLM_MAX_RETRIES,
+    LLM_EXPECTED_COMPLETION_TOKENS
+)
+from api.configuration.llm_factory import estimate_tokens
+from api.service.telemetry import span, record_llm_tokens, record_llm_retry
+
+# Priority lanes: lower runs first
+PRIORITY_INTERACTIVE = 0    # SQL generation - the user is waiting on it
+PRIORITY_ANSWER = 1         # final, streamed answer
+PRIORITY_BULK = 2           # map / intermediate reduce calls over large results
+LANE_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_ANSWER: "answer", PRIORITY_BULK: "bulk"}
+
+TRANSIENT_STATUS_CODES = {408, 409, 500, 502, 503, 504}
+
+
+def _status_code(error):
+    return getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+
+
+def _retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Refills continuously at per_minute / 60 per second, up to one minute of capacity."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class LLMScheduler:
+    """
+    Process-wide gate for every LLM call.
+    Calls wait in priority lanes and are admitted while there is a free concurrency slot and room in
+    the requests-per-minute and tokens-per-minute buckets. Concurrency adapts AIMD-style: +1 after a
+    window of successes, halved (and admission paused) when the API throttles with a 429.
+    """
+
+    def __init__(self, requests_per_minute: int = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: int = LLM_TOKENS_PER_MINUTE,
+                 min_concurrency: int = LLM_MIN_CONCURRENCY,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 initial_concurrency: int = LLM_INITIAL_CONCURRENCY,
+                 max_retries: int = LLM_MAX_RETRIES):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.concurrency = initial_concurrency
+        self.max_retries = max_retries
+        self.counters = {"completed": 0, "failed": 0, "throttled": 0, "retries": 0}
+        self._reset_loop_state()
+
+    def _reset_loop_state(self):
+        self._loop = None
+        self._waiters = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._successes = 0
+        self._paused_until = 0.0
+        self._timer = None
+
+    def stats(self) -> dict:
+        queued = {name: 0 for name in LANE_NAMES.values()}
+        for priority, _, _, future in self._waiters:
+            if not future.done():
+                queued[LANE_NAMES.get(priority, str(priority))] += 1
+        return {"concurrency": self.concurrency, "in_flight": self._in_flight, "queued": queued, **self.counters}
+
+    async def ainvoke(self, runnable, inputs, priority: int = PRIORITY_INTERACTIVE):
+        """Runs runnable.ainvoke(inputs) through the scheduler."""
+        tokens = estimate_tokens(str(inputs)) + LLM_EXPECTED_COMPLETION_TOKENS
+        return await self.run(lambda: runnable.ainvoke(inputs), priority, tokens)
+
+    async def run(self, call, priority: int, tokens: int):
+        """Awaits call() once admitted; 429s and transient errors are retried with backoff."""
+        lane = LANE_NAMES.get(priority, str(priority))
+        for attempt in range(self.max_retries + 1):
+            with span("llm_queue", lane):
+                await self._acquire(priority, tokens)
+            try:
+                with span("llm", lane):
+                    result = await call()
+            except Exception as e:
+                error = e
+            else:
+                self._on_success()
+                self._record_usage(lane, result, tokens)
+                return result
+            finally:
+                self._release()
+
+            status = _status_code(error)
+            if attempt == self.max_retries or not (status == 429 or status in TRANSIENT_STATUS_CODES
+                                                    or type(error).__name__ in ("APIConnectionError", "APITimeoutError")):
+                self.counters["failed"] += 1
+                raise error
+
+            delay = min(30.0, 2 ** attempt) * (0.5 + random.random())
+            if status == 429:
+                delay = self._on_throttled(_retry_after(error) or delay)
+            self.counters["retries"] += 1
+            record_llm_retry(lane, str(status or type(error).__name__))
+            print(f"⏳ LLM call failed ({status or type(error).__name__}), retrying in {delay:.1f}s "
+                  f"(attempt {attempt + 1}/{self.max_retries}).")
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _record_usage(lane: str, result, reserved_tokens: int):
+        # Actual usage when the provider reports it, otherwise the estimate the call was admitted with
+        usage = getattr(result, "usage_metadata", None) or {}
+        prompt_tokens = usage.get("input_tokens") or max(0, reserved_tokens - LLM_EXPECTED_COMPLETION_TOKENS)
+        completion_tokens = usage.get("output_tokens") or estimate_tokens(str(getattr(result, "content", "")))
+        record_llm_tokens(lane, prompt_tokens, completion_tokens)
+
+    async def _acquire(self, priority: int, tokens: int):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Futures and timers belong to one event loop (tests/benchmarks may run several)
+            self._reset_loop_state()
+            self._loop = loop
+
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), tokens, future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()
+            else:
+                future.cancel()
+            raise
+
+    def _release(self):
+        self._in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._waiters and self._in_flight < self.concurrency:
+            priority, _, tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+
+            # Strict priority: a waiting interactive call is not overtaken by bulk calls that happen to fit
+            wait = max(self._paused_until - time.monotonic(),
+                       self.requests.wait_time(1), self.tokens.wait_time(tokens))
+            if wait > 0:
+                if self._timer is None:
+                    self._timer = self._loop.call_later(wait, self._on_timer)
+                return
+
+            heapq.heappop(self._waiters)
+            self.requests.consume(1)
+            self.tokens.consume(tokens)
+            self._in_flight += 1
+            future.set_result(None)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def _on_success(self):
+        self.counters["completed"] += 1
+        self._successes += 1
+        if self._successes >= self.concurrency and self.concurrency < self.max_concurrency:
+            self.concurrency += 1
+            self._successes = 0
+
+    def _on_throttled(self, delay: float) -> float:
+        self.counters["throttled"] += 1
+        self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+        self._successes = 0
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        print(f"🚦 LLM throttled (429): concurrency lowered to {self.concurrency}, pausing {delay:.1f}s.")
+        return delay
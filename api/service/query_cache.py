@@ -0,0 +1,144 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from api.configuration.configuration import (
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_TTL_SECONDS,
+    RESULT_CACHE_MAX_ENTRIES,
+    RESULT_CACHE_TTL_SECONDS,
+    RESULT_CACHE_MAX_ENTRY_BYTES
+)
+from api.service.telemetry import record_cache
+
+# Splits SQL into single-quoted literals (kept verbatim) and everything else
+SQL_LITERAL_PATTERN = re.compile(r"('(?:[^']|'')*')")
+
+
+def normalize_question(question: str) -> str:
+    return re.sub(r"\s+", " ", question.strip().lower()).rstrip(" ?.!")
+
+
+def normalize_sql(sql: str) -> str:
+    parts = SQL_LITERAL_PATTERN.split(sql.strip().rstrip(";"))
+    return "".join(p if i % 2 else re.sub(r"\s+", " ", p) for i, p in enumerate(parts)).strip()
+
+
+def referenced_tables(sql: str, known_tables) -> list:
+    """Returns the known tables whose name appears as an identifier in the SQL."""
+    found = []
+    for table in known_tables:
+        if re.search(rf'"{re.escape(table)}"', sql) or \
+                re.search(rf'(?<![\w"]){re.escape(table)}(?![\w"])', sql, re.IGNORECASE):
+            found.append(table)
+    return sorted(found)
+
+
+class LRUTTLCache:
+    """Thread-safe LRU cache with per-entry TTL and hit/miss counters."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, is_current=None):
+        """is_current(value) returning False turns a stored entry into a miss and drops it."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._data[key]
+                entry = None
+        # Checked outside the lock: it may query the database
+        if entry is not None and is_current is not None and not is_current(entry[1]):
+            with self._lock:
+                if self._data.get(key) is entry:
+                    del self._data[key]
+            entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            if key in self._data:
+                self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def remove_where(self, predicate):
+        with self._lock:
+            for key in [k for k, (_, v) in self._data.items() if predicate(v)]:
+                del self._data[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None
+        }
+
+
+class QueryCache:
+    """
+    Two-level cache for the /chat pipeline.
+    Level 1: (normalized question, chat history, schema version) -> generated SQL and final answer,
+    served only while the tables it read are still at the versions they had.
+    Level 2: (normalized SQL, versions of the tables it reads) -> query result.
+    Table versions come from the database (see PostgresManager.table_versions), so a load through
+    any worker, or a write outside the API, makes the entries that read the table miss everywhere;
+    invalidate_table also drops them from this worker right away.
+    """
+
+    def __init__(self):
+        self.answers = LRUTTLCache(ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL_SECONDS)
+        self.results = LRUTTLCache(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_TTL_SECONDS)
+
+    @staticmethod
+    def _answer_key(question: str, chat_history, schema_version: int) -> tuple:
+        return normalize_question(question), tuple(chat_history or []), schema_version
+
+    @staticmethod
+    def _result_key(sql: str, table_versions: dict) -> tuple:
+        return normalize_sql(sql), tuple(sorted(table_versions.items()))
+
+    def get_answer(self, question: str, chat_history, schema_version: int, current_versions):
+        """current_versions(tables) -> {table: version}, read from the database on a hit."""
+        entry = self.answers.get(self._answer_key(question, chat_history, schema_version),
+                                 lambda e: current_versions(e["tables"]) == e["table_versions"])
+        record_cache("answer", entry is not None)
+        return entry
+
+    def set_answer(self, question: str, chat_history, schema_version: int, response: dict, table_versions: dict):
+        self.answers.set(self._answer_key(question, chat_history, schema_version),
+                         {**response, "tables": list(table_versions), "table_versions": dict(table_versions)})
+
+    def get_result(self, sql: str, table_versions: dict):
+        entry = self.results.get(self._result_key(sql, table_versions))
+        record_cache("result", entry is not None)
+        return entry
+
+    def set_result(self, sql: str, table_versions: dict, result: dict):
+        if len(result.get("data") or "") > RESULT_CACHE_MAX_ENTRY_BYTES:
+            return
+        self.results.set(self._result_key(sql, table_versions), {**result, "tables": list(table_versions)})
+
+    def invalidate_table(self, table: str):
+        self.answers.remove_where(lambda entry: table in entry["tables"])
+        self.results.remove_where(lambda entry: table in entry["tables"])
+        print(f"🧹 Cache entries reading '{table}' invalidated.")
+
+    def stats(self) -> dict:
+        return {"answers": self.answers.stats(), "results": self.results.stats()}
@@ -0,0 +1,168 @@
+import os
+import re
+import threading
+import time
+import uuid
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from api.configuration.configuration import (
+    RESULT_STORE_DIR,
+    RESULT_STORE_MAX_AGE_SECONDS,
+    RESULT_STORE_MAX_BYTES,
+    RESULT_STORE_EVICT_INTERVAL_SECONDS
+)
+
+RESULT_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+EXPORT_FORMATS = {"csv", "parquet"}
+
+
+class ResultStore:
+    """
+    Persists each query result once as an Arrow IPC file under a result id.
+    Pages, row ranges and downloads are served from memory-mapped files, so they never
+    re-run the SQL or the agent graph. Old results are evicted by age and total size; saves only
+    add to an in-memory byte count, and the directory is scanned every evict_interval seconds or
+    once that count says the store may be over max_bytes (other workers' saves show up at the scan).
+    """
+
+    def __init__(self, root: str = RESULT_STORE_DIR,
+                 max_age_seconds: int = RESULT_STORE_MAX_AGE_SECONDS,
+                 max_bytes: int = RESULT_STORE_MAX_BYTES,
+                 evict_interval: float = RESULT_STORE_EVICT_INTERVAL_SECONDS):
+        self.root = root
+        self.max_age_seconds = max_age_seconds
+        self.max_bytes = max_bytes
+        self.evict_interval = evict_interval
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._store_bytes = 0     # size of the store at the last scan
+        self._saved_bytes = 0     # written by this worker since
+        self._last_evict = None
+        self._evicting = False
+
+    def _path(self, result_id: str, ext: str = "arrow") -> str:
+        if not RESULT_ID_PATTERN.match(result_id):
+            raise KeyError(f"Invalid result id '{result_id}'.")
+        return os.path.join(self.root, f"{result_id}.{ext}")
+
+    @staticmethod
+    def _to_arrow(df) -> pa.Table:
+        arrays = []
+        for _, series in df.items():
+            try:
+                arrays.append(pa.array(series, from_pandas=True))
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # Mixed-type object column: fall back to its text form
+                arrays.append(pa.array(series.astype(str).where(series.notna(), None), from_pandas=True))
+        return pa.Table.from_arrays(arrays, names=[str(c) for c in df.columns])
+
+    def save(self, df) -> str:
+        """Writes the DataFrame to the store and returns its result id."""
+        result_id = uuid.uuid4().hex
+        path = self._path(result_id)
+        table = self._to_arrow(df)
+
+        tmp_path = f"{path}.tmp"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+
+        self._maybe_evict(result_id, os.path.getsize(path))
+        return result_id
+
+    def _maybe_evict(self, keep: str, size: int):
+        with self._lock:
+            self._saved_bytes += size
+            due = self._last_evict is None or time.monotonic() - self._last_evict >= self.evict_interval \
+                or self._store_bytes + self._saved_bytes > self.max_bytes
+            if not due or self._evicting:
+                return
+            self._evicting = True
+            saved = self._saved_bytes
+
+        remaining = None
+        try:
+            remaining = self.evict(keep=keep)
+        finally:
+            with self._lock:
+                self._evicting = False
+                self._last_evict = time.monotonic()
+                if remaining is not None:
+                    self._store_bytes = remaining
+                    self._saved_bytes -= saved
+
+    def open_table(self, result_id: str) -> pa.Table:
+        """Memory-maps a stored result; raises KeyError if it does not exist (or was evicted)."""
+        path = self._path(result_id)
+        if not os.path.exists(path):
+            raise KeyError(f"Result '{result_id}' not found or expired.")
+        return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+    def get_page(self, result_id: str, offset: int = 0, limit: int = 100) -> dict:
+        table = self.open_table(result_id)
+        page = table.slice(offset, limit)
+        return {
+            "result_id": result_id,
+            "total_rows": table.num_rows,
+            "offset": offset,
+            "limit": limit,
+            "columns": [{"name": f.name, "type": str(f.type)} for f in table.schema],
+            "rows": page.to_pylist()
+        }
+
+    def export(self, result_id: str, fmt: str) -> str:
+        """Returns the path of a CSV/Parquet export of the result, writing it on first request."""
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported format '{fmt}'. Use one of {sorted(EXPORT_FORMATS)}.")
+
+        export_path = self._path(result_id, fmt)
+        if not os.path.exists(export_path):
+            table = self.open_table(result_id)
+            tmp_path = f"{export_path}.tmp"
+            if fmt == "csv":
+                pa_csv.write_csv(table, tmp_path)
+            else:
+                pq.write_table(table, tmp_path)
+            os.replace(tmp_path, export_path)
+        return export_path
+
+    def evict(self, keep: str = None) -> int:
+        """
+        Removes results older than max_age, then the oldest ones until the store fits in max_bytes.
+        keep (the result just saved) counts towards max_bytes but is never removed.
+        Returns the bytes left in the store.
+        """
+        groups, kept = {}, 0
+        for name in os.listdir(self.root):
+            result_id = name.split(".", 1)[0]
+            if not RESULT_ID_PATTERN.match(result_id):
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if result_id == keep:
+                kept += stat.st_size
+                continue
+            group = groups.setdefault(result_id, {"paths": [], "size": 0, "mtime": stat.st_mtime})
+            group["paths"].append(path)
+            group["size"] += stat.st_size
+            group["mtime"] = min(group["mtime"], stat.st_mtime)
+
+        now = time.time()
+        total = kept + sum(g["size"] for g in groups.values())
+        for result_id, group in sorted(groups.items(), key=lambda item: item[1]["mtime"]):
+            if now - group["mtime"] <= self.max_age_seconds and total <= self.max_bytes:
+                break
+            for path in group["paths"]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= group["size"]
+        return total
@@ -0,0 +1,467 @@
+import hashlib
+import json
+import threading
+import time
+
+import sqlglot
+from sqlalchemy import text
+from sqlglot import exp
+from sqlglot.errors import ParseError, TokenError
+
+from api.configuration.configuration import (
+    ROLLUP_WINDOW_DAYS,
+    ROLLUP_MIN_OCCURRENCES,
+    ROLLUP_MAX_PER_TABLE,
+    ROLLUP_MAX_GROUP_COLUMNS,
+    ROLLUP_MIN_TABLE_ROWS,
+    ROLLUP_MAX_ROWS_RATIO,
+    INDEX_ADVISOR_MAX_QUERIES
+)
+from api.service.csv_loader import quote_ident
+from api.service.index_advisor import TABLE_ROWS_QUERY, WORKLOAD_QUERY
+from api.service.schema_catalog import data_fingerprints
+from api.service.sql_validator import _ident_name
+from api.service.telemetry import record_cache
+
+NUMERIC_TYPES = {"smallint", "integer", "bigint", "numeric", "real", "double precision"}
+SUPPORTED_AGGREGATES = (exp.Count, exp.Sum, exp.Avg, exp.Min, exp.Max)
+# Constructs a single-table rollup can't answer
+UNSUPPORTED_NODES = (exp.Join, exp.Subquery, exp.With, exp.Window, exp.Union, exp.Intersect, exp.Except)
+ROWS_COLUMN = "__rows"
+MAX_IDENTIFIER_LENGTH = 63
+
+
+def measure_column(agg: str, column: str) -> str:
+    return f"{agg}__{column}"
+
+
+def rollup_name(table: str, group_columns) -> str:
+    digest = hashlib.sha1(f"{table}|{'|'.join(sorted(group_columns))}".encode()).hexdigest()[:10]
+    return f"rollup_{table[:40]}_{digest}".lower()
+
+
+def parse_shape(sql: str, tables: dict):
+    """
+    Returns the aggregate shape of a single-table GROUP BY / global aggregate query:
+    {"tree", "table", "dimensions", "measures"}, or None when a rollup could not answer it.
+    dimensions are every base column used outside an aggregate (GROUP BY, WHERE, HAVING, ORDER BY),
+    measures the (aggregate, column) pairs, column None for COUNT(*). GROUP BY expressions such as
+    DATE_TRUNC('month', "date") are fine: they regroup a rollup grouped by the raw column.
+    """
+    try:
+        tree = sqlglot.parse_one(sql, read="postgres")
+    except (ParseError, TokenError):
+        return None
+    if not isinstance(tree, exp.Select) or tree.args.get("distinct") or tree.find(*UNSUPPORTED_NODES):
+        return None
+
+    sources = list(tree.find_all(exp.Table))
+    if len(sources) != 1 or not isinstance(sources[0].this, exp.Identifier):
+        return None
+    table = _ident_name(sources[0].this)
+    schema = _ident_name(sources[0].args["db"]) if sources[0].args.get("db") else ""
+    if table not in tables or schema not in ("", "public"):
+        return None
+    columns = {c["name"] for c in tables[table]}
+
+    measures = set()
+    for agg in tree.find_all(exp.AggFunc):
+        if not isinstance(agg, SUPPORTED_AGGREGATES):
+            return None
+        arg = agg.this
+        if isinstance(agg, exp.Count) and isinstance(arg, exp.Star):
+            measures.add(("count", None))
+        elif isinstance(agg, exp.Count) and isinstance(arg, exp.Distinct):
+            # COUNT(DISTINCT dim) stays as it is and is answered from the group columns
+            if len(arg.expressions) != 1 or not isinstance(arg.expressions[0], exp.Column):
+                return None
+        elif isinstance(arg, exp.Column) and _ident_name(arg.this) in columns:
+            measures.add((agg.key, _ident_name(arg.this)))
+        else:
+            return None
+    if not measures:
+        return None
+
+    aliases = {e.alias for e in tree.expressions if e.alias}
+    dimensions = set()
+    for column in tree.find_all(exp.Column):
+        name = _ident_name(column.this)
+        inside_aggregate = isinstance(column.find_ancestor(exp.AggFunc), SUPPORTED_AGGREGATES) and \
+            not isinstance(column.parent, exp.Distinct)
+        if inside_aggregate:
+            continue
+        if name in columns:
+            dimensions.add(name)
+        elif name not in aliases:
+            return None
+
+    return {"tree": tree, "table": table, "dimensions": dimensions, "measures": measures}
+
+
+class RollupManager:
+    """
+    Materialized rollups for recurring aggregate questions.
+    Recurring single-table aggregate shapes in query_log get a materialized view grouped by their
+    dimension columns, with COUNT/SUM/MIN/MAX of the measure columns. Generated SQL whose dimensions
+    and aggregates are covered by a rollup is rewritten to read the (much smaller) view instead of
+    the base table. Rollups are refreshed after /ingest loads their table and whenever the table's
+    data fingerprint shows a write made outside the API; until then (a rollup whose fingerprint is
+    not the table's current one) queries read the base table.
+    """
+
+    def __init__(self, engine, schema_catalog):
+        self.engine = engine
+        self.schema_catalog = schema_catalog
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._rollups = {}    # table -> [definition, ...], smallest first
+        self._hits = {}
+        self._stale = set()   # tables whose rollups must not answer queries until refreshed
+        self.checked = 0
+        self.rewritten = 0
+        self.fallbacks = 0
+        self.refreshes = 0
+        self.refresh_seconds = 0.0
+        self._init_table()
+        self.reload()
+
+    def _init_table(self):
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(text("""
+                                  CREATE TABLE IF NOT EXISTS rollup_definitions
+                                  (
+                                      name TEXT PRIMARY KEY,
+                                      table_name TEXT NOT NULL,
+                                      group_columns TEXT NOT NULL,
+                                      measures TEXT NOT NULL,
+                                      row_count BIGINT,
+                                      base_rows BIGINT,
+                                      refresh_seconds DOUBLE PRECISION,
+                                      refreshed_at TIMESTAMPTZ
+                                  )
+                                  """))
+                # Data fingerprint of the base table the rollup was last built from
+                conn.execute(text("ALTER TABLE rollup_definitions ADD COLUMN IF NOT EXISTS base_fingerprint TEXT"))
+                conn.commit()
+        except Exception as e:
+            print(f"⚠️ Could not initialize rollup table: {e}")
+
+    def reload(self):
+        """Loads the rollup definitions (other workers may have created some)."""
+        try:
+            with self.engine.connect() as conn:
+                rows = conn.execute(text("SELECT * FROM rollup_definitions ORDER BY row_count")).mappings().all()
+        except Exception as e:
+            print(f"⚠️ Could not load rollups: {e}")
+            return
+        by_table = {}
+        for row in rows:
+            by_table.setdefault(row["table_name"], []).append({
+                **row,
+                "group_columns": json.loads(row["group_columns"]),
+                "measures": json.loads(row["measures"]),
+                "refreshed_at": row["refreshed_at"].isoformat() if row["refreshed_at"] else None
+            })
+        with self._lock:
+            self._rollups = by_table
+
+    # --- Query rewrite ---
+
+    def rewrite(self, sql: str, tables: dict, table_versions: dict):
+        """
+        Returns (rewritten SQL, rollup name) when a rollup answers the query, else (None, None).
+        table_versions are the current data fingerprints of the tables: only rollups built from the
+        current version answer, so a load made by another worker is seen before its freshness check.
+        """
+        with self._lock:
+            rollups = self._rollups
+            stale = set(self._stale)
+            self.checked += 1
+        shape = parse_shape(sql, tables) if rollups else None
+        current = table_versions.get(shape["table"]) if shape else None
+        rollup = next((r for r in rollups.get(shape["table"], [])
+                       if r["base_fingerprint"] == current and self._covers(r, shape)), None) \
+            if current and shape["table"] not in stale else None
+        record_cache("rollup", rollup is not None)
+        if rollup is None:
+            return None, None
+
+        with self._lock:
+            self.rewritten += 1
+            self._hits[rollup["name"]] = self._hits.get(rollup["name"], 0) + 1
+        return self._rewrite_tree(shape["tree"], rollup).sql(dialect="postgres"), rollup["name"]
+
+    def mark_stale(self, table_name: str):
+        """Stops answering from the table's rollups until refresh_table has brought them up to date."""
+        with self._lock:
+            self._stale.add(table_name)
+
+    def record_fallback(self):
+        with self._lock:
+            self.fallbacks += 1
+
+    @staticmethod
+    def _covers(rollup: dict, shape: dict) -> bool:
+        if not shape["dimensions"] <= set(rollup["group_columns"]):
+            return False
+        for agg, column in shape["measures"]:
+            if column is None:
+                continue
+            available = rollup["measures"].get(column, [])
+            needed = {"avg": ["sum", "count"]}.get(agg, [agg])
+            if not all(a in available for a in needed):
+                return False
+        return True
+
+    @staticmethod
+    def _rewrite_tree(tree, rollup: dict):
+        def column(agg, name):
+            return exp.column(measure_column(agg, name), quoted=True)
+
+        def replace(node):
+            if isinstance(node, exp.Table):
+                # Keep the original name as alias so qualified column references still resolve
+                alias = node.alias or _ident_name(node.this)
+                return exp.Table(this=exp.to_identifier(rollup["name"], quoted=True),
+                                 alias=exp.TableAlias(this=exp.to_identifier(alias, quoted=True)))
+            if not isinstance(node, SUPPORTED_AGGREGATES):
+                return node
+            arg = node.this
+            if isinstance(node, exp.Count):
+                if isinstance(arg, exp.Distinct):
+                    return node
+                source = exp.column(ROWS_COLUMN, quoted=True) if isinstance(arg, exp.Star) \
+                    else column("count", _ident_name(arg.this))
+                # Counts add up; SUM over no groups is NULL where COUNT is 0
+                return exp.Coalesce(this=exp.Sum(this=source), expressions=[exp.Literal.number(0)])
+            name = _ident_name(arg.this)
+            if isinstance(node, exp.Avg):
+                # typed: plain SQL division, SUM() of integers is already numeric in PostgreSQL
+                return exp.Div(this=exp.Sum(this=column("sum", name)),
+                               expression=exp.Nullif(this=exp.Sum(this=column("count", name)),
+                                                     expression=exp.Literal.number(0)),
+                               typed=True)
+            return node.__class__(this=column(node.key, name))
+
+        tree = tree.copy()
+        # Keep PostgreSQL's default output names (count, sum, avg, ...) for un-aliased aggregates
+        tree.set("expressions", [
+            exp.alias_(e, e.key, quoted=True) if isinstance(e, SUPPORTED_AGGREGATES) else e
+            for e in tree.expressions
+        ])
+        return tree.transform(replace)
+
+    # --- Discovery and maintenance ---
+
+    def discover(self) -> dict:
+        """Creates rollups for aggregate shapes asked at least ROLLUP_MIN_OCCURRENCES times."""
+        with self._build_lock:
+            tables = self.schema_catalog.get_tables()
+            with self.engine.connect() as conn:
+                workload = conn.execute(WORKLOAD_QUERY, {"days": ROLLUP_WINDOW_DAYS,
+                                                         "limit": INDEX_ADVISOR_MAX_QUERIES,
+                                                         "include_rollups": True}).all()
+
+            shapes = {}
+            for sql, calls, _ in workload:
+                shape = parse_shape(sql, tables)
+                if shape is None or len(shape["dimensions"]) > ROLLUP_MAX_GROUP_COLUMNS:
+                    continue
+                entry = shapes.setdefault((shape["table"], frozenset(shape["dimensions"])),
+                                          {"calls": 0, "measures": set()})
+                entry["calls"] += calls
+                entry["measures"] |= {m for m in shape["measures"] if m[1]}
+
+            created = []
+            for (table, dimensions), entry in sorted(shapes.items(), key=lambda s: -s[1]["calls"]):
+                existing = self._rollups.get(table, [])
+                shape = {"dimensions": set(dimensions), "measures": entry["measures"]}
+                if entry["calls"] < ROLLUP_MIN_OCCURRENCES or len(existing) >= ROLLUP_MAX_PER_TABLE \
+                        or any(self._covers(r, shape) for r in existing):
+                    continue
+                definition = self._define(table, sorted(dimensions), entry["measures"], tables[table])
+                if self._build(definition):
+                    created.append(definition["name"])
+                    self.reload()
+
+            print(f"🧮 Rollups: {len(workload)} queries, {len(shapes)} aggregate shapes, {len(created)} rollups created.")
+            return {"queries": len(workload), "shapes": len(shapes), "created": created}
+
+    @staticmethod
+    def _define(table: str, group_columns: list, seen_measures: set, columns: list) -> dict:
+        """Every numeric column gets COUNT/SUM/MIN/MAX so the rollup serves more than one question."""
+        measures = {}
+        for c in columns:
+            if c["name"] in group_columns or len(measure_column("count", c["name"])) > MAX_IDENTIFIER_LENGTH:
+                continue
+            if c["type"].lower() in NUMERIC_TYPES:
+                measures[c["name"]] = ["count", "sum", "min", "max"]
+            elif any(name == c["name"] for _, name in seen_measures):
+                measures[c["name"]] = ["count", "min", "max"]
+        return {"name": rollup_name(table, group_columns), "table_name": table,
+                "group_columns": group_columns, "measures": measures}
+
+    @staticmethod
+    def _select_sql(definition: dict) -> str:
+        groups = [quote_ident(c) for c in definition["group_columns"]]
+        aggregates = [f"COUNT(*) AS {quote_ident(ROWS_COLUMN)}"] + [
+            f"{agg.upper()}({quote_ident(column)}) AS {quote_ident(measure_column(agg, column))}"
+            for column, aggs in definition["measures"].items() for agg in aggs
+        ]
+        return (f"SELECT {', '.join(groups + aggregates)} FROM {quote_ident(definition['table_name'])}"
+                + (f" GROUP BY {', '.join(groups)}" if groups else ""))
+
+    def _build(self, definition: dict) -> bool:
+        """(Re)creates the materialized view; drops it again when it isn't much smaller than the table."""
+        name = quote_ident(definition["name"])
+        start = time.perf_counter()
+        try:
+            with self.engine.connect() as conn:
+                base_rows = conn.execute(TABLE_ROWS_QUERY, {"t": quote_ident(definition["table_name"])}).scalar()
+                if base_rows < ROLLUP_MIN_TABLE_ROWS:
+                    return False
+                # Taken before reading the table: a write during the build shows up as a change later
+                fingerprint = data_fingerprints(conn, [definition["table_name"]]).get(definition["table_name"])
+                conn.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {name}"))
+                conn.execute(text(f"CREATE MATERIALIZED VIEW {name} AS {self._select_sql(definition)}"))
+                row_count = conn.execute(text(f"SELECT COUNT(*) FROM {name}")).scalar()
+
+                if row_count > base_rows * ROLLUP_MAX_ROWS_RATIO:
+                    conn.rollback()
+                    print(f"🧮 Skipping rollup on {definition['group_columns']}: {row_count} groups "
+                          f"for ~{base_rows:,.0f} rows.")
+                    return False
+
+                seconds = time.perf_counter() - start
+                conn.execute(text("""
+                                  INSERT INTO rollup_definitions (name, table_name, group_columns, measures, row_count,
+                                                                  base_rows, refresh_seconds, refreshed_at,
+                                                                  base_fingerprint)
+                                  VALUES (:name, :table_name, :group_columns, :measures, :row_count,
+                                          :base_rows, :seconds, now(), :fingerprint)
+                                  ON CONFLICT (name) DO UPDATE
+                                      SET group_columns = EXCLUDED.group_columns,
+                                          measures = EXCLUDED.measures,
+                                          row_count = EXCLUDED.row_count,
+                                          base_rows = EXCLUDED.base_rows,
+                                          refresh_seconds = EXCLUDED.refresh_seconds,
+                                          refreshed_at = EXCLUDED.refreshed_at,
+                                          base_fingerprint = EXCLUDED.base_fingerprint
+                                  """), {**definition, "group_columns": json.dumps(definition["group_columns"]),
+                                         "measures": json.dumps(definition["measures"]),
+                                         "row_count": row_count, "base_rows": base_rows, "seconds": seconds,
+                                         "fingerprint": fingerprint})
+                conn.commit()
+        except Exception as e:
+            print(f"⚠️ Could not build rollup {definition['name']}: {e}")
+            return False
+
+        with self._lock:
+            self.refreshes += 1
+            self.refresh_seconds += seconds
+        print(f"🧮 Built rollup {definition['name']} on {definition['table_name']} "
+              f"{definition['group_columns']}: {row_count} rows in {seconds:.2f}s.")
+        return True
+
+    def _refresh(self, definition: dict) -> bool:
+        """REFRESHes an existing rollup in place (concurrent refreshes queue on the view's lock)."""
+        name = quote_ident(definition["name"])
+        start = time.perf_counter()
+        try:
+            with self.engine.connect() as conn:
+                fingerprint = data_fingerprints(conn, [definition["table_name"]]).get(definition["table_name"])
+                conn.execute(text(f"REFRESH MATERIALIZED VIEW {name}"))
+                row_count = conn.execute(text(f"SELECT COUNT(*) FROM {name}")).scalar()
+                base_rows = conn.execute(TABLE_ROWS_QUERY, {"t": quote_ident(definition["table_name"])}).scalar()
+                seconds = time.perf_counter() - start
+                conn.execute(text("""
+                                  UPDATE rollup_definitions
+                                  SET row_count = :row_count, base_rows = :base_rows, refresh_seconds = :seconds,
+                                      refreshed_at = now(), base_fingerprint = :fingerprint
+                                  WHERE name = :name
+                                  """), {"name": definition["name"], "row_count": row_count, "base_rows": base_rows,
+                                         "seconds": seconds, "fingerprint": fingerprint})
+                conn.commit()
+        except Exception as e:
+            print(f"⚠️ Could not refresh rollup {definition['name']}: {e}")
+            return False
+
+        with self._lock:
+            self.refreshes += 1
+            self.refresh_seconds += seconds
+        print(f"🧮 Refreshed rollup {definition['name']}: {row_count} rows in {seconds:.2f}s.")
+        return True
+
+    def _view_exists(self, name: str) -> bool:
+        with self.engine.connect() as conn:
+            return conn.execute(text("SELECT to_regclass(:n)"), {"n": quote_ident(name)}).scalar() is not None
+
+    def refresh_table(self, table_name: str) -> dict:
+        """
+        Brings the rollups of a loaded table up to date: refreshed in place after an append or upsert,
+        rebuilt after a replacing ingest (which drops them with the table), removed when their columns
+        are gone. The table's rollups answer queries again once this has finished.
+        """
+        with self._build_lock:
+            self.schema_catalog.invalidate()
+            columns = {c["name"]: c for c in self.schema_catalog.get_tables().get(table_name, [])}
+            rebuilt, removed = [], []
+
+            for rollup in list(self._rollups.get(table_name, [])):
+                needed = set(rollup["group_columns"]) | set(rollup["measures"])
+                if needed <= set(columns):
+                    refreshed = self._refresh(rollup) if self._view_exists(rollup["name"]) else self._build(rollup)
+                    if refreshed:
+                        rebuilt.append(rollup["name"])
+                        continue
+                removed.append(rollup["name"])
+                try:
+                    with self.engine.connect() as conn:
+                        conn.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {quote_ident(rollup['name'])}"))
+                        conn.execute(text("DELETE FROM rollup_definitions WHERE name = :n"), {"n": rollup["name"]})
+                        conn.commit()
+                except Exception as e:
+                    print(f"⚠️ Could not remove rollup {rollup['name']}: {e}")
+
+            self.reload()
+            with self._lock:
+                self._stale.discard(table_name)
+            return {"table": table_name, "rebuilt": rebuilt, "removed": removed}
+
+    def check_freshness(self) -> list:
+        """
+        Refreshes the rollups whose base table was written since they were built or refreshed,
+        e.g. by another worker or outside the API. Returns the refreshed tables.
+        """
+        self.reload()
+        with self._lock:
+            built = {table: {r["base_fingerprint"] for r in rollups} for table, rollups in self._rollups.items()}
+        if not built:
+            return []
+        with self.engine.connect() as conn:
+            current = data_fingerprints(conn, built)
+
+        changed = [table for table, fingerprints in built.items() if fingerprints != {current.get(table)}]
+        for table in changed:
+            print(f"🧮 '{table}' changed since its rollups were refreshed, refreshing...")
+            self.mark_stale(table)
+            self.refresh_table(table)
+        return changed
+
+    def list_rollups(self) -> list:
+        with self._lock:
+            return [{**r, "hits": self._hits.get(r["name"], 0)}
+                    for rollups in self._rollups.values() for r in rollups]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rollups": sum(len(r) for r in self._rollups.values()),
+                "queries_checked": self.checked,
+                "rewritten": self.rewritten,
+                "hit_rate": round(self.rewritten / self.checked, 4) if self.checked else 0.0,
+                "fallbacks": self.fallbacks,
+                "refreshes": self.refreshes,
+                "refresh_seconds_total": round(self.refresh_seconds, 3)
+            }
@@ -0,0 +1,149 @@
+import threading
+import time
+
+from sqlalchemy import text
+
+from api.configuration.configuration import SCHEMA_CATALOG_CHECK_INTERVAL
+from api.service.telemetry import span
+
+INTERNAL_TABLES = {"column_metadata", "query_log", "index_advice", "rollup_definitions", "ingest_jobs",
+                   "table_versions"}
+
+# One round trip for every column of every user table, enriched with the stored descriptions.
+# Partitions of a partitioned table are storage details and are queried through their parent.
+CATALOG_QUERY = text("""
+    SELECT c.table_name, c.column_name, c.data_type, m.description
+    FROM information_schema.columns c
+    JOIN information_schema.tables t
+      ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+    JOIN pg_class pc
+      ON pc.relname = c.table_name AND pc.relnamespace = 'public'::regnamespace
+    LEFT JOIN column_metadata m
+      ON m.table_name = c.table_name AND m.column_name = c.column_name
+    WHERE c.table_schema = 'public' AND t.table_type = 'BASE TABLE' AND NOT pc.relispartition
+    ORDER BY c.table_name, c.ordinal_position
+""")
+
+# Cheap catalog fingerprint: changes whenever a table is created, dropped, replaced or a column is
+# added, dropped, renamed or retyped - including changes made outside the API - and whenever the
+# column descriptions or types are saved, by any worker.
+FINGERPRINT_QUERY = text("""
+    SELECT md5(coalesce(string_agg(
+               c.oid::text || '.' || a.attnum || '.' || a.attname || '.' || a.atttypid::text,
+               ',' ORDER BY c.oid, a.attnum), ''))
+           || (SELECT coalesce(max(updated_at)::text, '') || '.' || count(*) FROM column_metadata)
+    FROM pg_attribute a
+    JOIN pg_class c ON c.oid = a.attrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p') AND a.attnum > 0 AND NOT a.attisdropped
+""")
+
+
+# Data fingerprint per table: the table_versions counter every load bumps in its own transaction
+# (exact, for all workers), then relation ids, storage files (a TRUNCATE or reload gets new ones) and
+# the cumulative insert/update/delete counters over the table and its partitions, which catch writes
+# made outside the API; those counters can lag a write by up to about ten seconds.
+DATA_FINGERPRINT_QUERY = text("""
+    SELECT c.relname, coalesce(max(v.version), 0) || '.' || md5(string_agg(
+               r.relid::text || '.' || coalesce(pg_relation_filenode(r.relid)::text, '') || '.' ||
+               coalesce(s.n_tup_ins + s.n_tup_upd + s.n_tup_del, 0)::text,
+               ',' ORDER BY r.relid))
+    FROM pg_class c
+    CROSS JOIN LATERAL (SELECT c.oid AS relid
+                        UNION ALL
+                        SELECT inhrelid FROM pg_inherits WHERE inhparent = c.oid) r
+    LEFT JOIN pg_stat_user_tables s ON s.relid = r.relid
+    LEFT JOIN table_versions v ON v.table_name = c.relname
+    WHERE c.relnamespace = 'public'::regnamespace AND c.relkind IN ('r', 'p') AND c.relname = ANY(:tables)
+    GROUP BY c.relname
+""")
+
+
+def data_fingerprints(conn, tables) -> dict:
+    """{table: data fingerprint} for the given tables that exist."""
+    return dict(conn.execute(DATA_FINGERPRINT_QUERY, {"tables": list(tables)}).all())
+
+
+def format_schema(tables: dict) -> str:
+    """
+    Renders {table: [column, ...]} into the schema string used in the SQL generation prompt.
+    """
+    schema_str = ""
+    for table, columns in tables.items():
+        schema_str += f"\nTable: {table}\nColumns:\n"
+        for col in columns:
+            desc_text = f" -- Description: {col['description']}" if col.get("description") else ""
+            schema_str += f"- {col['name']} ({col['type']}){desc_text}\n"
+    return schema_str
+
+
+class SchemaCatalog:
+    """
+    In-process, versioned cache of the database schema.
+    The catalog is loaded in one bulk query and only reloaded when it is invalidated by the API
+    (ingest / metadata) or when the catalog fingerprint shows a change made by another worker or
+    outside the API.
+    """
+
+    def __init__(self, engine, check_interval: float = SCHEMA_CATALOG_CHECK_INTERVAL):
+        self.engine = engine
+        self.check_interval = check_interval
+        self.version = 0
+        self._lock = threading.RLock()
+        self._tables = None
+        self._schema_str = None
+        self._fingerprint = None
+        self._last_check = 0.0
+
+    def invalidate(self):
+        """Drops the cached catalog; the next read reloads it and bumps the version."""
+        with self._lock:
+            self._tables = None
+            self._schema_str = None
+
+    def get_tables(self) -> dict:
+        """Returns {table: [{"name", "type", "description"}, ...]} for every user table."""
+        self._ensure_fresh()
+        return self._tables
+
+    def get_schema_string(self) -> str:
+        self._ensure_fresh()
+        return self._schema_str
+
+    def snapshot(self):
+        """Returns (tables, schema_string, version) from one consistent load."""
+        with self._lock:
+            self._ensure_fresh()
+            return self._tables, self._schema_str, self.version
+
+    def _ensure_fresh(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._tables is not None and now - self._last_check < self.check_interval:
+                return
+
+            with span("db", "schema_catalog_check"), self.engine.connect() as conn:
+                fingerprint = conn.execute(FINGERPRINT_QUERY).scalar()
+                self._last_check = now
+
+                if self._tables is not None and fingerprint == self._fingerprint:
+                    return
+
+                if self._tables is not None:
+                    print("🔄 Schema change made elsewhere detected, reloading catalog...")
+                self._load(conn)
+                self._fingerprint = fingerprint
+
+    def _load(self, conn):
+        tables = {}
+        for table, column, data_type, description in conn.execute(CATALOG_QUERY):
+            if table in INTERNAL_TABLES:
+                continue
+            tables.setdefault(table, []).append(
+                {"name": column, "type": data_type.upper(), "description": description}
+            )
+
+        self._tables = tables
+        self._schema_str = format_schema(tables)
+        self.version += 1
+        print(f"📚 Schema catalog loaded: {len(tables)} tables (version {self.version}).")
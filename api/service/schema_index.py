@@ -0,0 +1,164 @@
+import asyncio
+import fcntl
+import hashlib
+import os
+import pickle
+
+from langchain_community.vectorstores import FAISS
+
+from api.configuration.configuration import (
+    RAG_INDEX_DIR,
+    SCHEMA_PRUNING_ENABLED,
+    SCHEMA_PRUNING_TOP_K_TABLES,
+    SCHEMA_PRUNING_TOP_K_COLUMNS,
+    SCHEMA_PRUNING_TOKEN_BUDGET
+)
+from api.configuration.llm_factory import LLMFactory, estimate_tokens
+from api.service.schema_catalog import format_schema
+from api.service.telemetry import traced
+
+
+class SchemaIndex:
+    """
+    Table/column level embedding index over the schema catalog.
+    Used to put only the tables and columns relevant to a question into the SQL generation prompt.
+    Schema embeddings are also cached on disk next to the RAG index, so workers embed each entry once.
+    """
+
+    def __init__(self, schema_catalog,
+                 top_k_tables: int = SCHEMA_PRUNING_TOP_K_TABLES,
+                 top_k_columns: int = SCHEMA_PRUNING_TOP_K_COLUMNS,
+                 token_budget: int = SCHEMA_PRUNING_TOKEN_BUDGET,
+                 cache_root: str = RAG_INDEX_DIR):
+        self.schema_catalog = schema_catalog
+        self.embeddings = LLMFactory.get_embeddings()
+        self.top_k_tables = top_k_tables
+        self.top_k_columns = top_k_columns
+        self.token_budget = token_budget
+        self.vector_store = None
+        self._version = None
+        self._lock = asyncio.Lock()
+        # Embeddings are cached by document text so a schema change only embeds new tables/columns
+        self._vector_cache = {}
+        model = getattr(self.embeddings, "model", None) or type(self.embeddings).__name__
+        self.cache_root = cache_root
+        self._cache_path = os.path.join(
+            cache_root, f"schema_vectors-{hashlib.sha256(model.encode()).hexdigest()[:16]}.pkl")
+
+    def _file_lock(self, shared: bool = False):
+        """Cross-process lock around the shared schema vector file."""
+        os.makedirs(self.cache_root, exist_ok=True)
+        lock_file = open(f"{self._cache_path}.lock", "w")
+        fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        return lock_file
+
+    def _read_shared_vectors(self) -> dict:
+        try:
+            with open(self._cache_path, "rb") as f:
+                return pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return {}
+
+    def _load_shared_vectors(self, texts: list):
+        """Fills the in-memory cache with vectors another worker already embedded."""
+        with self._file_lock(shared=True):
+            shared = self._read_shared_vectors()
+        self._vector_cache.update({t: shared[t] for t in texts if t in shared})
+
+    def _save_shared_vectors(self, texts: list):
+        # Only entries of the current schema are kept, so dropped tables do not accumulate
+        with self._file_lock():
+            shared = self._read_shared_vectors()
+            vectors = {t: self._vector_cache.get(t, shared.get(t)) for t in texts}
+            tmp_path = f"{self._cache_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump({t: v for t, v in vectors.items() if v is not None}, f)
+            os.replace(tmp_path, self._cache_path)
+
+    @staticmethod
+    def _build_documents(tables: dict):
+        texts, metadatas = [], []
+        for table, columns in tables.items():
+            texts.append(f"Table {table.replace('_', ' ')}: {', '.join(c['name'] for c in columns)}")
+            metadatas.append({"table": table, "column": None})
+            for col in columns:
+                desc = f" - {col['description']}" if col.get("description") else ""
+                texts.append(f"{table.replace('_', ' ')} {col['name'].replace('_', ' ')}{desc}")
+                metadatas.append({"table": table, "column": col["name"]})
+        return texts, metadatas
+
+    async def _ensure_index(self, tables: dict, version: int):
+        async with self._lock:
+            if self._version == version:
+                return
+
+            texts, metadatas = self._build_documents(tables)
+            if texts:
+                missing = [t for t in texts if t not in self._vector_cache]
+                if missing:
+                    await asyncio.to_thread(self._load_shared_vectors, missing)
+                    missing = [t for t in texts if t not in self._vector_cache]
+                if missing:
+                    print(f"🧠 Embedding {len(missing)} schema entries for pruning index...")
+                    for t, vec in zip(missing, await self.embeddings.aembed_documents(missing)):
+                        self._vector_cache[t] = vec
+                    await asyncio.to_thread(self._save_shared_vectors, texts)
+                self.vector_store = FAISS.from_embeddings(
+                    [(t, self._vector_cache[t]) for t in texts], self.embeddings, metadatas=metadatas
+                )
+            else:
+                self.vector_store = None
+            self._version = version
+
+    async def awarm_up(self):
+        """Embeds the current schema ahead of the first question, when pruning would apply to it."""
+        tables, full_schema, version = await asyncio.to_thread(self.schema_catalog.snapshot)
+        if SCHEMA_PRUNING_ENABLED and estimate_tokens(full_schema) > self.token_budget:
+            await self._ensure_index(tables, version)
+
+    @traced("rag", "schema_select")
+    async def aselect_schema(self, question: str) -> str:
+        """
+        Returns the schema string for the top-k tables/columns relevant to the question,
+        within the configured token budget. Falls back to the full schema if pruning is not possible.
+        """
+        # The catalog is usually served from memory, but a reload is a blocking DB round trip
+        tables, full_schema, version = await asyncio.to_thread(self.schema_catalog.snapshot)
+        if not SCHEMA_PRUNING_ENABLED or estimate_tokens(full_schema) <= self.token_budget:
+            return full_schema
+
+        try:
+            await self._ensure_index(tables, version)
+            if not self.vector_store:
+                return full_schema
+            hits = await self.vector_store.asimilarity_search(question, k=self.top_k_columns)
+        except Exception as e:
+            print(f"⚠️ Schema pruning failed, using full schema: {e}")
+            return full_schema
+
+        ranked_tables = []
+        matched_columns = {}
+        for doc in hits:
+            table = doc.metadata["table"]
+            if table not in tables:
+                continue
+            if table not in ranked_tables:
+                ranked_tables.append(table)
+            if doc.metadata["column"]:
+                matched_columns.setdefault(table, set()).add(doc.metadata["column"])
+
+        selected = {}
+        for table in ranked_tables[:self.top_k_tables]:
+            columns = tables[table]
+            matched = [c for c in columns if c["name"] in matched_columns.get(table, set())]
+            # Prefer the whole table, then only the matched columns, within the token budget
+            for candidate in (columns, matched):
+                if candidate and estimate_tokens(format_schema({**selected, table: candidate})) <= self.token_budget:
+                    selected[table] = candidate
+                    break
+
+        if not selected:
+            return full_schema
+
+        print(f"✂️ Schema pruned to {len(selected)} of {len(tables)} tables.")
+        return format_schema(selected)
@@ -0,0 +1,114 @@
+import difflib
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ParseError, TokenError
+
+DEFAULT_SCHEMAS = {"", "public"}
+# Relations of these are resolved by the database (pg_catalog is on every search_path)
+SYSTEM_SCHEMAS = {"pg_catalog", "information_schema"}
+SYSTEM_RELATION_PREFIX = "pg_"
+
+
+def _ident_name(identifier) -> str:
+    """Postgres folds unquoted identifiers to lower case; quoted ones are kept exactly."""
+    if isinstance(identifier, exp.Identifier):
+        return identifier.this if identifier.quoted else identifier.this.lower()
+    return str(identifier)
+
+
+def _suggest(name: str, candidates) -> str:
+    by_lower = {c.lower(): c for c in candidates}
+    match = difflib.get_close_matches(name.lower(), list(by_lower), n=1, cutoff=0.6)
+    return f' Did you mean "{by_lower[match[0]]}"? (use double quotes exactly as shown)' if match else ""
+
+
+class SqlStaticValidator:
+    """
+    Parses generated SQL and resolves every table and column against the cached schema catalog,
+    so typos, wrong quoting and syntax errors are sent back to the resolution agent without a DB round trip.
+    Anything it cannot resolve with certainty (CTEs, subqueries, table functions such as unnest(),
+    system catalogs, other schemas) is left to the database.
+    """
+
+    def __init__(self):
+        self.checked = 0
+        self.rejected = 0
+        self.round_trips_saved = 0
+
+    def stats(self) -> dict:
+        return {"checked": self.checked, "rejected": self.rejected, "db_round_trips_saved": self.round_trips_saved}
+
+    def validate(self, sql: str, tables: dict) -> list:
+        """Returns a list of precise, fixable error messages (empty when the SQL looks valid)."""
+        self.checked += 1
+        errors = self._validate(sql, tables)
+        if errors:
+            self.rejected += 1
+        return errors
+
+    def _validate(self, sql: str, tables: dict) -> list:
+        try:
+            statements = [s for s in sqlglot.parse(sql, read="postgres") if s is not None]
+        except ParseError as e:
+            err = e.errors[0] if e.errors else {}
+            return [f'syntax error at or near "{err.get("highlight", "")}" '
+                    f'(line {err.get("line")}, col {err.get("col")}): {err.get("description", str(e))}']
+        except TokenError as e:
+            return [f"syntax error: {e}"]
+
+        if len(statements) != 1:
+            return ["exactly one SQL statement is expected"]
+        tree = statements[0]
+
+        cte_names = {_ident_name(cte.args["alias"].this) for cte in tree.find_all(exp.CTE)}
+        known_columns = {}    # source name/alias -> set of columns, None when opaque
+        errors = []
+
+        for table in tree.find_all(exp.Table):
+            name = _ident_name(table.this)
+            alias = _ident_name(table.args["alias"].this) if table.args.get("alias") else name
+            schema = _ident_name(table.args["db"]) if table.args.get("db") else ""
+
+            if not isinstance(table.this, exp.Identifier) or name in cte_names or schema not in DEFAULT_SCHEMAS \
+                    or (not schema and name.startswith(SYSTEM_RELATION_PREFIX) and name not in tables):
+                known_columns[alias] = None
+            elif name in tables:
+                known_columns[alias] = {c["name"] for c in tables[name]}
+                known_columns.setdefault(name, known_columns[alias])
+            else:
+                errors.append(f'relation "{name}" does not exist.{_suggest(name, tables)}')
+                known_columns[alias] = None
+
+        # Derived tables and table functions (unnest, LATERAL, generate_series, ...) expose columns we
+        # don't track: columns qualified by their alias are left to the database
+        has_opaque_source = False
+        for source in tree.find_all(exp.From, exp.Join):
+            if isinstance(source.this, exp.Table):
+                continue
+            has_opaque_source = True
+            alias = source.this.args.get("alias")
+            if alias and alias.this:
+                known_columns[_ident_name(alias.this)] = None
+        has_opaque_source = has_opaque_source or any(cols is None for cols in known_columns.values())
+        output_aliases = {_ident_name(a.args["alias"]) for a in tree.find_all(exp.Alias) if a.args.get("alias")}
+        all_columns = set().union(*[cols for cols in known_columns.values() if cols])
+
+        for column in tree.find_all(exp.Column):
+            if isinstance(column.this, exp.Star):
+                continue
+            name = _ident_name(column.this)
+            qualifier = _ident_name(column.args["table"]) if column.args.get("table") else None
+
+            if qualifier:
+                if qualifier not in known_columns:
+                    if not has_opaque_source:
+                        errors.append(f'missing FROM-clause entry for table "{qualifier}"')
+                    continue
+                source_columns = known_columns[qualifier]
+                if source_columns is not None and name not in source_columns:
+                    errors.append(f'column "{name}" does not exist in "{qualifier}".{_suggest(name, source_columns)}')
+            elif name not in all_columns and name not in output_aliases and not has_opaque_source:
+                errors.append(f'column "{name}" does not exist.{_suggest(name, all_columns)}')
+
+        return list(dict.fromkeys(errors))
@@ -0,0 +1,205 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+from api.configuration.configuration import TRACE_HISTORY_SIZE, PROMETHEUS_MULTIPROC_DIR
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 5000, 10000, 100000, 1000000)
+
+REQUEST_SECONDS = Histogram("text2sql_request_seconds", "End-to-end request latency",
+                            ["endpoint", "outcome"], buckets=LATENCY_BUCKETS)
+SPAN_SECONDS = Histogram("text2sql_span_seconds", "Latency of graph nodes, DB, RAG and LLM calls",
+                         ["kind", "name"], buckets=LATENCY_BUCKETS)
+LLM_TOKENS = Histogram("text2sql_llm_tokens", "Tokens per LLM call", ["lane", "kind"], buckets=TOKEN_BUCKETS)
+ROWS_RETURNED = Histogram("text2sql_rows_returned", "Rows returned per executed query", buckets=ROW_BUCKETS)
+REQUEST_RETRIES = Histogram("text2sql_request_retries", "SQL generation attempts per request",
+                            buckets=(0, 1, 2, 3, 4, 5))
+LLM_RETRIES = Counter("text2sql_llm_retries_total", "Retried LLM calls", ["lane", "reason"])
+CACHE_LOOKUPS = Counter("text2sql_cache_lookups_total", "Cache and fast-path lookups", ["cache", "result"])
+# One series per live worker (pid label) when several workers share PROMETHEUS_MULTIPROC_DIR
+STARTUP_SECONDS = Gauge("text2sql_startup_seconds", "Cold-start time per phase of this worker", ["phase"],
+                        multiprocess_mode="liveall")
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class RequestTrace:
+    """Everything recorded for one request: spans, token usage, rows, retries and cache hits."""
+
+    def __init__(self, request_id: str, endpoint: str):
+        self.request_id = request_id
+        self.endpoint = endpoint
+        self.started = time.time()
+        self.seconds = None
+        self.outcome = None
+        self.spans = []
+        self.tokens = {"prompt": 0, "completion": 0}
+        self.llm_calls = 0
+        self.rows = None
+        self.retries = 0
+        self.cache = {}
+
+    def to_dict(self) -> dict:
+        return {
+            "request_id": self.request_id,
+            "endpoint": self.endpoint,
+            "started": self.started,
+            "seconds": self.seconds,
+            "outcome": self.outcome,
+            "retries": self.retries,
+            "rows": self.rows,
+            "llm_calls": self.llm_calls,
+            "tokens": dict(self.tokens),
+            "cache": dict(self.cache),
+            "spans": list(self.spans)
+        }
+
+
+class _TraceRegistry:
+    """Keeps the most recent traces for GET /traces/{request_id}."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, trace: RequestTrace):
+        with self._lock:
+            self._traces[trace.request_id] = trace
+            while len(self._traces) > self.max_entries:
+                self._traces.popitem(last=False)
+
+    def get(self, request_id: str):
+        with self._lock:
+            return self._traces.get(request_id)
+
+
+traces = _TraceRegistry(TRACE_HISTORY_SIZE)
+
+
+def start_request(endpoint: str) -> RequestTrace:
+    """Creates a trace with a new request id and makes it current for this task and its children."""
+    trace = RequestTrace(uuid.uuid4().hex, endpoint)
+    traces.add(trace)
+    _current_trace.set(trace)
+    return trace
+
+
+def finish_request(trace: RequestTrace, outcome: str, state: dict = None):
+    trace.seconds = round(time.time() - trace.started, 4)
+    trace.outcome = outcome
+    if state:
+        trace.retries = max(0, (state.get("retry_count") or 0) - 1)
+        REQUEST_RETRIES.observe(trace.retries)
+    REQUEST_SECONDS.labels(trace.endpoint, outcome).observe(trace.seconds)
+    print(f"📈 [{trace.request_id[:8]}] {trace.endpoint} {outcome} in {trace.seconds}s, "
+          f"{trace.llm_calls} LLM calls ({trace.tokens['prompt']}+{trace.tokens['completion']} tokens), "
+          f"rows={trace.rows}, retries={trace.retries}, cache={trace.cache}")
+
+
+@contextlib.contextmanager
+def use_request(request_id: str):
+    """Makes the trace of request_id current (e.g. inside a graph node run outside the request task)."""
+    trace = traces.get(request_id) if request_id else None
+    if trace is None or _current_trace.get() is trace:
+        yield
+        return
+    token = _current_trace.set(trace)
+    try:
+        yield
+    finally:
+        _current_trace.reset(token)
+
+
+@contextlib.contextmanager
+def span(kind: str, name: str, **attributes):
+    start = time.perf_counter()
+    try:
+        yield attributes
+    finally:
+        seconds = time.perf_counter() - start
+        SPAN_SECONDS.labels(kind, name).observe(seconds)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append({"kind": kind, "name": name, "seconds": round(seconds, 4), **attributes})
+
+
+def traced(kind: str, name: str = None):
+    """Decorator recording a span around a sync or async function."""
+
+    def decorator(fn):
+        span_name = name or fn.__name__
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(kind, span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(kind, span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def record_llm_tokens(lane: str, prompt_tokens: int, completion_tokens: int):
+    LLM_TOKENS.labels(lane, "prompt").observe(prompt_tokens)
+    LLM_TOKENS.labels(lane, "completion").observe(completion_tokens)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.llm_calls += 1
+        trace.tokens["prompt"] += prompt_tokens
+        trace.tokens["completion"] += completion_tokens
+
+
+def record_llm_retry(lane: str, reason: str):
+    LLM_RETRIES.labels(lane, reason).inc()
+
+
+def record_rows(rows: int):
+    ROWS_RETURNED.observe(rows)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.rows = rows
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.cache[cache] = "hit" if hit else "miss"
+
+
+def record_startup(phase: str, seconds: float):
+    STARTUP_SECONDS.labels(phase).set(seconds)
+
+
+def metrics_exposition() -> bytes:
+    """
+    Prometheus text for /metrics. With PROMETHEUS_MULTIPROC_DIR set, the counters and histograms
+    of every worker are summed, whichever worker answers the scrape.
+    """
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+def mark_worker_stopped():
+    """Drops this worker's live gauges from the multiprocess metrics when it shuts down."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
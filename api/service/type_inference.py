@@ -0,0 +1,115 @@
+import re
+
+import pandas as pd
+
+from api.configuration.configuration import INGEST_TYPE_MATCH_RATIO
+
+NULL_TOKENS = {"", "na", "n/a", "nan", "null", "none", "-", "--"}
+TRUE_TOKENS = {"true", "t", "yes", "y"}
+FALSE_TOKENS = {"false", "f", "no", "n"}
+
+CURRENCY_PATTERN = re.compile(r"^(?:rs\.?|inr|usd|eur|gbp|[₹$€£¥])\s*|\s*(?:rs\.?|inr|usd|eur|gbp|[₹$€£¥])$", re.IGNORECASE)
+INTEGER_PATTERN = re.compile(r"^-?\d{1,18}$")
+DECIMAL_PATTERN = re.compile(r"^-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?$")
+LEADING_ZERO_PATTERN = re.compile(r"^0\d")
+
+# Explicit formats only: free-form parsing turns labels like 'Jun-21' into dates
+DATE_FORMATS = [
+    "%Y-%m-%d", "%Y/%m/%d", "%m-%d-%y", "%m/%d/%y", "%m-%d-%Y", "%m/%d/%Y",
+    "%d-%m-%Y", "%d/%m/%Y", "%d-%m-%y", "%d/%m/%y", "%d-%b-%Y", "%d %b %Y",
+]
+DATETIME_FORMATS = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%m/%d/%Y %H:%M", "%d/%m/%Y %H:%M", "%m-%d-%y %H:%M"]
+
+
+def _null_mask(series: pd.Series) -> pd.Series:
+    return series.isna() | series.astype(str).str.strip().str.lower().isin(NULL_TOKENS)
+
+
+def _clean_number(series: pd.Series) -> pd.Series:
+    """Strips currency markers, thousand separators and accounting-style negatives."""
+    cleaned = series.astype(str).str.strip()
+    negative = cleaned.str.startswith("(") & cleaned.str.endswith(")")
+    cleaned = cleaned.str.strip("()").str.replace(CURRENCY_PATTERN, "", regex=True)
+    cleaned = cleaned.str.replace(",", "", regex=False).str.replace(" ", "", regex=False)
+    return cleaned.where(~negative, "-" + cleaned)
+
+
+class ColumnType:
+    """
+    Inferred Postgres type of a CSV column plus the cleaning needed to load it.
+    convert() returns the values to COPY (as text, NULL for unparseable values) and a mask of failed values.
+    """
+
+    def __init__(self, pg_type: str, source_format: str = "text", date_format: str = None):
+        self.pg_type = pg_type
+        self.source_format = source_format
+        self.date_format = date_format
+
+    def convert(self, series: pd.Series):
+        nulls = _null_mask(series)
+        if self.pg_type == "TEXT":
+            return series.where(~series.isna(), None), pd.Series(False, index=series.index)
+
+        if self.pg_type in ("BIGINT", "NUMERIC"):
+            cleaned = _clean_number(series)
+            pattern = INTEGER_PATTERN if self.pg_type == "BIGINT" else DECIMAL_PATTERN
+            valid = cleaned.str.match(pattern)
+        elif self.pg_type == "BOOLEAN":
+            lowered = series.astype(str).str.strip().str.lower()
+            cleaned = lowered.map(lambda v: "true" if v in TRUE_TOKENS else "false" if v in FALSE_TOKENS else None)
+            valid = cleaned.notna()
+        else:
+            parsed = pd.to_datetime(series.astype(str).str.strip(), format=self.date_format, errors="coerce")
+            valid = parsed.notna()
+            fmt = "%Y-%m-%d" if self.pg_type == "DATE" else "%Y-%m-%d %H:%M:%S"
+            cleaned = parsed.dt.strftime(fmt)
+
+        failed = ~nulls & ~valid
+        return cleaned.where(valid & ~nulls, None), failed
+
+    def widen(self):
+        """Next type that accepts more values, used when a later chunk does not fit the sample."""
+        if self.pg_type == "BIGINT":
+            return ColumnType("NUMERIC", self.source_format)
+        return ColumnType("TEXT", self.source_format)
+
+
+def _matches(values: pd.Series, predicate) -> bool:
+    return values.map(predicate).mean() >= INGEST_TYPE_MATCH_RATIO
+
+
+def infer_column_type(sample: pd.Series) -> ColumnType:
+    """
+    Profiles a sample of raw (string) CSV values and detects numeric, currency-formatted,
+    date/timestamp and boolean columns. Anything ambiguous stays TEXT.
+    """
+    values = sample[~_null_mask(sample)].astype(str).str.strip()
+    if values.empty:
+        return ColumnType("TEXT")
+
+    lowered = values.str.lower()
+    if lowered.isin(TRUE_TOKENS | FALSE_TOKENS).mean() >= INGEST_TYPE_MATCH_RATIO:
+        return ColumnType("BOOLEAN", "boolean text")
+
+    cleaned = _clean_number(values)
+    # Identifier-like codes (postal codes, SKUs with leading zeros) must keep their text form
+    if not cleaned.str.match(LEADING_ZERO_PATTERN).any():
+        if values.str.contains(CURRENCY_PATTERN).any():
+            source_format = "currency text"
+        elif values.str.contains(",", regex=False).any():
+            source_format = "thousands-separated text"
+        else:
+            source_format = "numeric text"
+
+        if _matches(cleaned, lambda v: bool(INTEGER_PATTERN.match(v))):
+            return ColumnType("BIGINT", source_format)
+        if _matches(cleaned, lambda v: bool(DECIMAL_PATTERN.match(v))):
+            return ColumnType("NUMERIC", source_format)
+
+    for pg_type, formats in (("TIMESTAMP", DATETIME_FORMATS), ("DATE", DATE_FORMATS)):
+        for fmt in formats:
+            parsed = pd.to_datetime(values, format=fmt, errors="coerce")
+            if parsed.notna().mean() >= INGEST_TYPE_MATCH_RATIO:
+                return ColumnType(pg_type, f"date text ({fmt})", fmt)
+
+    return ColumnType("TEXT")
@@ -1,135 +1,298 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import pickle
+
+import faiss
 from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
 
+from api.configuration.configuration import RAG_INDEX_DIR, FAST_PATH_SIMILARITY_THRESHOLD
 from api.configuration.llm_factory import LLMFactory
+from api.service.fast_path import adapt_stored_sql
+from api.service.telemetry import traced
+
+# Unit-length vectors: the squared L2 distance d maps to cosine similarity as 1 - d / 2,
+# which makes scores comparable to a fixed threshold
+INDEX_OPTIONS = {"normalize_L2": True}
+
+SEED_EXAMPLES = [
+    {
+        "question": "Show me all cancelled orders with their order ID, date, amount and ship city.",
+        "sql": """SELECT "order_id", "date", "amount", "ship-city" FROM public."Amazon Sale Report" WHERE LOWER("status") = 'cancelled';"""
+    },
+    {
+        "question": "Give me quantity sold for each product category on Amazon.in sales channel.",
+        "sql": """SELECT  "category", SUM("qty") AS total_qty FROM public."Amazon Sale Report" WHERE LOWER("sales_channel_") = 'amazon.in' GROUP BY "category" ORDER BY total_qty DESC;"""
+    },
+    {
+        "question": "Show me the price per unit for each service (Inbound, Outbound, Storage Fee, Customer Return) from both Shiprocket and Increff.",
+        "sql": """SELECT 
+                    "shiprocket",
+                    "unnamed:_1" AS shiprocket_price,
+                    "increff" AS increff_price
+                FROM public.cloud_warehouse_compersion_chart
+                WHERE "shiprocket" IN (
+                    'Inbound (Fresh Stock and RTO)',
+                    'Outbound',
+                    'Storage Fee/Cft',
+                    'Customer Return with Detailed QC'
+                );"""
+    },
+    {
+        "question": "Fetch only the operations (like Unloading, Validation, QC, GRN) with their descriptions from the Increff/price column.",
+        "sql": """SELECT 
+                        "shiprocket" AS operation,
+                        "increff" AS description
+                    FROM public.cloud_warehouse_compersion_chart
+                    WHERE "shiprocket" IN ('Inward', 'Validation', 'QC', 'GRN');"""
+    },
+    {
+        "question": "Show all purchases made by the customer REVATHY LOGANATHAN, including style, size, pcs and gross amount.",
+        "sql": """SELECT 
+                    "date",
+                    "customer",
+                    "style",
+                    "size",
+                    "pcs",
+                    "gross_amt"
+                FROM public.international_sale_report
+                WHERE "customer" = 'REVATHY LOGANATHAN';"""
+    },
+    {
+        "question": "Get the total quantity (pcs) and total gross amount for the month Jun-21.",
+        "sql": """SELECT 
+                    "months",
+                    SUM("pcs") AS total_pcs,
+                    SUM("gross_amt") AS total_gross_amount
+                FROM public.international_sale_report
+                WHERE "months" = 'Jun-21'
+                GROUP BY "months";"""
+    },
+    {
+        "question": "List all SKUs and their selling rate where the rate is greater than 620.",
+        "sql": """SELECT 
+                    "sku",
+                    "rate",
+                    "size",
+                    "customer"
+                FROM public.international_sale_report
+                WHERE "rate" > 620;"""
+    },
+    {
+        "question": "Get all SKUs where the category is Kurta Set.",
+        "sql": """SELECT 
+                    "sku",
+                    "style_id",
+                    "catalog",
+                    "category",
+                    "tp",
+                    "final_mrp_old"
+                FROM public.may_2022
+                WHERE "category" = 'Kurta Set';"""
+    },
+    {
+        "question": "Identify best-selling sizes in KURTA category (based on inventory availability).",
+        "sql": """SELECT size, SUM(stock) AS total_stock
+                    FROM sale_report
+                    WHERE category = 'KURTA'
+                    GROUP BY size
+                    ORDER BY total_stock DESC;"""
+    },
+    {
+        "question": "Identify slow-moving SKUs (stock high, but no sales / low movement last 30 days)",
+        "sql": """SELECT "order_id", "date", "amount", "status"
+                    FROM public."Amazon Sale Report"
+                    WHERE "amount" > 5000 AND LOWER("status") = 'completed';"""
+    },
+    {
+        "question": "provide me daily expense summary from expense_iigf table.",
+        "sql": """SELECT
+                      NULLIF(trim("expance"), '') AS expense_particular,
+                      SUM("unnamed:_3") AS total_expense
+                    FROM public.expense_iigf
+                    GROUP BY NULLIF(trim("expance"), '')
+                    ORDER BY total_expense DESC;"""
+    }
+]
+
+
+def example_id(question: str) -> str:
+    return hashlib.sha1(question.strip().lower().encode()).hexdigest()[:16]
 
 
 class RAGManager:
-    def __init__(self):
+    """
+    Few-shot example store backed by a FAISS index persisted on disk.
+    The index directory is keyed by a content hash of the seed examples and the embedding model,
+    so startup only loads (memory-mapped) files and every worker shares the same index.
+    Examples can be added or removed one at a time without a rebuild.
+    """
+
+    def __init__(self, index_root: str = RAG_INDEX_DIR):
         self.embeddings = LLMFactory.get_embeddings()
         self.vector_store = None
+        self.index_dir = os.path.join(index_root, self._index_key())
+        self._loaded_mtime = None
+        self.fast_path_hits = 0
+        self.fast_path_misses = 0
+
+    def _index_key(self) -> str:
+        model = getattr(self.embeddings, "model", None) or type(self.embeddings).__name__
+        payload = json.dumps({"examples": SEED_EXAMPLES, "model": model, "metric": "cosine"}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.index_dir, "index.faiss")
+
+    @property
+    def _docstore_path(self) -> str:
+        return os.path.join(self.index_dir, "index.pkl")
+
+    def _lock(self, shared: bool = False):
+        """Cross-process lock so workers never read or clobber a half-written index."""
+        lock_file = open(os.path.join(self.index_dir, ".lock"), "w")
+        fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        return lock_file
+
+    def _load(self):
+        index = faiss.read_index(self._index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        with open(self._docstore_path, "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        self.vector_store = FAISS(self.embeddings, index, docstore, index_to_docstore_id, **INDEX_OPTIONS)
+        self._loaded_mtime = os.stat(self._index_path).st_mtime_ns
+
+    def _save(self):
+        # Docstore first, index last: readers reload when the index file changes
+        tmp_docstore = f"{self._docstore_path}.tmp"
+        with open(tmp_docstore, "wb") as f:
+            pickle.dump((self.vector_store.docstore, self.vector_store.index_to_docstore_id), f)
+        os.replace(tmp_docstore, self._docstore_path)
+
+        tmp_index = f"{self._index_path}.tmp"
+        faiss.write_index(self.vector_store.index, tmp_index)
+        os.replace(tmp_index, self._index_path)
+        self._loaded_mtime = os.stat(self._index_path).st_mtime_ns
+
+    def _maybe_reload(self, locked: bool = False):
+        """Picks up changes another worker saved to the shared index (one stat call when unchanged)."""
+        try:
+            if os.stat(self._index_path).st_mtime_ns == self._loaded_mtime:
+                return
+        except FileNotFoundError:
+            return
+
+        lock = None if locked else self._lock(shared=True)
+        try:
+            self._load()
+        finally:
+            if lock:
+                lock.close()
 
     def ingest_examples(self):
-        print("🧠 Ingesting RAG examples into FAISS...")
-
-        examples = [
-            {
-                "question": "Show me all cancelled orders with their order ID, date, amount and ship city.",
-                "sql": """SELECT "order_id", "date", "amount", "ship-city" FROM public."Amazon Sale Report" WHERE LOWER("status") = 'cancelled';"""
-            },
-            {
-                "question": "Give me quantity sold for each product category on Amazon.in sales channel.",
-                "sql": """SELECT  "category", SUM("qty") AS total_qty FROM public."Amazon Sale Report" WHERE LOWER("sales_channel_") = 'amazon.in' GROUP BY "category" ORDER BY total_qty DESC;"""
-            },
-            {
-                "question": "Show me the price per unit for each service (Inbound, Outbound, Storage Fee, Customer Return) from both Shiprocket and Increff.",
-                "sql": """SELECT 
-                            "shiprocket",
-                            "unnamed:_1" AS shiprocket_price,
-                            "increff" AS increff_price
-                        FROM public.cloud_warehouse_compersion_chart
-                        WHERE "shiprocket" IN (
-                            'Inbound (Fresh Stock and RTO)',
-                            'Outbound',
-                            'Storage Fee/Cft',
-                            'Customer Return with Detailed QC'
-                        );"""
-            },
-            {
-                "question": "Fetch only the operations (like Unloading, Validation, QC, GRN) with their descriptions from the Increff/price column.",
-                "sql": """SELECT 
-                                "shiprocket" AS operation,
-                                "increff" AS description
-                            FROM public.cloud_warehouse_compersion_chart
-                            WHERE "shiprocket" IN ('Inward', 'Validation', 'QC', 'GRN');"""
-            },
-            {
-                "question": "Show all purchases made by the customer REVATHY LOGANATHAN, including style, size, pcs and gross amount.",
-                "sql": """SELECT 
-                            "date",
-                            "customer",
-                            "style",
-                            "size",
-                            "pcs",
-                            "gross_amt"
-                        FROM public.international_sale_report
-                        WHERE "customer" = 'REVATHY LOGANATHAN';"""
-            },
-            {
-                "question": "Get the total quantity (pcs) and total gross amount for the month Jun-21.",
-                "sql": """SELECT 
-                            "months",
-                            SUM("pcs"::numeric) AS total_pcs,
-                            SUM("gross_amt"::numeric) AS total_gross_amount
-                        FROM public.international_sale_report
-                        WHERE "months" = 'Jun-21'
-                        GROUP BY "months";"""
-            },
-            {
-                "question": "List all SKUs and their selling rate where the rate is greater than 620.",
-                "sql": """SELECT 
-                            "sku",
-                            "rate",
-                            "size",
-                            "customer"
-                        FROM public.international_sale_report
-                        WHERE "rate"::numeric > 620;"""
-            },
-            {
-                "question": "Get all SKUs where the category is Kurta Set.",
-                "sql": """SELECT 
-                            "sku",
-                            "style_id",
-                            "catalog",
-                            "category",
-                            "tp",
-                            "final_mrp_old"
-                        FROM public.may_2022
-                        WHERE "category" = 'Kurta Set';"""
-            },
-            {
-                "question": "Identify best-selling sizes in KURTA category (based on inventory availability).",
-                "sql": """SELECT size, SUM(stock) AS total_stock
-                            FROM sale_report
-                            WHERE category = 'KURTA'
-                            GROUP BY size
-                            ORDER BY total_stock DESC;"""
-            },
-            {
-                "question": "Identify slow-moving SKUs (stock high, but no sales / low movement last 30 days)",
-                "sql": """SELECT "order_id", "date", "amount", "status"
-                            FROM public."Amazon Sale Report"
-                            WHERE "amount" > 5000 AND LOWER("status") = 'completed';"""
-            },
-            {
-                "question": "provide me daily expense summary from expense_iigf table.",
-                "sql": """SELECT
-                              NULLIF(trim("expance"), '') AS expense_particular,
-                              SUM(NULLIF(regexp_replace("unnamed:_3", '[^0-9.-]', '', 'g'), '')::numeric) AS total_expense
-                            FROM public.expense_iigf
-                            GROUP BY NULLIF(trim("expance"), '')
-                            ORDER BY total_expense DESC;"""
-            }
+        os.makedirs(self.index_dir, exist_ok=True)
+        lock = self._lock()
+        try:
+            if os.path.exists(self._index_path):
+                self._load()
+                print(f"🧠 RAG index loaded from {self.index_dir}.")
+                return
 
-        ]
+            print("🧠 Ingesting RAG examples into FAISS...")
+            docs = [
+                Document(page_content=ex["question"], metadata={"sql_query": ex["sql"]})
+                for ex in SEED_EXAMPLES
+            ]
+            ids = [example_id(ex["question"]) for ex in SEED_EXAMPLES]
+
+            self.vector_store = FAISS.from_documents(docs, self.embeddings, ids=ids, **INDEX_OPTIONS)
+            self._save()
+            print("RAG Index built.")
+        finally:
+            lock.close()
 
-        docs = []
-        for ex in examples:
-            page_content = ex["question"]
-            metadata = {"sql_query": ex["sql"]}
-            docs.append(Document(page_content=page_content, metadata=metadata))
+    def add_example(self, question: str, sql: str) -> str:
+        """Embeds and adds one example (replacing an existing one with the same question)."""
+        ex_id = example_id(question)
+        lock = self._lock()
+        try:
+            self._maybe_reload(locked=True)
+            if ex_id in self.vector_store.index_to_docstore_id.values():
+                self.vector_store.delete([ex_id])
+            self.vector_store.add_documents(
+                [Document(page_content=question, metadata={"sql_query": sql})], ids=[ex_id]
+            )
+            self._save()
+        finally:
+            lock.close()
+        return ex_id
 
-        self.vector_store = FAISS.from_documents(docs, self.embeddings)
-        print("RAG Index built.")
+    def remove_example(self, ex_id: str) -> bool:
+        lock = self._lock()
+        try:
+            self._maybe_reload(locked=True)
+            if ex_id not in self.vector_store.index_to_docstore_id.values():
+                return False
+            self.vector_store.delete([ex_id])
+            self._save()
+        finally:
+            lock.close()
+        return True
 
-    def retrieve_similar_examples(self, user_query: str, k=2):
+    def list_examples(self) -> list:
+        self._maybe_reload()
+        store = self.vector_store
+        return [
+            {"id": doc_id, "question": store.docstore.search(doc_id).page_content,
+             "sql": store.docstore.search(doc_id).metadata["sql_query"]}
+            for doc_id in store.index_to_docstore_id.values()
+        ]
+
+    @traced("rag")
+    async def aretrieve_examples(self, user_query: str, k=2) -> list:
+        """Returns the k nearest stored examples as (document, cosine similarity) pairs."""
         if not self.vector_store:
             raise Exception("Vector store not initialized. Run ingest_examples() first.")
+        # stat + file lock + possible index load: kept off the event loop
+        await asyncio.to_thread(self._maybe_reload)
 
-        results = self.vector_store.similarity_search(user_query, k=k)
+        results = await self.vector_store.asimilarity_search_with_score(user_query, k=k)
+        return [(doc, 1 - float(distance) / 2) for doc, distance in results]
 
+    @staticmethod
+    def format_examples(scored_examples: list) -> str:
         context_str = ""
-        for doc in results:
+        for doc, _ in scored_examples:
             context_str += f"User: {doc.page_content}\nSQL: {doc.metadata['sql_query']}\n\n"
 
-        return context_str
\ No newline at end of file
+        return context_str
+
+    def match_fast_path(self, user_query: str, scored_examples: list,
+                        threshold: float = FAST_PATH_SIMILARITY_THRESHOLD):
+        """
+        Returns SQL that can be executed without an LLM call when the nearest stored question is
+        above the similarity threshold and differs from the user's question only in literal values.
+        """
+        sql = None
+        if scored_examples:
+            doc, score = scored_examples[0]
+            if score >= threshold:
+                sql = adapt_stored_sql(doc.page_content, doc.metadata["sql_query"], user_query)
+
+        if sql:
+            self.fast_path_hits += 1
+            print(f"⚡ SQL fast path: reusing stored SQL for '{doc.page_content}' (similarity {score:.3f}).")
+        else:
+            self.fast_path_misses += 1
+        return sql
+
+    def fast_path_stats(self) -> dict:
+        lookups = self.fast_path_hits + self.fast_path_misses
+        return {
+            "hits": self.fast_path_hits,
+            "misses": self.fast_path_misses,
+            "hit_rate": round(self.fast_path_hits / lookups, 4) if lookups else None
+        }
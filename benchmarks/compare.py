@@ -0,0 +1,50 @@
+import argparse
+import json
+
+METRICS = [
+    ("cold start (s)", ("startup", "ready_after_seconds"), False),
+    ("ingest rows/s", ("ingest", "rows_per_sec"), True),
+    ("chat p50 (s)", ("chat", "latency_seconds", "p50"), False),
+    ("chat p95 (s)", ("chat", "latency_seconds", "p95"), False),
+    ("chat p99 (s)", ("chat", "latency_seconds", "p99"), False),
+    ("chat throughput (req/s)", ("chat", "throughput_rps"), True),
+    ("chat errors", ("chat", "errors"), False),
+    ("peak RSS (MB)", ("peak_rss_mb",), False)
+]
+
+
+def _get(results: dict, path: tuple):
+    for key in path:
+        results = (results or {}).get(key)
+    return results
+
+
+def compare(baseline: dict, candidate: dict) -> list:
+    """Returns (metric, baseline, candidate, change %, better?) rows."""
+    rows = []
+    for name, path, higher_is_better in METRICS:
+        before, after = _get(baseline, path), _get(candidate, path)
+        change = (after - before) / before * 100 if before and after is not None else None
+        better = None if change is None else (change > 0) == higher_is_better
+        rows.append((name, before, after, change, better))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"baseline:  {baseline.get('git_commit')} {baseline.get('timestamp')}")
+    print(f"candidate: {candidate.get('git_commit')} {candidate.get('timestamp')}\n")
+    print(f"{'metric':<26}{'baseline':>12}{'candidate':>12}{'change':>10}")
+    for name, before, after, change, better in compare(baseline, candidate):
+        marker = "" if better is None or abs(change) < 1 else (" ✅" if better else " ❌")
+        change_text = f"{change:+.1f}%" if change is not None else "n/a"
+        print(f"{name:<26}{str(before):>12}{str(after):>12}{change_text:>10}{marker}")
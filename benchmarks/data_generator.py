@@ -0,0 +1,67 @@
+import argparse
+import datetime
+
+import numpy as np
+import pandas as pd
+
+BENCH_TABLE = "bench_amazon_sales"
+
+STATUSES = ["Shipped", "Shipped - Delivered to Buyer", "Cancelled", "Pending", "Shipped - Returned to Seller"]
+FULFILMENT = ["Amazon", "Merchant"]
+CHANNELS = ["Amazon.in", "Non-Amazon"]
+CATEGORIES = ["Set", "kurta", "Western Dress", "Top", "Ethnic Dress", "Blouse", "Bottom", "Saree", "Dupatta"]
+SIZES = ["XS", "S", "M", "L", "XL", "XXL", "3XL", "Free"]
+CITIES = {
+    "MAHARASHTRA": ["MUMBAI", "PUNE", "NAGPUR"],
+    "KARNATAKA": ["BENGALURU", "MYSORE"],
+    "TELANGANA": ["HYDERABAD"],
+    "TAMIL NADU": ["CHENNAI", "COIMBATORE"],
+    "DELHI": ["NEW DELHI"],
+    "UTTAR PRADESH": ["LUCKNOW", "NOIDA"]
+}
+
+
+def generate_sales(rows: int, seed: int = 42) -> pd.DataFrame:
+    """Seeded retail orders shaped like the Amazon sale report (same columns and value formats)."""
+    rng = np.random.default_rng(seed)
+    states = rng.choice(list(CITIES), rows)
+    cities = np.array([CITIES[s][i % len(CITIES[s])] for s, i in zip(states, rng.integers(0, 3, rows))])
+    dates = pd.Timestamp(datetime.date(2022, 3, 31)) + pd.to_timedelta(rng.integers(0, 92, rows), unit="D")
+    qty = rng.choice([0, 1, 1, 1, 1, 2, 3], rows)
+    amount = np.round(rng.gamma(4.0, 160.0, rows), 2) * (qty > 0)
+
+    return pd.DataFrame({
+        "Order ID": [f"{171 + i % 700:03d}-{1000000 + i:07d}-{(i * 7919) % 10000000:07d}" for i in range(rows)],
+        "Date": dates.strftime("%m-%d-%y"),
+        "Status": rng.choice(STATUSES, rows, p=[0.6, 0.25, 0.1, 0.03, 0.02]),
+        "Fulfilment": rng.choice(FULFILMENT, rows, p=[0.7, 0.3]),
+        "Sales Channel": rng.choice(CHANNELS, rows, p=[0.98, 0.02]),
+        "Category": rng.choice(CATEGORIES, rows),
+        "Size": rng.choice(SIZES, rows),
+        "Qty": qty,
+        "Amount": amount,
+        "ship-city": cities,
+        "ship-state": states,
+        "B2B": rng.choice(["False", "True"], rows, p=[0.99, 0.01])
+    })
+
+
+def write_sales_csv(path: str, rows: int, seed: int = 42, chunk_rows: int = 200_000) -> int:
+    """Writes the CSV in chunks so large benchmark files don't need to fit in memory. Returns its size."""
+    written = 0
+    with open(path, "w", newline="") as f:
+        while written < rows:
+            n = min(chunk_rows, rows - written)
+            generate_sales(n, seed + written).to_csv(f, index=False, header=written == 0)
+            written += n
+        return f.tell()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a retail sales CSV for benchmarking.")
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    size = write_sales_csv(args.path, args.rows, args.seed)
+    print(f"Wrote {args.rows} rows ({size} bytes) to {args.path}")
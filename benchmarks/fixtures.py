@@ -0,0 +1,24 @@
+from benchmarks.data_generator import BENCH_TABLE
+
+# Benchmark workload: question -> the SQL the stub model "generates" for it.
+# Covers scalar, top-N, mid-size and large (map-reduce / profile) result shapes.
+SQL_FIXTURES = {
+    "What is the total sales amount?":
+        f'SELECT SUM("amount") AS total_amount FROM public."{BENCH_TABLE}"',
+    "How many orders were cancelled?":
+        f'SELECT COUNT(*) AS cancelled_orders FROM public."{BENCH_TABLE}" WHERE LOWER("status") = \'cancelled\'',
+    "Which 5 categories have the highest total quantity sold?":
+        f'SELECT "category", SUM("qty") AS total_qty FROM public."{BENCH_TABLE}" '
+        f'GROUP BY "category" ORDER BY total_qty DESC LIMIT 5',
+    "Show total sales amount per ship state.":
+        f'SELECT "ship-state", SUM("amount") AS total_amount FROM public."{BENCH_TABLE}" '
+        f'GROUP BY "ship-state" ORDER BY total_amount DESC',
+    "Show the daily order count and sales amount.":
+        f'SELECT "date", COUNT(*) AS orders, SUM("amount") AS total_amount FROM public."{BENCH_TABLE}" '
+        f'GROUP BY "date" ORDER BY "date"',
+    "List all cancelled orders with their order ID, date, amount and ship city.":
+        f'SELECT "order_id", "date", "amount", "ship-city" FROM public."{BENCH_TABLE}" '
+        f'WHERE LOWER("status") = \'cancelled\'',
+}
+
+QUESTIONS = list(SQL_FIXTURES)
@@ -0,0 +1,240 @@
+"""
+Reproducible offline benchmark for the ingest and chat pipeline.
+
+Azure and Ollama are replaced by deterministic stubs (fixture SQL, fixed latency, hash-seeded
+embeddings); PostgreSQL is real. The FastAPI app runs in-process behind an ASGI transport, so
+peak RSS covers the app and the load generator together.
+
+    DB_NAME=blend_bench python -m benchmarks.run_benchmark --rows 100000 --clients 8 --requests 200
+    python -m benchmarks.compare benchmarks/results/a.json benchmarks/results/b.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("AZURE_RESOURCE_NAME", "benchmark")
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "benchmark")
+
+import httpx
+
+from benchmarks.data_generator import BENCH_TABLE, write_sales_csv
+from benchmarks.fixtures import QUESTIONS, SQL_FIXTURES
+from benchmarks.stubs import StubChatModel, StubEmbeddings
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values: list, q: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q
+    low, high = int(pos), min(int(pos) + 1, len(ordered) - 1)
+    return round(ordered[low] + (ordered[high] - ordered[low]) * (pos - low), 4)
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_app(args):
+    """Installs the stubs, then imports the app (services connect on first use or during warm-up)."""
+    from api.configuration.llm_factory import LLMFactory
+    LLMFactory._llm_instance = StubChatModel(sql_fixtures=SQL_FIXTURES, latency=args.llm_latency,
+                                             seconds_per_token=args.llm_seconds_per_token)
+    LLMFactory._embed_instance = StubEmbeddings()
+
+    import api.main as main
+    from api.langgrph import agents
+
+    if not args.warm:
+        # Measure the full pipeline on every request: no answer/result cache, no SQL fast path
+        main.FAST_PATH_ENABLED = False
+        main.FAST_PATH_LEARN_EXAMPLES = False
+        agents.query_cache.answers.max_entries = 0
+        agents.query_cache.results.max_entries = 0
+    return main
+
+
+INGEST_POLL_SECONDS = 0.1
+
+
+async def bench_ingest(client, csv_path: str, rows: int, size: int) -> dict:
+    """Upload plus background load, measured until the ingest job reports success."""
+    start = time.perf_counter()
+    with open(csv_path, "rb") as f:
+        response = await client.post("/ingest", data={"table_name": BENCH_TABLE},
+                                     files={"file": (os.path.basename(csv_path), f, "text/csv")})
+    response.raise_for_status()
+    job_url = response.json()["status_url"]
+    while True:
+        job = (await client.get(job_url)).json()
+        if job["phase"] in ("succeeded", "failed"):
+            break
+        await asyncio.sleep(INGEST_POLL_SECONDS)
+    seconds = time.perf_counter() - start
+    if job["phase"] == "failed":
+        raise RuntimeError(f"Ingest failed: {job['error']}")
+    stats = job["stats"]
+    return {
+        "rows": rows,
+        "bytes": size,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(rows / seconds, 1),
+        "bytes_per_sec": round(size / seconds, 1),
+        "server_rows_per_sec": stats.get("rows_per_sec")
+    }
+
+
+async def bench_chat(client, main, clients: int, total_requests: int) -> dict:
+    queue = asyncio.Queue()
+    for i in range(total_requests):
+        queue.put_nowait(QUESTIONS[i % len(QUESTIONS)])
+
+    latencies, by_question, request_ids, errors = [], {}, [], []
+
+    async def worker():
+        while not queue.empty():
+            question = queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.post("/chat", json={"question": question, "chat_history": [question]})
+            elapsed = time.perf_counter() - start
+            body = response.json()
+            if response.status_code != 200 or body.get("answer", "").startswith("System Error"):
+                errors.append(body.get("answer") or response.text)
+                continue
+            latencies.append(elapsed)
+            by_question.setdefault(question, []).append(elapsed)
+            request_ids.append(body.get("request_id"))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    wall = time.perf_counter() - start
+
+    return {
+        "clients": clients,
+        "requests": total_requests,
+        "errors": len(errors),
+        "first_errors": errors[:3],
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+        "latency_seconds": {
+            "mean": round(sum(latencies) / len(latencies), 4) if latencies else None,
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": round(max(latencies), 4) if latencies else None
+        },
+        "p50_by_question": {q: percentile(v, 0.50) for q, v in by_question.items()},
+        "time_split": time_split(main, request_ids)
+    }
+
+
+def time_split(main, request_ids: list) -> dict:
+    """Mean seconds per request spent in each graph node and component, from the request traces."""
+    totals, count = {}, 0
+    for request_id in request_ids:
+        trace = main.traces.get(request_id)
+        if trace is None:
+            continue
+        count += 1
+        for span in trace.spans:
+            key = f"{span['kind']}:{span['name']}"
+            totals[key] = totals.get(key, 0.0) + span["seconds"]
+
+    means = {key: round(total / count, 4) for key, total in sorted(totals.items())} if count else {}
+    node_total = sum(v for k, v in means.items() if k.startswith("node:"))
+    return {
+        "traced_requests": count,
+        "mean_seconds": means,
+        "node_share": {k: round(v / node_total, 4) for k, v in means.items() if k.startswith("node:")}
+        if node_total else {}
+    }
+
+
+async def run(args) -> dict:
+    # Index, result store and generated CSV live in a scratch directory, never in the repo
+    workdir = tempfile.mkdtemp(prefix="blend-bench-")
+    os.chdir(workdir)
+    csv_path = os.path.join(workdir, f"{BENCH_TABLE}.csv")
+    print(f"📦 Generating {args.rows} rows (seed {args.seed})...")
+    size = write_sales_csv(csv_path, args.rows, args.seed)
+
+    main = load_app(args)
+    # The ASGI transport does not run the lifespan, so the warm-up is awaited here to time the cold start
+    print("🚀 Warming up shared services...")
+    await main.warm_up()
+    if main.startup["error"]:
+        raise RuntimeError(f"Warm-up failed: {main.startup['error']}")
+    startup = {key: main.startup[key] for key in ("import_seconds", "warm_up_phases", "ready_after_seconds")}
+    print(f"   ready {startup['ready_after_seconds']}s after import")
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench",
+                                 timeout=None) as client:
+        print("⏱️ Benchmarking /ingest...")
+        ingest = await bench_ingest(client, csv_path, args.rows, size)
+        print(f"   {ingest['rows_per_sec']} rows/s")
+
+        print("🔥 Warming up (schema catalog, indexes)...")
+        for question in QUESTIONS:
+            await client.post("/chat", json={"question": question, "chat_history": [question]})
+
+        print(f"⏱️ Benchmarking /chat: {args.requests} requests from {args.clients} concurrent clients...")
+        chat = await bench_chat(client, main, args.clients, args.requests)
+        print(f"   p50={chat['latency_seconds']['p50']}s p95={chat['latency_seconds']['p95']}s "
+              f"p99={chat['latency_seconds']['p99']}s, {chat['throughput_rps']} req/s, {chat['errors']} errors")
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": vars(args),
+        "startup": startup,
+        "ingest": ingest,
+        "chat": chat,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingest/chat benchmark with stubbed LLM and embeddings.")
+    parser.add_argument("--rows", type=int, default=100_000, help="rows in the generated sales CSV")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--clients", type=int, default=8, help="concurrent /chat clients")
+    parser.add_argument("--requests", type=int, default=200, help="total /chat requests")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="stub seconds per LLM call")
+    parser.add_argument("--llm-seconds-per-token", type=float, default=0.0, help="stub seconds per prompt token")
+    parser.add_argument("--warm", action="store_true", help="keep answer/result caches and the SQL fast path on")
+    parser.add_argument("--output", help="result JSON path (default: benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else os.path.join(
+        REPO_ROOT, "benchmarks", "results", time.strftime("bench-%Y%m%d-%H%M%S.json"))
+    results = asyncio.run(run(args))
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {output} (peak RSS {results['peak_rss_mb']} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import asyncio
+import re
+import time
+from typing import Any, List, Optional
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from api.configuration.llm_factory import estimate_tokens
+
+QUESTION_PATTERN = re.compile(r"QUESTION:\s*(.+?)\s*(?:\n|$)")
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for the Azure chat model.
+    SQL generation prompts are answered from a question -> SQL fixture map, everything else
+    (map, reduce and answer prompts) with a fixed summary. Each call sleeps for `latency`
+    seconds (plus `seconds_per_token` per prompt token) to model the API round trip.
+    """
+
+    sql_fixtures: dict
+    fallback_sql: str = "SELECT 1"
+    answer: str = "Benchmark answer based on the retrieved data."
+    latency: float = 0.2
+    seconds_per_token: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-stub"
+
+    def _respond(self, messages: List[BaseMessage]):
+        prompt = "\n".join(str(m.content) for m in messages)
+        delay = self.latency + self.seconds_per_token * estimate_tokens(prompt)
+        if "Write a SQL query" in prompt:
+            match = QUESTION_PATTERN.search(prompt)
+            question = match.group(1).strip() if match else ""
+            # Speculative candidates append a hint line to the question
+            text = self.sql_fixtures.get(question, self.fallback_sql)
+        else:
+            text = self.answer
+        usage = {"input_tokens": estimate_tokens(prompt), "output_tokens": estimate_tokens(text),
+                 "total_tokens": estimate_tokens(prompt) + estimate_tokens(text)}
+        return text, usage, delay
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        text, usage, delay = self._respond(messages)
+        time.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        text, usage, delay = self._respond(messages)
+        await asyncio.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any):
+        text, usage, delay = self._respond(messages)
+        await asyncio.sleep(delay)
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(
+                content=word + (" " if i < len(words) - 1 else ""),
+                usage_metadata=usage if i == len(words) - 1 else None
+            ))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+class StubEmbeddings(DeterministicFakeEmbedding):
+    """Hash-seeded embeddings: the same text always maps to the same vector, no Ollama needed."""
+
+    def __init__(self, size: int = 384):
+        super().__init__(size=size)
@@ -1,3 +1,6 @@
+import json
+import time
+
 import streamlit as st
 import requests
 import pandas as pd
@@ -21,6 +24,80 @@ def get_ingested_tables():
         st.error(f"Connection failed: {e}")
         return []
 
+INGEST_POLL_SECONDS = 1
+INGEST_PHASE_LABELS = {
+    "queued": "Waiting for a free ingest slot...",
+    "loading": "Loading rows into the database...",
+    "finalizing": "Finalizing (column types, statistics)..."
+}
+
+#poll a background ingest job until it finishes, showing its progress
+def wait_for_ingest_job(job_id):
+    progress = st.progress(0.0, text=INGEST_PHASE_LABELS["queued"])
+    while True:
+        try:
+            response = requests.get(f"{API_URL}/ingest/jobs/{job_id}")
+            response.raise_for_status()
+            job = response.json()
+        except Exception as e:
+            progress.empty()
+            st.error(f"Could not read ingest status: {e}")
+            return None
+
+        if job["phase"] in ("succeeded", "failed"):
+            progress.empty()
+            return job
+
+        text = INGEST_PHASE_LABELS.get(job["phase"], job["phase"])
+        if job["rows_loaded"]:
+            text += f" {job['rows_loaded']:,} rows ({job['rows_per_sec'] or 0:,.0f} rows/s)"
+        progress.progress(min(job["percent"] / 100, 1.0), text=text)
+        time.sleep(INGEST_POLL_SECONDS)
+
+PAGE_SIZE = 100
+
+#render a stored query result page by page from the api
+def render_result(result_id, key):
+    try:
+        first = requests.get(f"{API_URL}/results/{result_id}", params={"offset": 0, "limit": 1})
+        if first.status_code != 200:
+            st.caption("Result expired. Ask the question again to refresh it.")
+            return
+        total_rows = first.json()["total_rows"]
+        pages = max(1, -(-total_rows // PAGE_SIZE))
+        page = st.number_input(f"Page (of {pages}, {total_rows} rows)", min_value=1, max_value=pages,
+                               value=1, key=f"page_{key}")
+        res = requests.get(f"{API_URL}/results/{result_id}",
+                           params={"offset": (page - 1) * PAGE_SIZE, "limit": PAGE_SIZE})
+        st.dataframe(pd.DataFrame(res.json()["rows"]), use_container_width=True)
+
+        col_csv, col_parquet = st.columns(2)
+        col_csv.link_button("⬇️ CSV", f"{API_URL}/results/{result_id}/download?format=csv")
+        col_parquet.link_button("⬇️ Parquet", f"{API_URL}/results/{result_id}/download?format=parquet")
+    except Exception as e:
+        st.error(f"Failed to load result: {e}")
+
+NODE_LABELS = {
+    "cache": "Answered from cache",
+    "fast_path": "Reused SQL from a known question",
+    "resolution": "Generated SQL",
+    "static_validation": "Checked SQL against schema",
+    "extraction": "Executed query",
+    "validation": "Validated result",
+    "summarizer": "Summarized answer"
+}
+
+#stream chat progress from the api as (event, data) pairs
+def stream_chat(payload):
+    with requests.post(f"{API_URL}/chat/stream", json=payload, stream=True) as response:
+        response.raise_for_status()
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                yield event, json.loads(line[len("data:"):].strip())
+
 # --- Sidebar: Configuration & Ingestion ---
 with st.sidebar:
     existing_tables = get_ingested_tables()
@@ -38,24 +115,36 @@ with st.sidebar:
         table_name = table_name.replace(' ', '_')
         table_name = st.text_input("Table Name", table_name)
         st.info(f"Proposed Table Name: **{table_name}**")
+        mode = st.selectbox("Load Mode", ["replace", "append", "upsert"],
+                            help="replace recreates the table; append adds rows; upsert merges rows on key columns")
+        key_columns = st.text_input("Key Columns (comma-separated)") if mode == "upsert" else ""
+        partition = st.checkbox("Partition by month on the date column",
+                                help="Only applies when the table is created")
         if st.button("Upload & Ingest"):
-            with st.spinner("Ingesting data into Database..."):
+            with st.spinner("Uploading file..."):
                 files = {"file": (uploaded_file.name, uploaded_file, "text/csv")}
-                data = {"table_name": table_name}
+                data = {"table_name": table_name, "mode": mode, "key_columns": key_columns}
+                if partition:
+                    data["partition_by"] = "auto"
 
                 try:
                     response = requests.post(f"{API_URL}/ingest", files=files, data=data)
-
-                    if response.status_code == 200:
-                        res_json = response.json()
-                        st.success(res_json["message"])
-                        st.session_state['ingested_columns'] = res_json.get("columns", [])
-                        st.session_state['ingested_table'] = table_name
-                    else:
-                        st.error(f"Error: {response.text}")
                 except Exception as e:
+                    response = None
                     st.error(f"Connection failed: {e}")
 
+            if response is not None and response.status_code == 202:
+                job = wait_for_ingest_job(response.json()["job_id"])
+                if job and job["phase"] == "succeeded":
+                    stats = job["stats"]
+                    st.success(f"Table '{table_name}' loaded: {stats['rows']:,} rows in {stats['seconds']}s.")
+                    st.session_state['ingested_columns'] = job.get("columns", [])
+                    st.session_state['ingested_table'] = table_name
+                elif job:
+                    st.error(f"Ingest failed: {job['error']}")
+            elif response is not None:
+                st.error(f"Error: {response.text}")
+
     # Metadata Description Form (Shows after successful ingestion)
     if 'ingested_columns' in st.session_state and st.session_state['ingested_columns']:
         st.info("ℹ️ Help the AI understand your columns:")
@@ -95,14 +184,17 @@ if "messages" not in st.session_state:
     st.session_state.messages = []
 
 # Display chat history
-for message in st.session_state.messages:
+for idx, message in enumerate(st.session_state.messages):
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
         # Optional: Show SQL/Data if available in history (stored as extra fields)
         if "sql" in message:
             with st.expander("View SQL"):
                 st.code(message["sql"], language="sql")
-        if "data" in message:
+        if message.get("result_id"):
+            with st.expander("View Raw Data"):
+                render_result(message["result_id"], key=idx)
+        elif "data" in message:
             with st.expander("View Raw Data"):
                 st.text(message["data"])
 
@@ -124,41 +216,73 @@ if prompt := st.chat_input("Ask a question about your sales data..."):
             else:
                 history_log.append(f"Assistant: {msg['content']}")
 
-    # 2. Call API
+    # 2. Call API (streamed: progress per agent step, then the answer token by token)
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            try:
-                payload = {"question": prompt,
-                           "chat_history": history_log
-                           }
-                response = requests.post(f"{API_URL}/chat", json=payload)
-
-                if response.status_code == 200:
-                    data = response.json()
-                    answer = data.get("answer")
-                    sql = data.get("sql_query")
-                    raw_data = data.get("data")
-
-                    st.markdown(answer)
-
-                    # Show debug artifacts
-                    if sql:
-                        with st.expander("🔍 View Generated SQL"):
-                            st.code(sql, language="sql")
-                    if raw_data:
-                        with st.expander("📊 View Retrieved Data"):
-                            st.text(raw_data)
-
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": answer,
-                        "sql": sql,
-                        "data": raw_data
-                    })
-                else:
-                    error_msg = f"Error {response.status_code}: {response.text}"
-                    st.error(error_msg)
-                    st.session_state.messages.append({"role": "assistant", "content": error_msg})
-
-            except Exception as e:
-                st.error(f"API Connection Error: {e}")
\ No newline at end of file
+        status = st.status("Thinking...", expanded=False)
+        answer_placeholder = st.empty()
+        try:
+            payload = {"question": prompt,
+                       "chat_history": history_log
+                       }
+            answer, data = "", None
+
+            for event, event_data in stream_chat(payload):
+                if event == "node":
+                    status.update(label=NODE_LABELS.get(event_data["node"], event_data["node"]))
+                    if event_data.get("sql_query"):
+                        status.code(event_data["sql_query"], language="sql")
+                    if event_data.get("speculative_winner") is not None:
+                        status.write(f"Picked speculative candidate #{event_data['speculative_winner'] + 1}")
+                    if event_data["node"] == "extraction" and event_data.get("error") is None:
+                        status.write(f"Rows returned: {event_data.get('row_count')}")
+                    if event_data["node"] == "static_validation" \
+                            and event_data.get("static_validation_status") == "invalid":
+                        status.write(f"Fixing before execution: {event_data.get('error')}")
+                    if event_data["node"] == "validation" and event_data.get("validation_status") == "invalid":
+                        status.write(f"Retrying: {event_data.get('error')}")
+                elif event == "token":
+                    answer += event_data["text"]
+                    answer_placeholder.markdown(answer + "▌")
+                elif event == "done":
+                    data = event_data
+                elif event == "error":
+                    raise RuntimeError(event_data["message"])
+
+            if data is None:
+                raise RuntimeError("Stream ended before the answer was complete.")
+
+            status.update(label="Done", state="complete")
+            answer = data.get("answer")
+            sql = data.get("sql_query")
+            raw_data = data.get("data")
+            result_id = data.get("result_id")
+
+            answer_placeholder.markdown(answer)
+
+            # Show debug artifacts
+            if sql:
+                with st.expander("🔍 View Generated SQL"):
+                    st.code(sql, language="sql")
+            if result_id:
+                with st.expander("📊 View Retrieved Data"):
+                    render_result(result_id, key=len(st.session_state.messages))
+            elif raw_data:
+                with st.expander("📊 View Retrieved Data"):
+                    st.text(raw_data)
+
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": answer,
+                "sql": sql,
+                "data": raw_data,
+                "result_id": result_id
+            })
+
+        except requests.HTTPError as e:
+            status.update(label="Failed", state="error")
+            error_msg = f"Error {e.response.status_code}: {e.response.text}"
+            st.error(error_msg)
+            st.session_state.messages.append({"role": "assistant", "content": error_msg})
+        except Exception as e:
+            status.update(label="Failed", state="error")
+            st.error(f"API Connection Error: {e}")
@@ -0,0 +1,61 @@
+import os
+import uuid
+
+# The configuration module builds the Azure endpoint from the environment on import
+os.environ.setdefault("AZURE_RESOURCE_NAME", "test")
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from sqlalchemy import create_engine, text
+
+
+class RecordingLLM(FakeListChatModel):
+    """Answers with the given responses in turn and remembers the prompts."""
+    prompts: list = []
+
+    async def _agenerate(self, messages, *args, **kwargs):
+        self.prompts.append(messages[0].content)
+        return await super()._agenerate(messages, *args, **kwargs)
+
+
+@pytest.fixture
+def recording_llm(monkeypatch):
+    """Builds a RecordingLLM and installs it as the LLMFactory client."""
+    from api.configuration.llm_factory import LLMFactory
+
+    def build(responses: list) -> RecordingLLM:
+        llm = RecordingLLM(responses=responses, prompts=[])
+        monkeypatch.setattr(LLMFactory, "_llm_instance", llm)
+        return llm
+    return build
+
+
+@pytest.fixture(scope="session")
+def pg_engine():
+    """Engine on the DB_* database; tests that need PostgreSQL are skipped when it isn't reachable."""
+    from api.configuration.configuration import DATABASE_URL
+    engine = create_engine(DATABASE_URL)
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        pytest.skip(f"PostgreSQL not reachable: {e}")
+
+    # Creates column_metadata and query_log, which the catalog and the advisors read
+    from api.service.db_layer import PostgresManager
+    db = PostgresManager()
+    yield engine
+    db.engine.dispose()
+    engine.dispose()
+
+
+@pytest.fixture
+def table_name(pg_engine):
+    """A fresh table name, dropped (with its partitions and views) after the test."""
+    name = f"test_{uuid.uuid4().hex[:12]}"
+    yield name
+    with pg_engine.connect() as conn:
+        conn.execute(text(f'DROP TABLE IF EXISTS "{name}" CASCADE'))
+        conn.execute(text("DELETE FROM table_versions WHERE table_name = :t"), {"t": name})
+        conn.commit()
@@ -0,0 +1,61 @@
+import datetime
+import decimal
+
+import pandas as pd
+import pytest
+
+from api.service.answer_formatter import format_answer, format_number
+
+
+@pytest.mark.parametrize("value, locale, expected", [
+    (1234567, "en_IN", "12,34,567"),
+    (1234567, "en_US", "1,234,567"),
+    (-1234.5, "de_DE", "-1.234,50"),
+    (0.125, "en_US", "0.12"),
+])
+def test_format_number_follows_the_locale(value, locale, expected):
+    assert format_number(value, locale) == expected
+
+
+def test_scalar_answers_use_the_column_name():
+    df = pd.DataFrame({"total_revenue": [decimal.Decimal("1234567.5")]})
+
+    assert format_answer("What is the total revenue?", df) == ("scalar", "The total revenue is **₹12,34,567.50**.")
+
+
+def test_generic_column_names_quote_the_question():
+    shape, answer = format_answer("How many orders in March?", pd.DataFrame({"count": [42]}))
+
+    assert answer == 'The answer to "How many orders in March?" is **42**.'
+
+
+def test_single_row_lists_every_column():
+    df = pd.DataFrame({"region": ["North"], "first_order": [datetime.date(2024, 1, 5)]})
+
+    shape, answer = format_answer("First order in the north?", df)
+
+    assert shape == "single_row"
+    assert answer.splitlines()[1:] == ["- **region**: North", "- **first order**: 05 January 2024"]
+
+
+def test_short_tables_become_a_ranked_list():
+    df = pd.DataFrame({"city": ["Delhi", "Pune"], "orders": [120, 80]})
+
+    shape, answer = format_answer("Top cities by orders", df)
+
+    assert shape == "top_n"
+    assert answer.splitlines()[1:] == ["1. Delhi: 120", "2. Pune: 80"]
+
+
+@pytest.mark.parametrize("question, df, truncated", [
+    ("Why did sales drop?", pd.DataFrame({"x": [1]}), False),          # asks for interpretation
+    ("Top cities", pd.DataFrame({"x": range(50)}), False),             # too many rows
+    ("Top cities", pd.DataFrame({"x": [1, 2]}), True),                 # capped result
+    ("Everything", pd.DataFrame({c: [1] for c in "abcde"}), False),    # too many columns
+])
+def test_other_results_are_left_to_the_llm(question, df, truncated):
+    assert format_answer(question, df, truncated=truncated) == ("llm", None)
+
+
+def test_empty_results():
+    assert format_answer("Orders on Mars?", None) == ("empty", "The query returned no matching rows.")
@@ -0,0 +1,110 @@
+import io
+
+import pytest
+from sqlalchemy import text
+
+from api.service.csv_loader import StreamingCsvLoader
+from api.service.rollups import RollupManager
+from api.service.schema_catalog import data_fingerprints
+
+
+def csv(content: str):
+    return io.BytesIO(content.encode())
+
+
+def test_append_widens_a_column_read_by_a_rollup(pg_engine, table_name):
+    loader = StreamingCsvLoader(pg_engine)
+    loader.load(csv("category,qty\na,1\nb,2\n"), table_name)
+    definition = RollupManager._define(table_name, ["category"], set(), [{"name": "qty", "type": "BIGINT"}])
+    with pg_engine.connect() as conn:
+        conn.execute(text(f'CREATE MATERIALIZED VIEW "{definition["name"]}" AS {RollupManager._select_sql(definition)}'))
+        conn.commit()
+
+    stats = loader.load(csv("category,qty\na,1.5\n"), table_name, mode="append")
+
+    assert stats["column_types"]["qty"]["inferred_type"] == "NUMERIC"
+    with pg_engine.connect() as conn:
+        rows = conn.execute(text(f'SELECT category, "__rows", "sum__qty" FROM "{definition["name"]}" '
+                                 f'ORDER BY category')).all()
+    assert [(c, n, float(s)) for c, n, s in rows] == [("a", 2, 2.5), ("b", 1, 2.0)]
+
+
+def test_append_refuses_to_widen_the_partition_key(pg_engine, table_name):
+    loader = StreamingCsvLoader(pg_engine)
+    loader.load(csv("day,amount\n2024-01-05,1\n2024-02-03,2\n"), table_name, partition_by="auto")
+
+    with pytest.raises(ValueError, match="partition key"):
+        loader.load(csv("day,amount\nnot a date,3\n"), table_name, mode="append")
+
+    with pg_engine.connect() as conn:
+        assert conn.execute(text(f'SELECT count(*) FROM "{table_name}"')).scalar() == 2
+
+
+def test_unparseable_values_widen_the_column_instead_of_loading_null(pg_engine, table_name):
+    loader = StreamingCsvLoader(pg_engine)
+    rows = "\n".join(f"{i}" for i in range(99))
+    stats = loader.load(csv(f"qty\n{rows}\nunknown\n"), table_name)
+
+    assert stats["column_types"]["qty"]["inferred_type"] == "TEXT"
+    with pg_engine.connect() as conn:
+        assert conn.execute(text(f'SELECT count(*) FROM "{table_name}" WHERE qty IS NULL')).scalar() == 0
+        assert conn.execute(text(f"SELECT count(*) FROM \"{table_name}\" WHERE qty = 'unknown'")).scalar() == 1
+
+
+def test_every_load_bumps_the_table_version(pg_engine, table_name):
+    loader = StreamingCsvLoader(pg_engine)
+    loader.load(csv("qty\n1\n"), table_name)
+    with pg_engine.connect() as conn:
+        before = data_fingerprints(conn, [table_name])[table_name]
+    loader.load(csv("qty\n2\n"), table_name, mode="append")
+    with pg_engine.connect() as conn:
+        after = data_fingerprints(conn, [table_name])[table_name]
+
+    assert before.split(".")[0] == "1" and after.split(".")[0] == "2"
+
+
+def test_append_adds_rows_and_new_columns(pg_engine, table_name):
+    loader = StreamingCsvLoader(pg_engine)
+    loader.load(csv("id,qty\n1,10\n2,20\n"), table_name)
+
+    stats = loader.load(csv("id,qty,Store Name\n3,30,north\n"), table_name, mode="append")
+
+    assert stats["new_columns"] == ["store_name"] and stats["rows_inserted"] == 1
+    with pg_engine.connect() as conn:
+        rows = conn.execute(text(f'SELECT id, qty, store_name FROM "{table_name}" ORDER BY id')).all()
+    assert rows == [(1, 10, None), (2, 20, None), (3, 30, "north")]
+
+
+def test_upsert_merges_on_the_key_columns(pg_engine, table_name):
+    loader = StreamingCsvLoader(pg_engine)
+    loader.load(csv("id,qty\n1,10\n2,20\n"), table_name)
+
+    # The last row of a key in the file wins
+    stats = loader.load(csv("id,qty\n2,21\n3,30\n2,22\n"), table_name, mode="upsert", key_columns=["id"])
+
+    assert (stats["rows_inserted"], stats["rows_updated"]) == (1, 1)
+    with pg_engine.connect() as conn:
+        rows = conn.execute(text(f'SELECT id, qty FROM "{table_name}" ORDER BY id')).all()
+    assert rows == [(1, 10), (2, 22), (3, 30)]
+
+    with pytest.raises(ValueError, match="Key columns"):
+        loader.load(csv("qty\n1\n"), table_name, mode="upsert", key_columns=["id"])
+
+
+def test_auto_partitioning_routes_rows_into_monthly_partitions(pg_engine, table_name):
+    loader = StreamingCsvLoader(pg_engine)
+    stats = loader.load(csv("day,amount\n2024-01-05,1\n2024-01-20,2\n2024-03-02,3\n"), table_name,
+                        partition_by="auto")
+    assert stats["partition_column"] == "day"
+
+    loader.load(csv("day,amount\n2024-03-02,4\n"), table_name, mode="upsert", key_columns=["day"])
+    with pytest.raises(ValueError, match="partition column"):
+        loader.load(csv("day,amount\n2024-03-02,5\n"), table_name, mode="upsert", key_columns=["amount"])
+
+    with pg_engine.connect() as conn:
+        counts = dict(conn.execute(text(f"""
+            SELECT tableoid::regclass::text, count(*) FROM "{table_name}" GROUP BY 1
+        """)).all())
+        amounts = conn.execute(text(f'SELECT amount FROM "{table_name}" ORDER BY day')).scalars().all()
+    assert counts == {f"{table_name}_p202401": 2, f"{table_name}_p202403": 1}
+    assert amounts == [1, 2, 4]
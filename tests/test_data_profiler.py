@@ -0,0 +1,59 @@
+import datetime
+import decimal
+
+import pandas as pd
+
+from api.service.data_profiler import ResultProfile, _fmt, profile_dataframe
+from api.service.db_layer import _BoundedRowCollector
+
+
+def sales(rows: int) -> pd.DataFrame:
+    start = datetime.date(2024, 1, 1)
+    return pd.DataFrame({
+        "region": [["north", "south", "east"][i % 3] for i in range(rows)],
+        "qty": [decimal.Decimal(i % 97) / 4 for i in range(rows)],
+        "day": [start + datetime.timedelta(days=i % 200) for i in range(rows)],
+    })
+
+
+def section(digest: str, title: str) -> str:
+    return next(part for part in digest.split("\n\n") if part.startswith(title))
+
+
+def test_a_result_over_the_cap_is_profiled_over_every_row():
+    df = sales(12_000)
+    collector = _BoundedRowCollector(list(df.columns), max_rows=100, max_bytes=10 ** 9)
+    for start in range(0, len(df), 1000):
+        collector.add(list(df.iloc[start:start + 1000].itertuples(index=False)))
+
+    result = collector.build()
+    assert result["truncated"] and len(result["raw_df"]) == 100
+    qty = df["qty"].astype(float)
+    profile = result["profile"]
+    assert profile.startswith("ROWS: 12,000 (every row returned by the query)")
+    assert f"- qty: sum={_fmt(qty.sum())}, mean={_fmt(qty.mean())}, min=0, max={_fmt(qty.max())}, " \
+           f"std={_fmt(qty.std())}, nulls=0" in profile
+    assert "- region: 3 distinct, nulls=0; top: north (4,000, 33.3%), south (4,000, 33.3%), east (4,000, 33.3%)" \
+        in profile
+
+    # Group totals and trends match the profile of the whole result held in memory
+    full = profile_dataframe(df)
+    assert section(profile, "TOP GROUPS") == section(full, "TOP GROUPS")
+    assert section(profile, "TIME SERIES") == section(full, "TIME SERIES")
+
+
+def test_a_complete_result_has_no_streamed_profile():
+    df = sales(50)
+    collector = _BoundedRowCollector(list(df.columns), max_rows=100, max_bytes=10 ** 9)
+    collector.add(list(df.itertuples(index=False)))
+
+    assert collector.build()["profile"] is None
+
+
+def test_high_cardinality_columns_stop_being_tracked():
+    profile = ResultProfile(["id", "qty"])
+    profile.add([(f"order-{i}", i) for i in range(1500)])
+
+    digest = profile.digest()
+    assert "- id: more than 1,000 distinct, nulls=0" in digest
+    assert "TOP GROUPS" not in digest and profile.groups == {}
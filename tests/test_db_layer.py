@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+
+from api.configuration.configuration import DB_POOL_SIZE, DB_SYNC_POOL_SIZE
+from api.service.db_layer import PostgresManager, _BoundedRowCollector
+
+
+@pytest.fixture
+def db(pg_engine):
+    manager = PostgresManager()
+    yield manager
+    manager.engine.dispose()
+
+
+def run(db, coroutine):
+    """Runs coroutine on a fresh event loop; the async pool belongs to that loop and is closed with it."""
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await db.async_engine.dispose()
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def rows_table(pg_engine, table_name):
+    with pg_engine.connect() as conn:
+        conn.execute(text(f'CREATE TABLE "{table_name}" AS SELECT generate_series(1, 1000) AS n'))
+        conn.execute(text(f'ANALYZE "{table_name}"'))
+        conn.commit()
+    return table_name
+
+
+def count_rows(pg_engine, table_name: str) -> int:
+    with pg_engine.connect() as conn:
+        return conn.execute(text(f'SELECT count(*) FROM "{table_name}"')).scalar()
+
+
+def test_queries_above_the_estimated_cost_are_rejected_before_running(db, rows_table):
+    result = run(db, db.aexecute_query(f'SELECT * FROM "{rows_table}" a, "{rows_table}" b', max_cost=1000))
+
+    assert not result["success"] and result["error"].startswith("Query rejected before execution")
+    assert db.guard_stats == {"executed": 0, "rejected_by_cost": 1, "timed_out": 0, "cancelled": 0}
+
+
+def test_the_statement_timeout_cancels_slow_queries(db):
+    result = run(db, db.aexecute_query("SELECT pg_sleep(5)", statement_timeout_ms=200))
+
+    assert not result["success"] and result["error"].startswith("Query cancelled after the 0.2s statement timeout")
+    assert db.guard_stats["timed_out"] == 1
+
+
+def test_writes_are_refused_by_the_read_only_transaction(db, pg_engine, rows_table):
+    result = run(db, db.aexecute_query(f'DELETE FROM "{rows_table}"'))
+
+    assert not result["success"] and "read-only transaction" in result["error"]
+    assert count_rows(pg_engine, rows_table) == 1000
+
+
+def test_multiple_statements_are_refused(db, pg_engine, rows_table):
+    result = run(db, db.aexecute_query(f'SELECT 1; DROP TABLE "{rows_table}"'))
+
+    assert not result["success"] and "multiple commands" in result["error"]
+    assert count_rows(pg_engine, rows_table) == 1000
+
+
+def test_cancelling_the_request_cancels_the_query_on_the_server(db, pg_engine):
+    def running() -> int:
+        with pg_engine.connect() as conn:
+            return conn.execute(text("SELECT count(*) FROM pg_stat_activity "
+                                     "WHERE state = 'active' AND query = 'SELECT pg_sleep(30)'")).scalar()
+
+    async def main():
+        task = asyncio.create_task(db.aexecute_query("SELECT pg_sleep(30)"))
+        for _ in range(100):
+            await asyncio.sleep(0.05)
+            if await asyncio.to_thread(running):
+                break
+        assert await asyncio.to_thread(running) == 1
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        for _ in range(100):
+            if not await asyncio.to_thread(running):
+                return
+            await asyncio.sleep(0.05)
+        pytest.fail("the query kept running on the server")
+
+    run(db, main())
+    assert db.guard_stats["cancelled"] == 1
+
+
+def test_the_sync_pool_is_smaller_than_the_query_pool(db):
+    assert db.engine.pool.size() == DB_SYNC_POOL_SIZE < DB_POOL_SIZE == db.async_engine.pool.size()
+
+
+def collect(batches, max_rows: int = 1000, max_bytes: int = 10 ** 6) -> dict:
+    collector = _BoundedRowCollector(["id", "name"], max_rows, max_bytes)
+    for batch in batches:
+        collector.add(batch)
+    return collector.build()
+
+
+def test_collector_keeps_at_most_max_rows_and_counts_every_row():
+    result = collect([[(i, "x") for i in range(start, start + 40)] for start in range(0, 200, 40)], max_rows=50)
+
+    assert len(result["raw_df"]) == 50 and list(result["raw_df"]["id"]) == list(range(50))
+    assert result["truncated"] and result["row_count"] == 200
+
+
+def test_collector_stops_keeping_rows_past_max_bytes():
+    # Each row is ~11 characters: the cap is reached during the tenth row
+    result = collect([[(i, "name-" + "x" * 5) for i in range(100)]], max_bytes=100)
+
+    assert len(result["raw_df"]) == 10
+    assert result["truncated"] and result["row_count"] == 100
+
+
+def test_collector_reports_a_complete_result_as_not_truncated():
+    result = collect([[(1, "a"), (2, "b")], [(3, "c")]])
+
+    assert not result["truncated"] and result["row_count"] == 3 and len(result["raw_df"]) == 3
+    assert collect([])["data"] == "No results found."
@@ -0,0 +1,52 @@
+from api.service.fast_path import adapt_stored_sql
+
+STORED_QUESTION = "Total sales in Delhi for 2023"
+STORED_SQL = "SELECT SUM(amount) FROM sales WHERE city = 'DELHI' AND year = 2023"
+
+
+def test_substitutes_changed_literals():
+    sql = adapt_stored_sql(STORED_QUESTION, STORED_SQL, "total sales in Mumbai for 2024?")
+
+    # The new city keeps the casing the stored SQL used
+    assert sql == "SELECT SUM(amount) FROM sales WHERE city = 'MUMBAI' AND year = 2024"
+
+
+def test_identical_question_reuses_the_sql():
+    assert adapt_stored_sql(STORED_QUESTION, STORED_SQL, STORED_QUESTION) == STORED_SQL
+
+
+def test_quoted_values_are_escaped():
+    sql = adapt_stored_sql("Orders from 'Acme'", "SELECT * FROM orders WHERE customer = 'Acme'",
+                           "Orders from \"O'Brien\"")
+
+    assert sql == "SELECT * FROM orders WHERE customer = 'O''Brien'"
+
+
+def test_rejects_questions_that_differ_in_more_than_literals():
+    # A changed word that isn't a literal of the SQL
+    assert adapt_stored_sql(STORED_QUESTION, STORED_SQL, "Average sales in Delhi for 2023") is None
+    # An extra word
+    assert adapt_stored_sql(STORED_QUESTION, STORED_SQL, "Total online sales in Delhi for 2023") is None
+    # A number replaced by text
+    assert adapt_stored_sql(STORED_QUESTION, STORED_SQL, "Total sales in Delhi for last") is None
+
+
+def test_numbers_in_identifiers_and_strings_are_left_alone():
+    sql = adapt_stored_sql("Top 5 stores", 'SELECT "store_5" FROM t ORDER BY x DESC LIMIT 5', "Top 10 stores")
+
+    assert sql == 'SELECT "store_5" FROM t ORDER BY x DESC LIMIT 10'
+
+
+def test_a_repeated_number_is_left_to_the_llm():
+    stored_sql = "SELECT region, ROUND(AVG(amount), 2) FROM sales GROUP BY region HAVING COUNT(*) > 2"
+
+    assert adapt_stored_sql("Regions with more than 2 sales", stored_sql, "Regions with more than 5 sales") is None
+
+
+def test_numbers_outside_comparisons_and_limit_are_not_parameters():
+    stored_sql = "SELECT ROUND(AVG(amount), 2) FROM sales"
+
+    assert adapt_stored_sql("Average sale to 2 decimals", stored_sql, "Average sale to 3 decimals") is None
+    # The sign of a compared negative number is kept
+    assert adapt_stored_sql("Orders above -5", "SELECT * FROM t WHERE x > -5", "Orders above -7") == \
+        "SELECT * FROM t WHERE x > -7"
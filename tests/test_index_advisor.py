@@ -0,0 +1,78 @@
+import pytest
+from sqlalchemy import text
+
+from api.service.index_advisor import IndexAdvisor, VALID_INDEXES_QUERY, extract_candidates, index_name
+from api.service.schema_catalog import SchemaCatalog
+
+TABLES = {
+    "orders": [{"name": "id", "type": "BIGINT"}, {"name": "customer_id", "type": "BIGINT"},
+               {"name": "email", "type": "TEXT"}, {"name": "created", "type": "DATE"}],
+    "customers": [{"name": "id", "type": "BIGINT"}, {"name": "region", "type": "TEXT"}],
+}
+
+
+def candidates(sql: str) -> set:
+    return {(c["table"], c["column"], c["function"], c["usage"]) for c in extract_candidates(sql, TABLES)}
+
+
+def test_filters_joins_and_groups_are_candidates():
+    sql = ("SELECT c.region, COUNT(*) FROM orders o JOIN customers c ON c.id = o.customer_id "
+           "WHERE o.created >= '2024-01-01' AND LOWER(email) = 'a@b.c' GROUP BY c.region")
+
+    assert candidates(sql) == {
+        ("customers", "id", None, "join"), ("orders", "customer_id", None, "join"),
+        ("orders", "created", None, "range"), ("orders", "email", "LOWER", "eq"),
+        ("customers", "region", None, "group"),
+    }
+
+
+def test_where_column_equality_is_an_implicit_join():
+    assert candidates("SELECT 1 FROM orders, customers WHERE orders.customer_id = customers.id") == {
+        ("orders", "customer_id", None, "join"), ("customers", "id", None, "join")}
+
+
+def test_ambiguous_and_unknown_columns_are_skipped():
+    # "id" is in both tables and unqualified; "total" is in neither
+    assert candidates("SELECT 1 FROM orders JOIN customers ON true WHERE id = 1 AND total > 5") == set()
+    assert candidates("SELEC broken") == set()
+
+
+def test_an_invalid_index_left_by_a_failed_build_is_replaced(pg_engine, table_name):
+    name = index_name(table_name, '"qty"')
+    with pg_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f'CREATE TABLE "{table_name}" AS SELECT 1 AS qty FROM generate_series(1, 2)'))
+        # Fails on the duplicates and leaves an invalid index behind
+        with pytest.raises(Exception):
+            conn.execute(text(f'CREATE UNIQUE INDEX CONCURRENTLY "{name}" ON "{table_name}" (qty)'))
+        assert name not in {row[0] for row in conn.execute(VALID_INDEXES_QUERY)}
+
+    advisor = IndexAdvisor(pg_engine, schema_catalog=None)
+    decision = {"index_name": name, "table_name": table_name, "definition": '"qty"', "usage": "eq",
+                "status": "accepted", "improvement": 0.5, "reason": "test"}
+    try:
+        advisor._apply([decision])
+
+        assert decision["status"] == "created"
+        with pg_engine.connect() as conn:
+            assert name in {row[0] for row in conn.execute(VALID_INDEXES_QUERY)}
+    finally:
+        with pg_engine.connect() as conn:
+            conn.execute(text("DELETE FROM index_advice WHERE index_name = :n"), {"n": name})
+            conn.commit()
+
+
+def test_a_run_only_detects_hypopg_and_reports_the_fallback(pg_engine, table_name):
+    def extensions() -> set:
+        with pg_engine.connect() as conn:
+            return set(conn.execute(text("SELECT extname FROM pg_extension")).scalars())
+
+    with pg_engine.connect() as conn:
+        conn.execute(text(f'CREATE TABLE "{table_name}" (qty BIGINT)'))
+        conn.commit()
+    before = extensions()
+
+    report = IndexAdvisor(pg_engine, SchemaCatalog(pg_engine), auto_create=False).run(table_name)
+
+    assert extensions() == before
+    if "hypopg" not in before:
+        assert report["method"] == "statistics" and "not installed" in report["note"]
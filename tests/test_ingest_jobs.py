@@ -0,0 +1,58 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from sqlalchemy import text
+
+from api.service.ingest_jobs import IngestJobManager
+
+
+@pytest.fixture
+def staged(tmp_path):
+    def stage(name: str) -> str:
+        path = tmp_path / f"{name}.csv"
+        path.write_bytes(b"a,b\n1,2\n")
+        return str(path)
+    return stage
+
+
+@pytest.fixture
+def job_ids(pg_engine):
+    ids = []
+    yield ids
+    with pg_engine.connect() as conn:
+        conn.execute(text("DELETE FROM ingest_jobs WHERE job_id = ANY(:ids)"), {"ids": ids})
+        conn.commit()
+
+
+def test_jobs_are_shared_by_workers_and_share_the_load_slots(pg_engine, staged, job_ids):
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def ingest(path, table_name, mode, key_columns, partition_by, progress):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.3)
+        progress(1, 8)
+        with lock:
+            running[0] -= 1
+        return True, ["a", "b"], {"rows": 1, "rows_per_sec": 1.0, "bytes_per_sec": 1.0}
+
+    # Two managers stand for two workers of the API
+    workers = [IngestJobManager(ingest, lambda: pg_engine, max_concurrent=1) for _ in range(2)]
+
+    async def run():
+        jobs = [await workers[i % 2].submit(staged(f"f{i}"), f"table_{i}") for i in range(4)]
+        job_ids.extend(job["job_id"] for job in jobs)
+        # Submitted on the first worker, polled on the second
+        assert workers[1].get(jobs[0]["job_id"])["phase"] in ("queued", "loading")
+        while any(workers[0].get(job["job_id"])["phase"] not in ("succeeded", "failed") for job in jobs):
+            await asyncio.sleep(0.1)
+        return [workers[1].get(job["job_id"]) for job in jobs]
+
+    finished = asyncio.run(run())
+
+    assert [job["phase"] for job in finished] == ["succeeded"] * 4
+    assert peak[0] == 1
+    assert all(not worker._table_locks and not worker.jobs for worker in workers)
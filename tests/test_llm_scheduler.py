@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import pytest
+
+from api.service import llm_scheduler
+from api.service.llm_scheduler import LLMScheduler, TokenBucket, PRIORITY_INTERACTIVE, PRIORITY_BULK
+
+
+class Throttled(Exception):
+    def __init__(self, retry_after: str):
+        super().__init__("429")
+        self.status_code = 429
+        self.response = type("Response", (), {"headers": {"retry-after": retry_after}})()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_scheduler.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_token_bucket_refills_at_the_per_minute_rate(clock):
+    bucket = TokenBucket(60)
+    bucket.consume(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+
+    clock[0] += 30
+    assert bucket.wait_time(30) == 0.0
+    assert bucket.wait_time(31) == pytest.approx(1.0)
+
+    # Never refills past one minute of capacity, and a request larger than that waits for a full bucket
+    clock[0] += 600
+    assert bucket.tokens == 30 and bucket.wait_time(1000) == 0.0
+    bucket.consume(1000)
+    assert bucket.tokens == 0
+
+
+def test_successes_raise_concurrency_and_a_429_halves_it():
+    scheduler = LLMScheduler(requests_per_minute=6000, tokens_per_minute=10 ** 6, min_concurrency=1,
+                             max_concurrency=5, initial_concurrency=4, max_retries=1)
+    attempts = []
+
+    async def ok():
+        return "ok"
+
+    async def throttled_once():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise Throttled("0.2")
+        return "ok"
+
+    async def main():
+        for _ in range(4):
+            await scheduler.run(ok, PRIORITY_INTERACTIVE, 10)
+        assert scheduler.concurrency == 5
+        # Capped at max_concurrency
+        for _ in range(5):
+            await scheduler.run(ok, PRIORITY_INTERACTIVE, 10)
+        assert scheduler.concurrency == 5
+
+        assert await scheduler.run(throttled_once, PRIORITY_INTERACTIVE, 10) == "ok"
+
+    asyncio.run(main())
+    assert scheduler.concurrency == 2
+    assert attempts[1] - attempts[0] >= 0.2
+    assert scheduler.counters["throttled"] == 1 and scheduler.counters["retries"] == 1
+
+
+def test_errors_that_are_not_transient_are_not_retried():
+    scheduler = LLMScheduler(max_retries=3)
+    calls = []
+
+    async def broken():
+        calls.append(1)
+        raise ValueError("bad prompt")
+
+    with pytest.raises(ValueError):
+        asyncio.run(scheduler.run(broken, PRIORITY_INTERACTIVE, 10))
+    assert len(calls) == 1 and scheduler.counters["failed"] == 1
+
+
+def test_waiting_calls_are_admitted_by_priority():
+    scheduler = LLMScheduler(requests_per_minute=6000, tokens_per_minute=10 ** 6,
+                             min_concurrency=1, max_concurrency=1, initial_concurrency=1)
+    order = []
+
+    def call(name: str):
+        async def run():
+            order.append(name)
+            await asyncio.sleep(0.01)
+        return run
+
+    async def main():
+        first = asyncio.create_task(scheduler.run(call("first"), PRIORITY_BULK, 10))
+        await asyncio.sleep(0)
+        bulk = asyncio.create_task(scheduler.run(call("bulk"), PRIORITY_BULK, 10))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(scheduler.run(call("interactive"), PRIORITY_INTERACTIVE, 10))
+        await asyncio.gather(first, bulk, interactive)
+
+    asyncio.run(main())
+    assert order == ["first", "interactive", "bulk"]
+
+
+def test_calls_wait_for_room_in_the_token_budget():
+    # 6000 tokens per minute refill at 100 per second
+    scheduler = LLMScheduler(requests_per_minute=6000, tokens_per_minute=6000)
+
+    async def ok():
+        return "ok"
+
+    async def main():
+        await scheduler.run(ok, PRIORITY_INTERACTIVE, 6000)
+        start = time.monotonic()
+        await scheduler.run(ok, PRIORITY_INTERACTIVE, 50)
+        return time.monotonic() - start
+
+    assert asyncio.run(main()) >= 0.45
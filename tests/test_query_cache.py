@@ -0,0 +1,35 @@
+from api.service.query_cache import QueryCache
+
+
+def test_results_are_keyed_on_table_versions():
+    cache = QueryCache()
+    cache.set_result("SELECT * FROM sales", {"sales": "1.a"}, {"data": "rows", "row_count": 1})
+
+    assert cache.get_result("select  * FROM sales;", {"sales": "1.a"}) is None
+    assert cache.get_result("SELECT * FROM sales", {"sales": "1.a"})["data"] == "rows"
+    # Another worker loaded the table: the database reports a new version
+    assert cache.get_result("SELECT * FROM sales", {"sales": "2.b"}) is None
+
+
+def test_answers_miss_once_a_table_they_read_changed():
+    cache = QueryCache()
+    versions = {"sales": "1.a"}
+    cache.set_answer("Total sales?", [], 0, {"answer": "42"}, {"sales": "1.a"})
+
+    assert cache.get_answer("total sales", [], 0, lambda tables: {t: versions[t] for t in tables})["answer"] == "42"
+    versions["sales"] = "2.b"
+    assert cache.get_answer("total sales", [], 0, lambda tables: {t: versions[t] for t in tables}) is None
+    # The stale entry is gone, even if the version were to match again
+    versions["sales"] = "1.a"
+    assert cache.get_answer("total sales", [], 0, lambda tables: {t: versions[t] for t in tables}) is None
+
+
+def test_invalidate_table_drops_entries_that_read_it():
+    cache = QueryCache()
+    cache.set_result("SELECT 1 FROM sales", {"sales": "1"}, {"data": "a"})
+    cache.set_result("SELECT 1 FROM stores", {"stores": "1"}, {"data": "b"})
+
+    cache.invalidate_table("sales")
+
+    assert cache.get_result("SELECT 1 FROM sales", {"sales": "1"}) is None
+    assert cache.get_result("SELECT 1 FROM stores", {"stores": "1"})["data"] == "b"
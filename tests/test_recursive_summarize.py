@@ -0,0 +1,39 @@
+import asyncio
+
+from api.configuration.llm_factory import estimate_tokens
+from api.langgrph.agents import pack_by_tokens, recursive_summarize
+
+
+def test_pack_by_tokens_fills_each_group_up_to_the_budget():
+    items = ["x" * 36] * 10    # 10 tokens each
+
+    groups = pack_by_tokens(items, token_budget=35, base_tokens=5)
+
+    # 5 base tokens + 3 items per group
+    assert [len(g) for g in groups] == [3, 3, 3, 1]
+    assert sum(groups, []) == items
+
+
+def test_pack_by_tokens_keeps_oversized_items_on_their_own():
+    groups = pack_by_tokens(["a" * 400, "b", "c"], token_budget=50)
+
+    assert groups == [["a" * 400], ["b", "c"]]
+
+
+def test_recursive_summarize_maps_chunks_and_reduces_until_one_prompt_fits(recording_llm):
+    header = "| region | amount |\n|---|---|"
+    rows = [f"| region {i:04d} | {i * 10} |" for i in range(400)]
+    llm = recording_llm(["summary " * 40])
+
+    answer = asyncio.run(recursive_summarize(llm, "\n".join([header] + rows), "Total by region?",
+                                             chunk_tokens=300, reduce_tokens=200))
+
+    assert answer == "summary " * 40
+    map_prompts = [p for p in llm.prompts if "DATA SUBSET" in p]
+    expected_chunks = pack_by_tokens(rows, 300, base_tokens=estimate_tokens(header))
+    assert len(map_prompts) == len(expected_chunks) > 1
+    # Every row reaches exactly one map call
+    assert sum(p.count("| region 0") for p in map_prompts) == len(rows)
+    # Summaries were merged in intermediate levels before the final answer
+    assert sum("Merged Findings" in p for p in llm.prompts) > 0
+    assert sum("Final Answer" in p for p in llm.prompts) == 1
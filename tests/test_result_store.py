@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+
+from api.service.result_store import ResultStore
+
+
+def frame(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({"id": range(rows), "name": [f"row {i}" for i in range(rows)]})
+
+
+def test_saved_results_are_paged_without_rerunning(tmp_path):
+    store = ResultStore(root=str(tmp_path))
+    result_id = store.save(frame(250))
+
+    page = store.get_page(result_id, offset=200, limit=100)
+
+    assert page["total_rows"] == 250
+    assert [row["id"] for row in page["rows"]] == list(range(200, 250))
+    with pytest.raises(KeyError):
+        store.get_page("0" * 32)
+
+
+def test_saves_only_scan_the_store_when_it_may_be_full(tmp_path, monkeypatch):
+    store = ResultStore(root=str(tmp_path), max_bytes=10 ** 9, evict_interval=3600)
+    scans = []
+    evict = store.evict
+    monkeypatch.setattr(store, "evict", lambda keep=None: scans.append(keep) or evict(keep))
+
+    first = store.save(frame(10))
+    store.save(frame(10))
+    store.save(frame(10))
+    # One scan to learn the size of the store, none while the byte count stays under max_bytes
+    assert scans == [first]
+
+    store.max_bytes = store._store_bytes + store._saved_bytes + 1
+    newest = store.save(frame(10))
+    assert scans == [first, newest]
+    # The oldest results went to fit max_bytes; the one just saved is kept
+    assert store.get_page(newest)["total_rows"] == 10
+    with pytest.raises(KeyError):
+        store.get_page(first)
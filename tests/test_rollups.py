@@ -0,0 +1,164 @@
+import io
+import time
+
+import pytest
+from sqlalchemy import text
+
+import api.service.rollups as rollups_module
+from api.service.csv_loader import StreamingCsvLoader
+from api.service.rollups import RollupManager, parse_shape
+from api.service.schema_catalog import SchemaCatalog, data_fingerprints
+
+
+STATS_DELAY_SECONDS = 15
+
+TABLES = {"sales": [{"name": "region", "type": "TEXT"}, {"name": "qty", "type": "BIGINT"},
+                    {"name": "day", "type": "DATE"}]}
+SALES_BY_REGION = RollupManager._define("sales", ["region"], set(), TABLES["sales"])
+
+
+def wait_for_inserts(engine, table_name: str, rows: int):
+    """A session's table statistics can take up to ~10s (the idle flush interval) to reach the others."""
+    deadline = time.monotonic() + STATS_DELAY_SECONDS
+    while True:
+        with engine.connect() as conn:
+            inserted = conn.execute(text("SELECT n_tup_ins FROM pg_stat_user_tables WHERE relname = :t"),
+                                    {"t": table_name}).scalar()
+        if inserted == rows:
+            return
+        assert time.monotonic() < deadline, f"{rows} inserts into {table_name} not in the statistics"
+        time.sleep(0.2)
+
+
+@pytest.fixture
+def rollup(pg_engine, table_name, monkeypatch):
+    """A RollupManager with one rollup of SUM(qty) by category over a three-row table."""
+    monkeypatch.setattr(rollups_module, "ROLLUP_MIN_TABLE_ROWS", 0)
+    monkeypatch.setattr(rollups_module, "ROLLUP_MAX_ROWS_RATIO", 1.0)
+    StreamingCsvLoader(pg_engine).load(io.BytesIO(b"category,qty\na,1\na,2\nb,5\n"), table_name)
+    with pg_engine.connect() as conn:
+        conn.execute(text(f'ANALYZE "{table_name}"'))
+        conn.commit()
+    # Let the load's insert counters reach the statistics first, so only later writes change the fingerprint
+    wait_for_inserts(pg_engine, table_name, 3)
+    manager = RollupManager(pg_engine, SchemaCatalog(pg_engine))
+    definition = manager._define(table_name, ["category"], set(), [{"name": "qty", "type": "BIGINT"}])
+    assert manager._build(definition)
+    manager.reload()
+    yield manager, definition
+    with pg_engine.connect() as conn:
+        conn.execute(text("DELETE FROM rollup_definitions WHERE table_name = :t"), {"t": table_name})
+        conn.commit()
+
+
+def query(table_name: str) -> str:
+    return f'SELECT category, SUM(qty) AS total FROM "{table_name}" GROUP BY category'
+
+
+def versions(engine, table_name: str) -> dict:
+    with engine.connect() as conn:
+        return data_fingerprints(conn, [table_name])
+
+
+def test_stale_rollups_do_not_answer_until_refreshed(rollup, pg_engine, table_name):
+    manager, definition = rollup
+    tables = manager.schema_catalog.get_tables()
+    assert manager.rewrite(query(table_name), tables, versions(pg_engine, table_name))[1] == definition["name"]
+
+    manager.mark_stale(table_name)
+    assert manager.rewrite(query(table_name), tables, versions(pg_engine, table_name)) == (None, None)
+
+    manager.refresh_table(table_name)
+    assert manager.rewrite(query(table_name), tables, versions(pg_engine, table_name))[1] == definition["name"]
+
+
+def test_a_load_by_another_worker_stops_rewrites_without_mark_stale(rollup, pg_engine, table_name):
+    manager, definition = rollup
+    tables = manager.schema_catalog.get_tables()
+    assert manager.rewrite(query(table_name), tables, versions(pg_engine, table_name))[1] == definition["name"]
+
+    # Another worker's ingest: this manager is never told about it
+    StreamingCsvLoader(pg_engine).load(io.BytesIO(b"category,qty\nb,10\n"), table_name, mode="append")
+    assert manager.rewrite(query(table_name), tables, versions(pg_engine, table_name)) == (None, None)
+
+    wait_for_inserts(pg_engine, table_name, 4)
+    manager.refresh_table(table_name)
+    assert manager.rewrite(query(table_name), tables, versions(pg_engine, table_name))[1] == definition["name"]
+
+
+def test_check_freshness_refreshes_after_a_write_outside_the_api(rollup, pg_engine, table_name):
+    manager, definition = rollup
+    assert manager.check_freshness() == []
+
+    with pg_engine.connect() as conn:
+        conn.execute(text(f'INSERT INTO "{table_name}" VALUES (\'b\', 10)'))
+        conn.commit()
+
+    deadline = time.monotonic() + STATS_DELAY_SECONDS
+    while manager.check_freshness() != [table_name]:
+        assert time.monotonic() < deadline, "write was not detected"
+        time.sleep(0.2)
+
+    with pg_engine.connect() as conn:
+        totals = dict(conn.execute(text(f'SELECT category, "sum__qty" FROM "{definition["name"]}"')).all())
+    assert totals == {"a": 3, "b": 15}
+
+
+def rewrite(sql: str, definition: dict = SALES_BY_REGION) -> str:
+    shape = parse_shape(sql, TABLES)
+    assert RollupManager._covers(definition, shape)
+    return RollupManager._rewrite_tree(shape["tree"], definition).sql(dialect="postgres")
+
+
+def test_parse_shape_splits_dimensions_and_measures():
+    shape = parse_shape("SELECT region, COUNT(*), AVG(qty) FROM sales WHERE day > '2024-01-01' GROUP BY region", TABLES)
+
+    assert shape["table"] == "sales"
+    assert shape["dimensions"] == {"region", "day"}
+    assert shape["measures"] == {("count", None), ("avg", "qty")}
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT region FROM sales",                                              # no aggregate
+    "SELECT SUM(a.qty) FROM sales a JOIN sales b ON a.region = b.region",    # join
+    "SELECT STRING_AGG(region, ',') FROM sales",                             # unsupported aggregate
+    "SELECT SUM(qty + 1) FROM sales",                                        # aggregate of an expression
+    "SELECT SUM(qty) FROM other",                                            # unknown table
+])
+def test_parse_shape_rejects_what_a_rollup_cannot_answer(sql):
+    assert parse_shape(sql, TABLES) is None
+
+
+def test_counts_become_sums_of_counts_and_avg_becomes_sum_over_count():
+    assert rewrite("SELECT region, COUNT(*), COUNT(qty), AVG(qty) FROM sales GROUP BY region") == (
+        f'SELECT region, COALESCE(SUM("__rows"), 0) AS "count", COALESCE(SUM("count__qty"), 0) AS "count", '
+        f'SUM("sum__qty") / NULLIF(SUM("count__qty"), 0) AS "avg" '
+        f'FROM "{SALES_BY_REGION["name"]}" AS "sales" GROUP BY region')
+
+
+def test_filters_and_aliases_are_kept():
+    assert rewrite("SELECT MAX(s.qty) AS top FROM sales s WHERE s.region = 'north'") == (
+        f'SELECT MAX("max__qty") AS top FROM "{SALES_BY_REGION["name"]}" AS "s" WHERE s.region = \'north\'')
+
+
+def test_rollups_only_cover_their_group_columns():
+    shape = parse_shape("SELECT day, SUM(qty) FROM sales GROUP BY day", TABLES)
+
+    assert not RollupManager._covers(SALES_BY_REGION, shape)
+
+
+def test_rewritten_queries_return_the_same_rows(rollup, pg_engine, table_name):
+    manager, definition = rollup
+    tables = manager.schema_catalog.get_tables()
+    queries = [
+        f'SELECT category, COUNT(*), SUM(qty), AVG(qty), MIN(qty), MAX(qty) FROM "{table_name}" '
+        f'GROUP BY category ORDER BY category',
+        f'SELECT COUNT(*) AS n, AVG(qty) AS mean FROM "{table_name}"',
+        f'SELECT COUNT(*) FROM "{table_name}" WHERE category = \'missing\'',
+    ]
+    current = versions(pg_engine, table_name)
+    with pg_engine.connect() as conn:
+        for sql in queries:
+            rewritten, name = manager.rewrite(sql, tables, current)
+            assert name == definition["name"]
+            assert conn.execute(text(rewritten)).all() == conn.execute(text(sql)).all()
@@ -0,0 +1,68 @@
+from sqlalchemy import text
+
+from api.service.schema_catalog import FINGERPRINT_QUERY, SchemaCatalog
+
+
+def fingerprint(engine) -> str:
+    with engine.connect() as conn:
+        return conn.execute(FINGERPRINT_QUERY).scalar()
+
+
+def execute(engine, sql: str, params: dict = None):
+    with engine.connect() as conn:
+        conn.execute(text(sql), params or {})
+        conn.commit()
+
+
+def test_fingerprint_changes_on_ddl_and_metadata_only(pg_engine, table_name):
+    initial = fingerprint(pg_engine)
+    assert fingerprint(pg_engine) == initial
+
+    execute(pg_engine, f'CREATE TABLE "{table_name}" (qty BIGINT)')
+    created = fingerprint(pg_engine)
+    assert created != initial
+
+    # Writing data is not a schema change
+    execute(pg_engine, f'INSERT INTO "{table_name}" VALUES (1), (2)')
+    assert fingerprint(pg_engine) == created
+
+    execute(pg_engine, f'ALTER TABLE "{table_name}" ADD COLUMN region TEXT')
+    altered = fingerprint(pg_engine)
+    assert altered != created
+
+    try:
+        execute(pg_engine, "INSERT INTO column_metadata (table_name, column_name, description) "
+                           "VALUES (:t, 'qty', 'Units sold')", {"t": table_name})
+        described = fingerprint(pg_engine)
+        assert described != altered
+        execute(pg_engine, "UPDATE column_metadata SET description = 'Units', updated_at = now() "
+                           "WHERE table_name = :t", {"t": table_name})
+        assert fingerprint(pg_engine) != described
+    finally:
+        execute(pg_engine, "DELETE FROM column_metadata WHERE table_name = :t", {"t": table_name})
+
+
+def test_invalidate_swaps_the_cached_schema(pg_engine, table_name):
+    execute(pg_engine, f'CREATE TABLE "{table_name}" (qty BIGINT)')
+    catalog = SchemaCatalog(pg_engine, check_interval=3600)
+    tables, _, version = catalog.snapshot()
+    assert [c["name"] for c in tables[table_name]] == ["qty"]
+
+    # Within the check interval the cached schema is served as it is
+    execute(pg_engine, f'ALTER TABLE "{table_name}" ADD COLUMN region TEXT')
+    assert [c["name"] for c in catalog.get_tables()[table_name]] == ["qty"]
+
+    catalog.invalidate()
+    tables, schema, new_version = catalog.snapshot()
+    assert [c["name"] for c in tables[table_name]] == ["qty", "region"]
+    assert "- region (TEXT)" in schema and new_version == version + 1
+
+
+def test_a_change_made_elsewhere_is_picked_up_by_the_fingerprint_check(pg_engine, table_name):
+    catalog = SchemaCatalog(pg_engine, check_interval=0)
+    version = catalog.snapshot()[2]
+    assert catalog.snapshot()[2] == version
+
+    execute(pg_engine, f'CREATE TABLE "{table_name}" (qty BIGINT)')
+    tables, _, new_version = catalog.snapshot()
+    assert table_name in tables and new_version == version + 1
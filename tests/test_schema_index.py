@@ -0,0 +1,83 @@
+import asyncio
+import math
+import re
+
+from langchain_core.embeddings import Embeddings
+
+from api.configuration.llm_factory import LLMFactory
+from api.configuration.service_factory import ServiceFactory
+from api.langgrph import agents
+from api.service.schema_catalog import format_schema
+from api.service.schema_index import SchemaIndex
+
+TABLES = {
+    "sales": [{"name": "region", "type": "TEXT", "description": None},
+              {"name": "amount", "type": "NUMERIC", "description": "Sale amount"}],
+    "employees": [{"name": "department", "type": "TEXT", "description": None},
+                  {"name": "salary", "type": "NUMERIC", "description": None}],
+    "inventory": [{"name": "sku", "type": "TEXT", "description": None},
+                  {"name": "stock", "type": "BIGINT", "description": None}],
+}
+FULL_SCHEMA = format_schema(TABLES)
+VOCABULARY = ["sales", "sale", "region", "amount", "employees", "department", "salary", "inventory", "sku", "stock"]
+
+
+class KeywordEmbeddings(Embeddings):
+    """Unit vectors of vocabulary word counts: texts sharing words are close."""
+
+    def embed_query(self, text: str) -> list:
+        words = re.findall(r"\w+", text.lower())
+        vector = [words.count(w) for w in VOCABULARY] + [0.01]
+        norm = math.sqrt(sum(v * v for v in vector))
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: list) -> list:
+        return [self.embed_query(t) for t in texts]
+
+
+class StubCatalog:
+    def snapshot(self):
+        return TABLES, FULL_SCHEMA, 1
+
+    def get_tables(self):
+        return TABLES
+
+
+class StubDB:
+    schema_catalog = StubCatalog()
+
+    def get_schema_string(self):
+        return FULL_SCHEMA
+
+
+def test_a_question_selects_the_relevant_tables(tmp_path, monkeypatch):
+    monkeypatch.setattr(LLMFactory, "_embed_instance", KeywordEmbeddings())
+    index = SchemaIndex(StubCatalog(), top_k_tables=1, top_k_columns=4, token_budget=40, cache_root=str(tmp_path))
+
+    schema = asyncio.run(index.aselect_schema("total sales amount by region"))
+
+    assert schema == format_schema({"sales": TABLES["sales"]})
+    assert asyncio.run(index.aselect_schema("average salary per department")) == \
+        format_schema({"employees": TABLES["employees"]})
+
+
+def test_an_unknown_identifier_retries_once_with_the_full_schema(recording_llm, monkeypatch):
+    monkeypatch.setitem(ServiceFactory._instances, "db", StubDB())
+    llm = recording_llm(["SELECT department, AVG(wage) FROM employees GROUP BY department",
+                         "SELECT department, AVG(salary) FROM employees GROUP BY department"])
+    pruned = format_schema({"employees": [TABLES["employees"][0]]})
+    state = {"question": "average salary per department", "schema_context": pruned, "chat_history": [],
+             "rag_examples": "", "error": None, "retry_count": 0}
+
+    async def main():
+        first = await agents.query_resolution_agent(state)
+        checked = await agents.static_validation_agent({**state, **first})
+        second = await agents.query_resolution_agent({**state, **first, **checked})
+        return checked, second, await agents.static_validation_agent({**state, **first, **checked, **second})
+
+    checked, second, rechecked = asyncio.run(main())
+
+    assert checked["error"].startswith("Static validation failed") and 'column "wage" does not exist' in checked["error"]
+    assert pruned in llm.prompts[0] and "salary" not in llm.prompts[0].split("QUESTION")[0]
+    assert FULL_SCHEMA in llm.prompts[1] and second["schema_context"] == FULL_SCHEMA
+    assert rechecked == {"static_validation_status": "valid"} and len(llm.prompts) == 2
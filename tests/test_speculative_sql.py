@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+from api.configuration.llm_factory import LLMFactory
+from api.configuration.service_factory import ServiceFactory
+from api.langgrph import agents
+
+TABLES = {"sales": [{"name": "region", "type": "TEXT"}, {"name": "amount", "type": "NUMERIC"}]}
+CANDIDATES = [
+    "SELECT region, SUM(amount) FROM sales GROUP BY region",
+    "SELECT region, SUM(amount) FROM sales WHERE region ILIKE '%north%' GROUP BY region",
+    "SELECT SUM(amount) FROM sales",
+]
+
+
+def rows(n: int) -> dict:
+    return {"success": True, "row_count": n, "data": "...", "raw_df": None, "truncated": False}
+
+
+def failure(error: str) -> dict:
+    return {"success": False, "error": error}
+
+
+class StubScheduler:
+    """Answers candidate i (recognised by its hint) with responses[i]."""
+
+    def __init__(self, responses: list):
+        self.responses = responses
+
+    async def ainvoke(self, runnable, inputs, priority):
+        i = next((i for i, hint in enumerate(agents.SPECULATIVE_HINTS) if hint and hint in inputs["question"]), 0)
+        if isinstance(self.responses[i], Exception):
+            raise self.responses[i]
+        return AIMessage(content=self.responses[i])
+
+
+class StubCatalog:
+    def get_tables(self):
+        return TABLES
+
+
+class StubDB:
+    schema_catalog = StubCatalog()
+
+
+@pytest.fixture
+def speculate(monkeypatch):
+    """Runs one speculative round: responses per candidate, {sql: (seconds, result)} for the executions."""
+    monkeypatch.setitem(ServiceFactory._instances, "db", StubDB())
+    monkeypatch.setattr(agents, "SPECULATIVE_SQL_CANDIDATES", len(CANDIDATES))
+    cancelled = []
+
+    def run(responses: list, executions: dict):
+        async def execute_sql(sql, tables, **kwargs):
+            seconds, result = executions[sql]
+            try:
+                await asyncio.sleep(seconds)
+            except asyncio.CancelledError:
+                cancelled.append(sql)
+                raise
+            return result
+
+        monkeypatch.setattr(agents, "execute_sql", execute_sql)
+        monkeypatch.setattr(LLMFactory, "_scheduler", StubScheduler(responses))
+        prompt = ChatPromptTemplate.from_template("{question}")
+        return asyncio.run(agents.run_speculative_candidates(prompt, FakeListChatModel(responses=["unused"]),
+                                                             {"question": "Sales by region"}))
+    run.cancelled = cancelled
+    return run
+
+
+def test_the_first_candidate_with_rows_wins_and_the_others_are_cancelled(speculate):
+    winner = speculate(CANDIDATES, {CANDIDATES[0]: (5, rows(3)), CANDIDATES[1]: (0.05, rows(1)),
+                                    CANDIDATES[2]: (5, rows(1))})
+
+    assert winner == (1, CANDIDATES[1], rows(1))
+    assert sorted(speculate.cancelled) == sorted([CANDIDATES[0], CANDIDATES[2]])
+
+
+def test_an_empty_result_does_not_win(speculate):
+    winner = speculate(CANDIDATES, {CANDIDATES[0]: (0.2, rows(3)), CANDIDATES[1]: (0.01, rows(0)),
+                                    CANDIDATES[2]: (0.01, failure("division by zero"))})
+
+    assert winner == (0, CANDIDATES[0], rows(3))
+
+
+def test_without_a_winner_the_lowest_succeeding_candidate_is_returned(speculate):
+    no_winner = agents.speculation_stats["no_winner"]
+    winner = speculate(CANDIDATES, {CANDIDATES[0]: (0.01, failure("timeout")), CANDIDATES[1]: (0.01, rows(0)),
+                                    CANDIDATES[2]: (0.01, rows(0))})
+
+    assert winner == (1, CANDIDATES[1], rows(0))
+    assert agents.speculation_stats["no_winner"] == no_winner + 1
+
+    # Every candidate failed: the primary candidate's error is reported
+    winner = speculate(CANDIDATES, {sql: (0.01, failure(f"error {i}")) for i, sql in enumerate(CANDIDATES)})
+    assert winner == (0, CANDIDATES[0], failure("error 0"))
+
+
+def test_invalid_and_failed_generations_are_skipped(speculate):
+    responses = ["SELECT regoin FROM sales", RuntimeError("LLM down"), CANDIDATES[2]]
+    winner = speculate(responses, {CANDIDATES[2]: (0.01, rows(1))})
+
+    assert winner == (2, CANDIDATES[2], rows(1))
+
+    with pytest.raises(RuntimeError, match="LLM down"):
+        speculate([RuntimeError("LLM down")] * 3, {})
@@ -0,0 +1,61 @@
+import pytest
+
+from api.service.sql_validator import SqlStaticValidator
+
+TABLES = {
+    "sales": [{"name": "region", "type": "TEXT"}, {"name": "amount", "type": "NUMERIC"},
+              {"name": "Order Date", "type": "DATE"}],
+    "stores": [{"name": "region", "type": "TEXT"}, {"name": "manager", "type": "TEXT"}],
+    "orders": [{"name": "region", "type": "TEXT"}, {"name": "tags", "type": "TEXT[]"}],
+}
+
+
+@pytest.fixture
+def validator():
+    return SqlStaticValidator()
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT region, SUM(amount) AS total FROM sales GROUP BY region ORDER BY total DESC",
+    'SELECT s.region, st.manager FROM sales s JOIN stores st ON st.region = s.region',
+    'SELECT "Order Date" FROM sales',
+    "WITH t AS (SELECT region FROM sales) SELECT anything FROM t",
+    "SELECT x FROM (SELECT region AS x FROM sales) sub",
+    "SELECT region, tag FROM orders, unnest(tags) AS tag",
+    "SELECT t.tag, COUNT(*) FROM orders CROSS JOIN LATERAL unnest(tags) AS t(tag) GROUP BY t.tag",
+    "SELECT g.day FROM generate_series(1, 7) AS g(day)",
+    "SELECT tablename FROM pg_tables WHERE schemaname = 'public'",
+    "SELECT column_name FROM information_schema.columns WHERE table_name = 'sales'",
+])
+def test_valid_sql_passes(validator, sql):
+    assert validator.validate(sql, TABLES) == []
+
+
+def test_unknown_table_suggests_the_closest(validator):
+    assert validator.validate("SELECT region FROM sale", TABLES) == [
+        'relation "sale" does not exist. Did you mean "sales"? (use double quotes exactly as shown)']
+
+
+def test_unknown_column_suggests_the_closest(validator):
+    errors = validator.validate("SELECT ammount FROM sales", TABLES)
+
+    assert errors == ['column "ammount" does not exist. Did you mean "amount"? (use double quotes exactly as shown)']
+
+
+def test_unquoted_mixed_case_column_is_folded_like_postgres(validator):
+    errors = validator.validate("SELECT Order_Date FROM sales", TABLES)
+
+    assert errors and errors[0].startswith('column "order_date" does not exist.')
+
+
+def test_qualified_column_is_checked_against_its_table(validator):
+    errors = validator.validate("SELECT st.amount FROM sales s JOIN stores st ON st.region = s.region", TABLES)
+
+    assert errors == ['column "amount" does not exist in "st".']
+    assert validator.validate("SELECT x.region FROM sales s", TABLES) == ['missing FROM-clause entry for table "x"']
+
+
+def test_syntax_errors_and_multiple_statements_are_reported(validator):
+    assert validator.validate("SELEC region FROM sales", TABLES)[0].startswith("syntax error")
+    assert validator.validate("SELECT 1; SELECT 2", TABLES) == ["exactly one SQL statement is expected"]
+    assert validator.stats() == {"checked": 2, "rejected": 2, "db_round_trips_saved": 0}
@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+import httpx
+
+from api import main
+from api.configuration.service_factory import ServiceFactory
+
+
+class StubDB:
+    async def aping(self) -> bool:
+        return True
+
+
+def get(path: str) -> httpx.Response:
+    async def request():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path)
+    return asyncio.run(request())
+
+
+def test_readyz_is_503_until_the_services_are_warmed_up(monkeypatch):
+    monkeypatch.setattr(ServiceFactory, "_instances", {})
+    # A warm-up is in flight, so /readyz does not start another one
+    monkeypatch.setitem(main.startup, "warming_up", True)
+    monkeypatch.setitem(main.startup, "warmed_up", False)
+
+    response = get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["status"] == "starting" and response.json()["database"] is False
+    assert get("/healthz").status_code == 200
+
+    # The database is built but the warm-up has not finished
+    ServiceFactory._instances["db"] = StubDB()
+    response = get("/readyz")
+    assert response.status_code == 503 and response.json()["database"] is True
+
+    main.startup.update(warming_up=False, warmed_up=True)
+    response = get("/readyz")
+    assert response.status_code == 200 and response.json()["status"] == "ready"
+
+
+def test_concurrent_first_calls_build_a_service_once(monkeypatch):
+    monkeypatch.setattr(ServiceFactory, "_instances", {})
+    monkeypatch.setattr(ServiceFactory, "_locks", {})
+    monkeypatch.setattr(ServiceFactory, "timings", {})
+    builds = []
+
+    def build():
+        builds.append(1)
+        time.sleep(0.1)
+        return object()
+
+    monkeypatch.setattr(ServiceFactory, "get_slow", classmethod(lambda cls: cls._get("slow", build)), raising=False)
+
+    async def first_requests():
+        return await asyncio.gather(*(ServiceFactory.aget("slow") for _ in range(8)))
+
+    instances = asyncio.run(first_requests())
+    assert len(builds) == 1 and all(instance is instances[0] for instance in instances)
+    assert ServiceFactory.is_ready("slow") and ServiceFactory.timings["slow"] >= 0.1
@@ -0,0 +1,42 @@
+import asyncio
+
+from api import main
+from api.service import telemetry
+from api.service.telemetry import finish_request, start_request, traced
+
+
+@traced("node", "telemetry_test_node")
+async def node(state: dict) -> dict:
+    await asyncio.sleep(0.01)
+    return {"answer": state["question"].upper()}
+
+
+def test_a_traced_node_records_a_span_and_a_metric():
+    async def request():
+        trace = start_request("/chat")
+        result = await node({"question": "sales"})
+        telemetry.record_rows(7)
+        finish_request(trace, "success")
+        return trace, result
+
+    trace, result = asyncio.run(request())
+
+    assert result == {"answer": "SALES"}
+    assert [(s["kind"], s["name"]) for s in trace.spans] == [("node", "telemetry_test_node")]
+    assert trace.spans[0]["seconds"] >= 0.01 and trace.rows == 7
+
+    exposition = main.metrics().body.decode()
+    assert 'text2sql_span_seconds_count{kind="node",name="telemetry_test_node"} 1.0' in exposition
+    assert 'text2sql_request_seconds_count{endpoint="/chat",outcome="success"}' in exposition
+
+    # GET /traces/{request_id} serves the same spans
+    assert main.get_trace(trace.request_id)["spans"] == trace.spans
+
+
+def test_a_span_outside_a_request_only_records_the_metric():
+    with telemetry.span("db", "telemetry_test_query"):
+        pass
+
+    assert telemetry._current_trace.get() is None
+    assert 'text2sql_span_seconds_count{kind="db",name="telemetry_test_query"} 1.0' in \
+        telemetry.metrics_exposition().decode()
@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+from api.service.csv_loader import StreamingCsvLoader
+from api.service.type_inference import ColumnType, infer_column_type
+
+
+def as_list(values: pd.Series) -> list:
+    """Values as COPY sees them: missing ones (None or NaN) are written as NULL."""
+    return [None if pd.isna(v) else v for v in values]
+
+
+@pytest.mark.parametrize("values, pg_type, source_format", [
+    (["1", "2", "-3"], "BIGINT", "numeric text"),
+    (["1,200", "35", "4,000,000"], "BIGINT", "thousands-separated text"),
+    (["$1.50", "₹ 20", "(3.25)"], "NUMERIC", "currency text"),
+    (["yes", "no", "Y"], "BOOLEAN", "boolean text"),
+    (["2024-01-05", "2024-02-29"], "DATE", "date text (%Y-%m-%d)"),
+    (["2024-01-05 10:00:00", "2024-01-06 11:30:00"], "TIMESTAMP", "date text (%Y-%m-%d %H:%M:%S)"),
+])
+def test_infers_native_types(values, pg_type, source_format):
+    column_type = infer_column_type(pd.Series(values + ["", "N/A"]))
+
+    assert (column_type.pg_type, column_type.source_format) == (pg_type, source_format)
+
+
+@pytest.mark.parametrize("values", [
+    ["00123", "00456"],        # codes with leading zeros keep their text form
+    ["Jun-21", "Jul-21"],      # month labels are not dates
+    ["a", "1", "2"],
+    ["", "null"],
+])
+def test_ambiguous_columns_stay_text(values):
+    assert infer_column_type(pd.Series(values)).pg_type == "TEXT"
+
+
+def test_convert_cleans_values_and_reports_failures():
+    values, failed = ColumnType("NUMERIC").convert(pd.Series(["$1,234.50", "(2)", "n/a", "abc"]))
+
+    assert as_list(values) == ["1234.50", "-2", None, None]
+    # Null tokens are not failures
+    assert failed.tolist() == [False, False, False, True]
+
+
+def test_convert_normalizes_dates():
+    values, failed = ColumnType("DATE", date_format="%d/%m/%Y").convert(pd.Series(["05/01/2024", "31/02/2024"]))
+
+    assert as_list(values) == ["2024-01-05", None]
+    assert failed.tolist() == [False, True]
+
+
+def test_a_chunk_that_does_not_parse_widens_the_type():
+    values, column_type = StreamingCsvLoader._fit_chunk(pd.Series(["1", "2.5"]), ColumnType("BIGINT"))
+    assert column_type.pg_type == "NUMERIC" and as_list(values) == ["1", "2.5"]
+
+    values, column_type = StreamingCsvLoader._fit_chunk(pd.Series(["1", "unknown"]), ColumnType("BIGINT"))
+    assert column_type.pg_type == "TEXT" and as_list(values) == ["1", "unknown"]
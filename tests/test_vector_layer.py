@@ -0,0 +1,60 @@
+import asyncio
+
+import faiss
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from api.configuration.llm_factory import LLMFactory
+from api.service import vector_layer
+from api.service.vector_layer import RAGManager, SEED_EXAMPLES, example_id
+
+
+@pytest.fixture
+def index_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(LLMFactory, "_embed_instance", DeterministicFakeEmbedding(size=16))
+    return str(tmp_path)
+
+
+def rag(index_root: str) -> RAGManager:
+    manager = RAGManager(index_root=index_root)
+    manager.ingest_examples()
+    return manager
+
+
+def test_a_second_start_memory_maps_the_saved_index(index_root, monkeypatch):
+    rag(index_root)
+    reads, read_index = [], faiss.read_index
+
+    def recording_read_index(path, flags=0):
+        reads.append(flags)
+        return read_index(path, flags)
+    monkeypatch.setattr(vector_layer.faiss, "read_index", recording_read_index)
+
+    manager = rag(index_root)
+
+    assert reads == [faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY]
+    assert len(manager.list_examples()) == len(SEED_EXAMPLES)
+
+
+def test_adding_an_example_again_replaces_it_and_remove_deletes_it(index_root):
+    manager = rag(index_root)
+    ex_id = manager.add_example("Total sales by region", "SELECT 1")
+    assert manager.add_example("total sales by region ", "SELECT region, SUM(amount) FROM sales GROUP BY region") \
+        == ex_id == example_id("Total sales by region")
+
+    examples = {e["id"]: e for e in manager.list_examples()}
+    assert len(examples) == len(SEED_EXAMPLES) + 1
+    assert examples[ex_id]["sql"] == "SELECT region, SUM(amount) FROM sales GROUP BY region"
+
+    assert manager.remove_example(ex_id) and not manager.remove_example(ex_id)
+    assert len(manager.list_examples()) == len(SEED_EXAMPLES)
+
+
+def test_another_instance_picks_up_a_saved_example(index_root):
+    writer, reader = rag(index_root), rag(index_root)
+    writer.add_example("Total sales by region", "SELECT region, SUM(amount) FROM sales GROUP BY region")
+
+    (doc, score), = asyncio.run(reader.aretrieve_examples("Total sales by region", k=1))
+
+    assert doc.metadata["sql_query"] == "SELECT region, SUM(amount) FROM sales GROUP BY region"
+    assert score == pytest.approx(1.0)